@@ -3,14 +3,22 @@ from http import HTTPStatus
 from typing import Union
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import conint
 
-from api.v1.schemes.film import Film, FilmBase
+from api.v1.schemes.film import Film, FilmBase, FilmFacets, FilmSuggestion
+from api.v1.params.batch import BatchParams
 from api.v1.params.pagination import PaginationParams
+from api.v1.responses import (NDJSON, cached_response, cursor_response, entry_response, export_response,
+                              json_response, response_key, suggest_response)
 
-from core.converter import FilmBaseConverter, FilmConverter
+from core.config import settings
 from core.errors import FilmErrors
+from core.mapper import FilmBaseMapper, FilmMapper, FilmSuggestionMapper, map_many
+from interfaces.search import FacetRequest, MultiFieldRequest, SuggestRequest
+from models.film import FilmBase as FilmBaseModel
+from models.film import FilmSuggestion as FilmSuggestionModel
 from services.base import DocumentService
 from services.film import get_film_service
 
@@ -22,37 +30,181 @@ logger = logging.getLogger(__name__)
 @router.get("/search",
             response_model=list[FilmBase],
             summary="Поиск кинопроизведений",
-            description="Полнотекстовый поиск по кинопроизведениям",
+            description="Полнотекстовый поиск по названию, описанию и участникам кинопроизведений, "
+                        "с фильтром по жанру",
             response_description="Название и рейтинг фильма",
             tags=['Полнотекстовый поиск'])
 async def search_films(
+        request: Request,
         query: str,
         pg_size: conint(gt=0) = Query(default=50, alias="page[size]"),
         pg_number: conint(gt=0) = Query(default=1, alias="page[number]"),
+        pg_cursor: Union[str, None] = Query(default=None, alias="page[cursor]"),
+        fltr: Union[str, None] = Query(default=None, alias="filter[genre]"),
         film_service: DocumentService = Depends(get_film_service)
 ) -> list[FilmBase]:
     """
-    Search for 'query' in film documents
+    Search for 'query' in titles, descriptions and names of people of film documents, the most relevant first
 
     @param query: - searching string
+    @param fltr: - genre name to only search films of
     @param pg_size: - max elements output
     @param pg_number: - offset
+    @param pg_cursor: - continue after cursor page instead of offset
     @param _film_service: - internal parameter for work with storages
     @returns list[FilmBase]: - corresponding films
     """
-    result = await film_service.search_by_field(
-        path='title',
-        query=query,
+    search = MultiFieldRequest(query, settings.FILM_SEARCH_FIELDS, {'genre.name': fltr} if fltr else {})
+    if pg_cursor is not None:
+        result, token = await film_service.page_all(
+            pg_cursor, pg_size, None, projection=FilmBaseModel, request=search)
+        if not result:
+            raise HTTPException(
+                status_code=HTTPStatus.NOT_FOUND,
+                detail=FilmErrors.SEARCH_WO_RESULTS.substitute(query=query)
+            )
+        return cursor_response(map_many(FilmBaseMapper, result), token)
+
+    key = response_key(request)
+    if cached := await cached_response(request, film_service, key):
+        return cached
+
+    result = await film_service.search_by_fields(
+        search,
         page=pg_number,
         size=pg_size,
-        sort=None
+        sort=None,
+        projection=FilmBaseModel
     )
     if not result:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND,
             detail=FilmErrors.SEARCH_WO_RESULTS.substitute(query=query)
         )
-    return [FilmBaseConverter.convert(flm) for flm in result]
+    return entry_response(request, await film_service.put_response(
+        key, map_many(FilmBaseMapper, result)))
+
+
+@router.get('/suggest',
+            response_model=list[FilmSuggestion],
+            summary="Подсказки кинопроизведений",
+            description="Автодополнение названия кинопроизведения по началу любого из первых слов",
+            response_description="Идентификаторы и названия фильмов",
+            tags=['Полнотекстовый поиск'])
+async def suggest_films(
+        request: Request,
+        query: str = Query(default=..., min_length=1, max_length=100),
+        size: int = Query(default=10, gt=0, le=settings.SUGGEST_MAX_SIZE),
+        service: DocumentService = Depends(get_film_service)
+) -> list[FilmSuggestion]:
+    """
+    Returns films completing the typed prefix, higher rated first
+    @param query: str
+    @param size: int
+    @return list[FilmSuggestion]:
+    """
+    return await suggest_response(
+        request, service, SuggestRequest(query, size), FilmSuggestionMapper, FilmSuggestionModel)
+
+
+@router.get('/export',
+            summary="Выгрузка кинопроизведений",
+            description="Все кинопроизведения потоком NDJSON, по документу в строке; после каждой страницы строка "
+                        "с курсором для продолжения выгрузки (в любое время: после перерыва дольше минуты - уже не "
+                        "из снимка, а по живому индексу), после последней - с курсором null",
+            response_class=StreamingResponse,
+            responses={200: {'content': {NDJSON: {}}}},
+            tags=['Пролистывание документов'])
+async def export_films(
+        pg_size: int = Query(default=settings.EXPORT_PAGE_SIZE, gt=0, le=settings.EXPORT_MAX_PAGE_SIZE,
+                             alias="page[size]"),
+        pg_cursor: str = Query(default='', alias="page[cursor]"),
+        film_service: DocumentService = Depends(get_film_service)
+) -> StreamingResponse:
+    """
+    Stream all film documents, bypassing cache
+
+    @param pg_size: - documents read from the index at once
+    @param pg_cursor: - continue after the cursor of a previous export (empty to start)
+    @param film_service: - internal parameter for work with storages
+    @returns StreamingResponse: - NDJSON film documents and cursors
+    """
+    return await export_response(film_service.export(pg_cursor, pg_size), FilmMapper)
+
+
+@router.get('/facets',
+            response_model=FilmFacets,
+            summary="Фасеты кинопроизведений",
+            description="Число кинопроизведений по жанрам, типам и рейтингу (гистограмма), "
+                        "с фильтром по жанру и типу",
+            response_description="Общее число фильмов и число фильмов по значениям каждого фасета",
+            tags=['Пролистывание документов'])
+async def film_facets(
+        request: Request,
+        genre: Union[str, None] = Query(default=None, alias="filter[genre]"),
+        type_: Union[str, None] = Query(default=None, alias="filter[type]"),
+        film_service: DocumentService = Depends(get_film_service)
+) -> FilmFacets:
+    """
+    Count films by genre, type and rating at once, instead of listing films of every genre
+
+    @param genre: - genre name to only count films of
+    @param type_: - film type to only count films of
+    @param film_service: - internal parameter for work with storages
+    @returns FilmFacets: - total of films and counts of films by facets values
+    """
+    key = response_key(request)
+    if cached := await cached_response(request, film_service, key):
+        return cached
+
+    filters = {path: value for path, value in (('genre.name', genre), ('type', type_)) if value}
+    facets = await film_service.facets(FacetRequest(
+        settings.FILM_FACET_TERMS, settings.FILM_FACET_HISTOGRAMS, filters, settings.FACETS_SIZE))
+    if facets is None:
+        raise HTTPException(
+            status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+            detail=FilmErrors.FACETS_NOT_AVAILABLE
+        )
+    return entry_response(request, await film_service.put_response(key, facets))
+
+
+@router.get('/{film_id}/similar',
+            response_model=list[FilmBase],
+            summary="Похожие кинопроизведения",
+            description="Кинопроизведения, похожие на данное по названию, описанию, жанрам и участникам",
+            response_description="Название и рейтинг похожих фильмов, самые похожие первыми",
+            tags=['Получение документа'])
+async def similar_films(
+        request: Request,
+        film_id: UUID,
+        size: int = Query(default=10, gt=0, le=settings.SIMILAR_MAX_SIZE),
+        film_service: DocumentService = Depends(get_film_service)
+) -> list[FilmBase]:
+    """
+    Get films most like the film, in one more_like_this query
+
+    @param film_id: film unique identifier
+    @param size: max films output
+    @param film_service: film extractor
+    @returns list[FilmBase]: similar films, most similar first
+    """
+    key = response_key(request)
+    if cached := await cached_response(request, film_service, key):
+        return cached
+
+    result = await film_service.similar(str(film_id), settings.FILM_SIMILAR_FIELDS, size, projection=FilmBaseModel)
+    if result is None:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail=FilmErrors.NO_SUCH_ID
+        )
+    if not result:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail=FilmErrors.FILMS_NOT_FOUND
+        )
+    return entry_response(request, await film_service.put_response(
+        key, map_many(FilmBaseMapper, result)))
 
 
 @router.get('/{film_id}/',
@@ -62,6 +214,7 @@ async def search_films(
             response_description="Название и рейтинг фильма, участники, прочее",
             tags=['Получение документа'])
 async def film_details(
+        request: Request,
         film_id: UUID,
         film_service: DocumentService = Depends(get_film_service)
 ) -> Film:
@@ -72,6 +225,10 @@ async def film_details(
     @param film_service: film extractor
     @returns Film:
     """
+    key = response_key(request)
+    if cached := await cached_response(request, film_service, key):
+        return cached
+
     film = await film_service.get_single(str(film_id))
 
     if not film:
@@ -79,46 +236,82 @@ async def film_details(
             status_code=HTTPStatus.NOT_FOUND,
             detail=FilmErrors.NO_SUCH_ID
         )
-    return FilmConverter.convert(film)
+    return entry_response(request, await film_service.put_response(
+        key, FilmMapper.map(film)))
 
 
 @router.get("/",
-            response_model=list[FilmBase],
+            response_model=Union[list[FilmBase], list[Film]],
             summary="Список кинопроизведений",
-            description="Получение всех доступных кинопроизведений",
+            description="Получение всех доступных кинопроизведений, "
+                        "либо деталей кинопроизведений по списку идентификаторов",
             response_description="Список названий и идентификаторов кинопроизведений",
             tags=['Пролистывание документов'])
 async def films(
+        request: Request,
         sort: str = Query(default=None, max_length=50),
         pagination: PaginationParams = Depends(PaginationParams),
         fltr: Union[str, None] = Query(
             default=None,
             alias="filter[genre]"
         ),
+        batch: BatchParams = Depends(BatchParams),
         film_service: DocumentService = Depends(get_film_service)
-) -> list[FilmBase]:
-    """  Returns films
+) -> Union[list[FilmBase], list[Film]]:
+    """  Returns films, or film details when requested by ids
 
     @param sort:
     @param pg_size:
     @param pg_number:
     @param fltr:
+    @param ids:
     @param _film_service:
-    @return list[FilmBase]:
+    @return list[FilmBase] | list[Film]:
     """
+    if batch.ids:
+        result = await film_service.get_many(batch.ids)
+        if not result:
+            raise HTTPException(
+                status_code=HTTPStatus.NOT_FOUND,
+                detail=FilmErrors.FILMS_NOT_FOUND
+            )
+        return json_response(map_many(FilmMapper, result))
+
+    if pagination.page_cursor is not None:
+        result, token = await film_service.page_all(
+            pagination.page_cursor,
+            pagination.page_size,
+            sort,
+            path="genre.name" if fltr else None,
+            query=fltr,
+            projection=FilmBaseModel)
+        if not result:
+            raise HTTPException(
+                status_code=HTTPStatus.NOT_FOUND,
+                detail=FilmErrors.FILMS_NOT_FOUND
+            )
+        return cursor_response(map_many(FilmBaseMapper, result), token)
+
+    key = response_key(request)
+    if cached := await cached_response(request, film_service, key):
+        return cached
+
     if fltr:
         result = await film_service.search_by_field(
             path="genre.name",
             query=str(fltr),
             page=pagination.page_number,
             size=pagination.page_size,
-            sort=sort
+            sort=sort,
+            projection=FilmBaseModel
         )
     else:
-        result = await film_service.list_all(pagination.page_number, pagination.page_size, sort)
+        result = await film_service.list_all(
+            pagination.page_number, pagination.page_size, sort, projection=FilmBaseModel)
     if not result:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND,
             detail=FilmErrors.FILMS_NOT_FOUND
         )
-    return [FilmBaseConverter.convert(flm) for flm in result]
+    return entry_response(request, await film_service.put_response(
+        key, map_many(FilmBaseMapper, result)))
@@ -2,13 +2,15 @@ from http import HTTPStatus
 from typing import Union
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 
 from api.v1.schemes.genre import Genre
+from api.v1.params.batch import BatchParams
 from api.v1.params.pagination import PaginationParams
+from api.v1.responses import cached_response, cursor_response, entry_response, json_response, response_key
 
-from core.converter import GenreConverter
 from core.errors import GenreErrors
+from core.mapper import GenreMapper, map_many
 from services.base import DocumentService
 from services.genre import get_genre_service
 
@@ -22,24 +24,50 @@ router: APIRouter = APIRouter()
             response_description="Список названий и идентификаторов жанров",
             tags=['Пролистывание документов'])
 async def get_genres(
+        request: Request,
         sort: Union[str, None] = Query(default=None, max_length=50),
         pagination: PaginationParams = Depends(PaginationParams),
+        batch: BatchParams = Depends(BatchParams),
         service: DocumentService = Depends(get_genre_service)
 ) -> list[Genre]:
     """
-    Returns list of all available genres
+    Returns list of all available genres, or genres requested by ids
     @param sort:
     @param page_size: int
     @param page_number: int
+    @param ids: list[UUID]
     @return list[Genre]:
     """
+    if batch.ids:
+        result = await service.get_many(batch.ids)
+        if not result:
+            raise HTTPException(
+                status_code=HTTPStatus.NOT_FOUND,
+                detail=GenreErrors.GENRES_NOT_FOUND
+            )
+        return json_response(map_many(GenreMapper, result))
+
+    if pagination.page_cursor is not None:
+        result, token = await service.page_all(pagination.page_cursor, pagination.page_size, sort)
+        if not result:
+            raise HTTPException(
+                status_code=HTTPStatus.NOT_FOUND,
+                detail=GenreErrors.GENRES_NOT_FOUND
+            )
+        return cursor_response(map_many(GenreMapper, result), token)
+
+    key = response_key(request)
+    if cached := await cached_response(request, service, key):
+        return cached
+
     result = await service.list_all(pagination.page_number, pagination.page_size, sort)
     if not result:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND,
             detail=GenreErrors.GENRES_NOT_FOUND
         )
-    return [GenreConverter.convert(gnr) for gnr in result]
+    return entry_response(request, await service.put_response(
+        key, map_many(GenreMapper, result)))
 
 
 @router.get('/search',
@@ -49,6 +77,7 @@ async def get_genres(
             response_description="Название и рейтинг жанра",
             tags=['Полнотекстовый поиск'])
 async def search_genres(
+        request: Request,
         sort: Union[str, None] = Query(default=None, max_length=50),
         pagination: PaginationParams = Depends(PaginationParams),
         query: Union[str, None] = Query(default='/.*/'),
@@ -62,6 +91,20 @@ async def search_genres(
     @param page_number: int
     @return list[Genre]:
     """
+    if pagination.page_cursor is not None:
+        result, token = await service.page_all(
+            pagination.page_cursor, pagination.page_size, sort, path='name', query=query)
+        if not result:
+            raise HTTPException(
+                status_code=HTTPStatus.NOT_FOUND,
+                detail=GenreErrors.SEARCH_WO_RESULTS.substitute(query=query)
+            )
+        return cursor_response(map_many(GenreMapper, result), token)
+
+    key = response_key(request)
+    if cached := await cached_response(request, service, key):
+        return cached
+
     result = await service.search_by_field(
         path='name',
         query=query,
@@ -74,11 +117,13 @@ async def search_genres(
             status_code=HTTPStatus.NOT_FOUND,
             detail=GenreErrors.SEARCH_WO_RESULTS.substitute(query=query)
         )
-    return [GenreConverter.convert(gnr) for gnr in result]
+    return entry_response(request, await service.put_response(
+        key, map_many(GenreMapper, result)))
 
 
 @router.get('/{genre_id}/', response_model=Genre)
 async def genre_details(
+        request: Request,
         genre_id: UUID,
         _genre_service: DocumentService = Depends(get_genre_service)
 ) -> Genre:
@@ -88,6 +133,10 @@ async def genre_details(
     @param _genre_service: genre extractor
     @return Genre:
     """
+    key = response_key(request)
+    if cached := await cached_response(request, _genre_service, key):
+        return cached
+
     genre = await _genre_service.get_single(str(genre_id))
 
     if not genre:
@@ -95,4 +144,5 @@ async def genre_details(
             status_code=HTTPStatus.NOT_FOUND,
             detail=GenreErrors.NO_SUCH_ID
         )
-    return GenreConverter.convert(genre)
+    return entry_response(request, await _genre_service.put_response(
+        key, GenreMapper.map(genre)))
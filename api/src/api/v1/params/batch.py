@@ -0,0 +1,21 @@
+from http import HTTPStatus
+from typing import Union
+from uuid import UUID
+
+from fastapi import HTTPException, Query
+
+from core.config import settings
+from core.errors import BatchErrors
+
+
+class BatchParams:
+    def __init__(self,
+                 ids: Union[list[UUID], None] = Query(
+                     default=None,
+                     description="Get documents by identifiers at once, instead of listing"),):
+        if ids and len(ids) > settings.BATCH_MAX_IDS:
+            raise HTTPException(
+                status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
+                detail=BatchErrors.TOO_MANY_IDS.substitute(limit=settings.BATCH_MAX_IDS)
+            )
+        self.ids = [str(uid) for uid in ids] if ids else None
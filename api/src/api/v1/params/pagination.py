@@ -6,6 +6,11 @@ from fastapi import Query
 class PaginationParams:
     def __init__(self,
                  page_size: Union[int, None] = Query(default=50, gt=0, alias='page[size]'),
-                 page_number: Union[int, None] = Query(default=1, gt=0, alias='page[number]'),):
+                 page_number: Union[int, None] = Query(default=1, gt=0, alias='page[number]'),
+                 page_cursor: Union[str, None] = Query(
+                     default=None, alias='page[cursor]',
+                     description="Continue listing after the page (empty to start), "
+                                 "next cursor is returned in X-Next-Page-Cursor header"),):
         self.page_size = page_size
         self.page_number = page_number
+        self.page_cursor = page_cursor
@@ -2,13 +2,20 @@ from http import HTTPStatus
 from typing import Union
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 
-from api.v1.schemes.person import Person
+from api.v1.schemes.person import Person, PersonBase
+from api.v1.params.batch import BatchParams
 from api.v1.params.pagination import PaginationParams
+from api.v1.responses import (NDJSON, cached_response, cursor_response, entry_response, export_response,
+                              json_response, response_key, suggest_response)
 
-from core.converter import PersonConverter
+from core.config import settings
 from core.errors import PersonErrors
+from core.mapper import PersonBaseMapper, PersonMapper, map_many
+from interfaces.search import SuggestRequest
+from models.person import PersonBase as PersonBaseModel
 from services.base import DocumentService
 from services.person import get_person_service
 
@@ -22,24 +29,50 @@ router: APIRouter = APIRouter()
             response_description="Список названий и идентификаторов персон",
             tags=['Пролистывание документов'])
 async def get_persons(
+        request: Request,
         sort: Union[str, None] = Query(default=None, max_length=50),
         pagination: PaginationParams = Depends(PaginationParams),
+        batch: BatchParams = Depends(BatchParams),
         service: DocumentService = Depends(get_person_service)
 ) -> list[Person]:
     """
-    Returns list of all available persons
+    Returns list of all available persons, or persons requested by ids
     @param sort:
     @param page_size: int
     @param page_number: int
+    @param ids: list[UUID]
     @return list[Person]:
     """
+    if batch.ids:
+        result = await service.get_many(batch.ids)
+        if not result:
+            raise HTTPException(
+                status_code=HTTPStatus.NOT_FOUND,
+                detail=PersonErrors.PERSONS_NOT_FOUND
+            )
+        return json_response(map_many(PersonMapper, result))
+
+    if pagination.page_cursor is not None:
+        result, token = await service.page_all(pagination.page_cursor, pagination.page_size, sort)
+        if not result:
+            raise HTTPException(
+                status_code=HTTPStatus.NOT_FOUND,
+                detail=PersonErrors.PERSONS_NOT_FOUND
+            )
+        return cursor_response(map_many(PersonMapper, result), token)
+
+    key = response_key(request)
+    if cached := await cached_response(request, service, key):
+        return cached
+
     result = await service.list_all(pagination.page_number, pagination.page_size, sort)
     if not result:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND,
             detail=PersonErrors.PERSONS_NOT_FOUND
         )
-    return [PersonConverter.convert(person) for person in result]
+    return entry_response(request, await service.put_response(
+        key, map_many(PersonMapper, result)))
 
 
 @router.get('/search',
@@ -49,6 +82,7 @@ async def get_persons(
             response_description="Название и рейтинг персон",
             tags=['Полнотекстовый поиск'])
 async def search_persons(
+        request: Request,
         sort: Union[str, None] = Query(default=None, max_length=50),
         pagination: PaginationParams = Depends(PaginationParams),
         query: Union[str, None] = Query(default='/.*/'),
@@ -61,6 +95,20 @@ async def search_persons(
     @param page_number: int
     @return list[Person]:
     """
+    if pagination.page_cursor is not None:
+        result, token = await service.page_all(
+            pagination.page_cursor, pagination.page_size, sort, path='full_name', query=query)
+        if not result:
+            raise HTTPException(
+                status_code=HTTPStatus.NOT_FOUND,
+                detail=PersonErrors.SEARCH_WO_RESULTS.substitute(query=query)
+            )
+        return cursor_response(map_many(PersonMapper, result), token)
+
+    key = response_key(request)
+    if cached := await cached_response(request, service, key):
+        return cached
+
     result = await service.search_by_field(
         path='full_name',
         query=query,
@@ -73,7 +121,53 @@ async def search_persons(
             status_code=HTTPStatus.NOT_FOUND,
             detail=PersonErrors.SEARCH_WO_RESULTS.substitute(query=query)
         )
-    return [PersonConverter.convert(person) for person in result]
+    return entry_response(request, await service.put_response(
+        key, map_many(PersonMapper, result)))
+
+
+@router.get('/export',
+            summary="Выгрузка персон",
+            description="Все персоны потоком NDJSON, по документу в строке; после каждой страницы строка "
+                        "с курсором для продолжения выгрузки (в любое время: после перерыва дольше минуты - уже не "
+                        "из снимка, а по живому индексу), после последней - с курсором null",
+            response_class=StreamingResponse,
+            responses={200: {'content': {NDJSON: {}}}},
+            tags=['Пролистывание документов'])
+async def export_persons(
+        pg_size: int = Query(default=settings.EXPORT_PAGE_SIZE, gt=0, le=settings.EXPORT_MAX_PAGE_SIZE,
+                             alias="page[size]"),
+        pg_cursor: str = Query(default='', alias="page[cursor]"),
+        service: DocumentService = Depends(get_person_service)
+) -> StreamingResponse:
+    """
+    Stream all person documents, bypassing cache
+    @param pg_size: int
+    @param pg_cursor: str
+    @return StreamingResponse:
+    """
+    return await export_response(service.export(pg_cursor, pg_size), PersonMapper)
+
+
+@router.get('/suggest',
+            response_model=list[PersonBase],
+            summary="Подсказки персон",
+            description="Автодополнение имени персоны по началу имени или фамилии",
+            response_description="Идентификаторы и имена персон",
+            tags=['Полнотекстовый поиск'])
+async def suggest_persons(
+        request: Request,
+        query: str = Query(default=..., min_length=1, max_length=100),
+        size: int = Query(default=10, gt=0, le=settings.SUGGEST_MAX_SIZE),
+        service: DocumentService = Depends(get_person_service)
+) -> list[PersonBase]:
+    """
+    Returns persons completing the typed prefix, ones with more films first
+    @param query: str
+    @param size: int
+    @return list[PersonBase]:
+    """
+    return await suggest_response(
+        request, service, SuggestRequest(query, size), PersonBaseMapper, PersonBaseModel)
 
 
 @router.get('/{person_uuid}',
@@ -82,11 +176,20 @@ async def search_persons(
             description="Получение деталей по персон",
             response_description="Название и рейтинг персон, участники, прочее",
             tags=['Получение документа'])
-async def person_details(person_uuid: UUID, service: DocumentService = Depends(get_person_service)) -> Person:
+async def person_details(
+        request: Request,
+        person_uuid: UUID,
+        service: DocumentService = Depends(get_person_service)
+) -> Person:
+    key = response_key(request)
+    if cached := await cached_response(request, service, key):
+        return cached
+
     person = await service.get_single(str(person_uuid))
     if not person:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND,
             detail=PersonErrors.NO_SUCH_ID
         )
-    return PersonConverter.convert(person)
+    return entry_response(request, await service.put_response(
+        key, PersonMapper.map(person)))
@@ -0,0 +1,142 @@
+import logging
+from http import HTTPStatus
+from typing import AsyncIterator, Optional
+from urllib.parse import urlencode
+
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+
+from core.config import settings
+from core.mapper import map_many
+from core.tracing import span
+from interfaces.cache import CacheEntry
+from interfaces.search import SearchPage, SuggestRequest
+from models.base import dumps
+from services.base import DocumentService
+
+logger = logging.getLogger(__name__)
+
+NEXT_PAGE_CURSOR = 'X-Next-Page-Cursor'
+NDJSON = 'application/x-ndjson'
+
+# expired response served while search is unavailable
+STALE_WARNING = '110 - "Response is Stale"'
+
+# cached responses may be stored by clients and nginx, cursor pages are unique to every walk
+CACHE_CONTROL = f'public, max-age={settings.HTTP_CACHE_MAX_AGE}'
+NO_STORE = 'no-store'
+
+
+class CachedJSONResponse(Response):
+    """Response with a JSON body already serialized (e.g. taken from cache as is)"""
+    media_type = 'application/json'
+
+
+def response_key(request: Request) -> str:
+    """Cache key of a response, independent of query parameters order"""
+    query = urlencode(sorted(request.query_params.multi_items()))
+    return f'response__{request.url.path}?{query}'
+
+
+def json_response(content: object, headers: Optional[dict] = None) -> Response:
+    """Response with content serialized straight to bytes, skipping response model validation"""
+    with span('response.serialize'):
+        data = dumps(content)
+    return CachedJSONResponse(data, headers=headers)
+
+
+def cursor_response(content: object, token: Optional[str]) -> Response:
+    """Response with a cursor page, pointing to the next page (if any) in header"""
+    headers = {'Cache-Control': NO_STORE}
+    if token:
+        headers[NEXT_PAGE_CURSOR] = token
+    return json_response(content, headers)
+
+
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    """Client already holds representation with the entity tag (If-None-Match, weak comparison)"""
+    header = request.headers.get('if-none-match')
+    if not header or not etag:
+        return False
+    tags = {tag.strip().removeprefix('W/') for tag in header.split(',')}
+    return '*' in tags or etag.removeprefix('W/') in tags
+
+
+def not_modified(etag: str) -> Response:
+    """Bare 304 response, confirming that client's copy is still current"""
+    return Response(status_code=HTTPStatus.NOT_MODIFIED,
+                    headers={'ETag': etag, 'Cache-Control': CACHE_CONTROL})
+
+
+def entry_response(request: Request, entry: CacheEntry) -> Response:
+    """Response with cached body and its entity tag, or 304 if client already has it"""
+    if etag_matches(request, entry.etag):
+        return not_modified(entry.etag)
+    return CachedJSONResponse(entry.data, headers={'ETag': entry.etag, 'Cache-Control': CACHE_CONTROL})
+
+
+async def cached_response(request: Request, service: DocumentService, key: str) -> Optional[Response]:
+    """Response from cache, None on cache miss
+
+    Conditional requests are checked against entity tag alone, the cached body is read only when sent.
+    On miss the key is remembered, so that its expired response is served if search turns out unavailable
+    """
+    request.state.fallback = (service, key)
+    if request.headers.get('if-none-match'):
+        if etag_matches(request, etag := await service.get_etag(key)):
+            return not_modified(etag)
+    if cached := await service.get_response(key):
+        return entry_response(request, cached)
+    return None
+
+
+async def fallback_response(request: Request) -> Optional[Response]:
+    """Expired response to the request kept in cache, None if there is none (or the response is never cached)"""
+    if (fallback := getattr(request.state, 'fallback', None)) is None:
+        return None
+    service, key = fallback
+    if (cached := await service.get_fallback(key)) is None:
+        return None
+    return CachedJSONResponse(cached.data, headers={'ETag': cached.etag, 'Cache-Control': NO_STORE,
+                                                    'Warning': STALE_WARNING})
+
+
+async def suggest_response(request: Request, service: DocumentService, suggestion: SuggestRequest,
+                           mapper: type, projection: type) -> Response:
+    """Suggestions completing the prefix: cached for short prefixes, taken from elastic for longer ones"""
+    if not service.suggestion_cached(suggestion):
+        result = await service.suggest(suggestion, projection)
+        return json_response(map_many(mapper, result), {'Cache-Control': CACHE_CONTROL})
+
+    key = f'response__{suggestion!r}'
+    if cached := await cached_response(request, service, key):
+        return cached
+    result = await service.suggest(suggestion, projection)
+    return entry_response(request, await service.put_response(key, map_many(mapper, result)))
+
+
+def export_lines(page: SearchPage, mapper: type) -> bytes:
+    """NDJSON lines of page documents, followed by the cursor to resume after the page (null after the last one)"""
+    with span('export.serialize', count=len(page.documents)):
+        lines = [dumps(doc) for doc in map_many(mapper, page.documents)]
+        lines.append(dumps({'cursor': page.token}))
+        return b'\n'.join(lines) + b'\n'
+
+
+async def export_response(pages: AsyncIterator[SearchPage], mapper: type) -> Response:
+    """Documents of all pages streamed as NDJSON, one page in memory at a time
+
+    The first page is read upfront, so that a malformed or expired cursor is answered with an error status.
+    A failure later on ends the stream without the final null cursor, clients resume after the last one seen.
+    """
+    first = await pages.__anext__()
+
+    async def lines() -> AsyncIterator[bytes]:
+        yield export_lines(first, mapper)
+        try:
+            async for page in pages:
+                yield export_lines(page, mapper)
+        except Exception:
+            logger.exception('Export stream interrupted')
+
+    return StreamingResponse(lines(), media_type=NDJSON, headers={'Cache-Control': NO_STORE})
@@ -1,3 +1,4 @@
+from typing import Union
 from uuid import UUID
 
 from api.v1.schemes.genre import Genre
@@ -11,6 +12,23 @@ class FilmBase(BaseOrJsonModel):
     imdb_rating: float
 
 
+class FilmSuggestion(BaseOrJsonModel):
+    uuid: UUID
+    title: str
+
+
+class FacetBucket(BaseOrJsonModel):
+    key: Union[str, float]
+    count: int
+
+
+class FilmFacets(BaseOrJsonModel):
+    total: int
+    genre: list[FacetBucket]
+    type: list[FacetBucket]
+    imdb_rating: list[FacetBucket]
+
+
 class Film(BaseOrJsonModel):
     uuid: UUID
     title: str
@@ -0,0 +1,70 @@
+from contextvars import ContextVar
+
+# saturating 8-bit counters are halved at once by translating bytes with this table
+HALVED = bytes(count >> 1 for count in range(256))
+
+# set while requests should be cached unconditionally (e.g. cache warm-up)
+bypass: ContextVar[bool] = ContextVar('admission_bypass', default=False)
+
+
+class CountMinSketch:
+    """Compact approximate counter of key frequencies: depth rows of width saturating 8-bit counters
+
+    A key is counted in one cell of every row; its frequency estimate is the smallest of these,
+    never lower than the true count, and higher only on collisions in every row.
+    """
+
+    def __init__(self, width: int, depth: int) -> None:
+        self.width = width
+        self.depth = depth
+        self.rows = [bytearray(width) for _ in range(depth)]
+
+    def cells(self, key: str) -> list[int]:
+        # double hashing: row hashes derived from two halves of one (per-process salted) hash
+        value = hash(key)
+        low, high = value & 0xFFFFFFFF, (value >> 32) & 0xFFFFFFFF | 1
+        return [(low + row * high) % self.width for row in range(self.depth)]
+
+    def add(self, key: str) -> int:
+        """Count key once, returning its updated estimate"""
+        estimate = 255
+        for row, cell in zip(self.rows, self.cells(key)):
+            if row[cell] < 255:
+                row[cell] += 1
+            estimate = min(estimate, row[cell])
+        return estimate
+
+    def estimate(self, key: str) -> int:
+        return min(row[cell] for row, cell in zip(self.rows, self.cells(key)))
+
+    def halve(self) -> None:
+        for row in self.rows:
+            row[:] = row.translate(HALVED)
+
+
+class FrequencyAdmission:
+    """TinyLFU-style cache admission: a key is cached once it was requested threshold times recently
+
+    Requests are counted in a count-min sketch, aged by halving all counters every window
+    requests, so that keys popular long ago are forgotten and one-off keys never get in.
+    """
+
+    def __init__(self, width: int = 65536, depth: int = 4, window: int = 100000, threshold: int = 2) -> None:
+        self.sketch = CountMinSketch(width, depth)
+        self.window = window
+        self.threshold = threshold
+        self.seen = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def admit(self, key: str) -> bool:
+        """Count a request of key to fill it in cache, telling if it is worth caching"""
+        self.seen += 1
+        if self.seen >= self.window:
+            self.sketch.halve()
+            self.seen = 0
+        if self.sketch.add(key) >= self.threshold or bypass.get():
+            self.admitted += 1
+            return True
+        self.rejected += 1
+        return False
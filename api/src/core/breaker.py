@@ -0,0 +1,80 @@
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from interfaces.search import SearchOverloadedError, SearchUnavailableError
+
+
+class CircuitBreaker:
+    """Circuit breaker of requests to a backend: stops requests to it after consecutive failures
+
+    The circuit opens after failures failed requests in a row: requests fail fast instead of waiting
+    for a dead backend. After reset seconds it is half open: a single probe request is let through,
+    closing the circuit on success and opening it again on failure.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+
+    def __init__(self, failures: int = 5, reset: float = 10.0) -> None:
+        self.failures = failures
+        self.reset = reset
+        self.state = self.CLOSED
+        self.failed = 0
+        self.opened = 0.0
+        self.probing = False
+
+    def switch(self, state: str) -> None:
+        self.state = state
+
+    def allow(self) -> bool:
+        """Request may be made now (taking the probe, when half open)"""
+        if self.state == self.OPEN and time.monotonic() - self.opened >= self.reset:
+            self.switch(self.HALF_OPEN)
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def succeed(self) -> None:
+        self.failed = 0
+        if self.state != self.CLOSED:
+            self.switch(self.CLOSED)
+
+    def fail(self) -> None:
+        self.failed += 1
+        if self.state == self.HALF_OPEN or self.failed >= self.failures:
+            self.opened = time.monotonic()
+            self.failed = 0
+            self.switch(self.OPEN)
+
+    @contextmanager
+    def guard(self, failure: Callable[[Exception], bool]) -> Iterator[None]:
+        """Run a request through the circuit, SearchUnavailableError at once while it is open
+
+        Exceptions the failure predicate holds true for are failures, others (bad requests) are answers.
+        Requests shed before they were made are neither.
+        """
+        if not self.allow():
+            raise SearchUnavailableError(f'Circuit {self.state}, requests are not made')
+        probe = self.state == self.HALF_OPEN
+        try:
+            yield
+        except SearchOverloadedError:
+            raise
+        except Exception as e:
+            if failure(e):
+                self.fail()
+            else:
+                self.succeed()
+            raise
+        else:
+            self.succeed()
+        finally:
+            if probe:
+                self.probing = False
+
+
+# circuit breaker of Elasticsearch requests of the worker, unless disabled
+elastic_breaker: Optional[CircuitBreaker] = None
@@ -1,15 +1,20 @@
-from api.v1.schemes.film import Film, FilmBase
+from typing import Union
+
+from api.v1.schemes.film import Film, FilmBase, FilmSuggestion
 from api.v1.schemes.genre import Genre
 from api.v1.schemes.person import Person, PersonBase, PersonFilm
 from models.film import Film as FilmModel
+from models.film import FilmBase as FilmBaseModel
+from models.film import FilmSuggestion as FilmSuggestionModel
 from models.genre import Genre as GenreModel
 from models.person import Person as PersonModel
+from models.person import PersonBase as PersonBaseModel
 from models.person import PersonFilm as PersonFilmModel
 
 
 class FilmBaseConverter:
     @staticmethod
-    def convert(model: FilmModel) -> FilmBase:
+    def convert(model: Union[FilmModel, FilmBaseModel]) -> FilmBase:
         return FilmBase(
             uuid=model.id,
             title=model.title,
@@ -17,6 +22,15 @@ class FilmBaseConverter:
         )
 
 
+class FilmSuggestionConverter:
+    @staticmethod
+    def convert(model: FilmSuggestionModel) -> FilmSuggestion:
+        return FilmSuggestion(
+            uuid=model.id,
+            title=model.title
+        )
+
+
 class FilmConverter:
     @staticmethod
     def convert(model: FilmModel) -> Film:
@@ -46,7 +60,7 @@ class GenreConverter:
 
 class PersonBaseConverter:
     @staticmethod
-    def convert(model: PersonModel) -> PersonBase:
+    def convert(model: Union[PersonModel, PersonBaseModel]) -> PersonBase:
         return PersonBase(
             uuid=model.id,
             full_name=model.full_name
@@ -59,7 +73,7 @@ class PersonConverter:
         return Person(
             uuid=model.id,
             full_name=model.full_name,
-            films=[cls._convert_film(film) for film in model.films]
+            films=[cls._convert_film(film) for film in model.films or []]
         )
 
     @staticmethod
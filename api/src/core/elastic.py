@@ -1,18 +1,63 @@
+import base64
 import logging
-from typing import Optional
+from contextlib import asynccontextmanager, nullcontext
+from typing import AsyncIterator, Optional
 from uuid import UUID
 
-from elasticsearch import AsyncElasticsearch, NotFoundError
+import orjson
+from elasticsearch import AsyncElasticsearch, BadRequestError, ConflictError, NotFoundError
 
-from interfaces.search import SearchAPI, SearchCursor, SearchRequest
+from core import breaker, limiter
+from core.metrics import ELASTIC_FETCHED, observe_elastic
+from core.tracing import traced
+from interfaces.search import (FacetRequest, Matching, MultiFieldRequest, SearchAPI, SearchCursor, SearchCursorError,
+                               SearchPage, SearchRequest, SearchUnavailableError, SimilarRequest, SuggestRequest)
 
 
 class ElasticSearcher(SearchAPI):
+    # how long elastic keeps point-in-time snapshot between cursor pages
+    PIT_KEEP_ALIVE = '1m'
+    # fields only used to search documents, never returned
+    SOURCE_EXCLUDES = ['suggest']
+    # errors of requests elastic answered, rejecting them as bad or conflicting (not failures of elastic)
+    REJECTED = (BadRequestError, ConflictError, NotFoundError)
+
     def __init__(self, index: str, elastic: AsyncElasticsearch) -> None:
         self.elastic = elastic
         self.logger = logging.getLogger(f"ElasticSearcher: {index}")
         self.fetched = 0
         self.index = index
+        self.fetched_counter = ELASTIC_FETCHED.labels(index)
+
+    @classmethod
+    def unavailable(cls, error: Exception) -> bool:
+        """Elasticsearch failed to answer (down, timed out, overloaded), instead of rejecting the request"""
+        return not isinstance(error, cls.REJECTED)
+
+    def failed(self, error: Exception, message: str) -> None:
+        """Log a failed request, raising SearchUnavailableError unless elastic rejected it"""
+        self.logger.exception(message)
+        if self.unavailable(error):
+            raise SearchUnavailableError(f'{message}: {error!r}') from error
+
+    @asynccontextmanager
+    async def request(self, operation: str) -> AsyncIterator[None]:
+        """Measured Elasticsearch request, within the circuit breaker and concurrency limit of the worker (if any)
+
+        While the circuit is open requests fail fast with SearchUnavailableError, never reaching elastic.
+        """
+        with breaker.elastic_breaker.guard(self.unavailable) if breaker.elastic_breaker else nullcontext():
+            if limiter.elastic_limiter is None:
+                with observe_elastic(self.index, operation, self.REJECTED):
+                    yield
+                return
+            async with limiter.elastic_limiter.slot():
+                with observe_elastic(self.index, operation, self.REJECTED):
+                    yield
+
+    def count_fetched(self, count: int) -> None:
+        self.fetched += count
+        self.fetched_counter.inc(count)
 
     @staticmethod
     def get_sort_query(sort_by: Optional[str]) -> Optional[dict]:
@@ -24,31 +69,37 @@ class ElasticSearcher(SearchAPI):
                 sort = [{sort_by: {"order": "asc"}, }, ]
         return sort
 
+    @traced('elastic.search')
     async def query_elastic(self,
                             query: Optional[object],
-                            cursor: SearchCursor) -> list[Optional[object]]:
+                            cursor: SearchCursor,
+                            fields: Optional[list[str]] = None) -> list[Optional[object]]:
         try:
             sort_query = self.get_sort_query(cursor.sort)
-            resp = await self.elastic.search(
-                index=self.index,
-                body={"query": query},
-                from_=cursor.offset,
-                size=cursor.size,
-                sort=sort_query)
-
-            self.logger.info('elastic: index=%s, query=%s, offset=%d, size=%d sort=%s' %
-                             (self.index, query, cursor.offset, cursor.size, str(sort_query)))
+            async with self.request('search'):
+                resp = await self.elastic.search(
+                    index=self.index,
+                    body={"query": query},
+                    from_=cursor.offset,
+                    size=cursor.size,
+                    sort=sort_query,
+                    source_includes=fields,
+                    source_excludes=self.SOURCE_EXCLUDES)
+
+            self.logger.info('elastic: index=%s, query=%s, offset=%d, size=%d sort=%s',
+                             self.index, query, cursor.offset, cursor.size, sort_query)
         except NotFoundError:
             self.logger.exception("The requested index was not found")
             return []
-        except Exception:
-            self.logger.exception("The search request could not be performed as requested")
+        except SearchUnavailableError:
+            raise
+        except Exception as e:
+            self.failed(e, "The search request could not be performed as requested")
             return []
 
         try:
-            self.logger.info(
-                "Total found %d documents" % (resp['hits']['total']['value']))
-            self.fetched += len(resp['hits']['hits'])
+            self.logger.info("Total found %d documents", resp['hits']['total']['value'])
+            self.count_fetched(len(resp['hits']['hits']))
             return (
                 doc['_source'] for doc in resp['hits']['hits']
             )
@@ -56,12 +107,89 @@ class ElasticSearcher(SearchAPI):
             self.logger.exception("The requested query yielded no result")
             return []
 
-    async def list_index(self, cursor: SearchCursor) -> list[object]:
+    async def list_index(self, cursor: SearchCursor, fields: Optional[list[str]] = None) -> list[object]:
         """ List all available documents from index with simple match_all query"""
-        return await self.query_elastic({'match_all': {}}, cursor)
+        return await self.query_elastic({'match_all': {}}, cursor, fields)
+
+    async def search_index(self, cursor: SearchCursor, request: Matching,
+                           fields: Optional[list[str]] = None) -> list[object]:
+        """Search documents in an index, using cursor and filter to query on a field (or several ones)"""
+        return await self.query_elastic(self.get_query(request), cursor, fields)
+
+    def get_query(self, request: Matching) -> dict:
+        if isinstance(request, MultiFieldRequest):
+            return self.get_multi_field_query(request)
+        if isinstance(request, SimilarRequest):
+            return self.get_similar_query(request)
+        return self.get_match_query(request)
+
+    @staticmethod
+    def nested(path: str, query: dict) -> dict:
+        """Query on a field of nested documents (as is for a field of the document itself)"""
+        if '.' not in path:
+            return query
+        return {"nested": {"path": path.split('.')[0], "query": query, "score_mode": "max"}}
+
+    @classmethod
+    def get_multi_field_query(cls, request: MultiFieldRequest) -> dict:
+        """Query matching any of the fields, scored by the best boosted fields match
+
+        Fields of the document itself are matched together, fields of nested documents one by one.
+        Filters go to filter context: they are not scored, and elastic caches them between requests.
+        """
+        own = [f'{path}^{boost}' for path, boost in request.fields.items() if '.' not in path]
+        should = [{"multi_match": {"query": request.query, "fields": own, "type": "best_fields"}}] if own else []
+        should += [
+            cls.nested(path, {"match": {path: {"query": request.query, "boost": boost}}})
+            for path, boost in request.fields.items() if '.' in path
+        ]
+        query = {"should": should, "minimum_should_match": 1}
+        if request.filters:
+            query["filter"] = cls.get_filters(request.filters)
+        return {"bool": query}
+
+    def get_similar_query(self, request: SimilarRequest) -> dict:
+        """Documents sharing the most terms with the document, in any of the fields, the document itself excluded
 
-    async def search_index(self, cursor: SearchCursor, request: SearchRequest) -> list[object]:
-        """Search documents in an index, using cursor and filter to query on a field"""
+        Fields of the document itself are compared with the stored document, fields of nested documents
+        with their values given along (more_like_this does not reach into nested documents by identifier).
+        """
+        terms = {"min_term_freq": 1, "min_doc_freq": 1, "max_query_terms": 25}
+        own = [path for path in request.fields if '.' not in path]
+        should = [{"more_like_this": {
+            "fields": own, "like": [{"_index": self.index, "_id": request.uuid}], **terms,
+        }}] if own else []
+        should += [
+            self.nested(path, {"more_like_this": {"fields": [path], "like": request.like[path], **terms}})
+            for path in request.fields if '.' in path and request.like.get(path)
+        ]
+        return {"bool": {"should": should, "minimum_should_match": 1,
+                         "must_not": [{"ids": {"values": [request.uuid]}}]}}
+
+    @classmethod
+    def get_filters(cls, filters: dict[str, str]) -> list[dict]:
+        """Exact values of fields, in filter context"""
+        return [cls.nested(path, {"term": {path: value}}) for path, value in filters.items()]
+
+    @staticmethod
+    def facet_name(path: str) -> str:
+        return path.split('.')[0]
+
+    @classmethod
+    def get_facet_aggregations(cls, request: FacetRequest) -> dict:
+        """Terms aggregations of keyword fields (in nested documents, if path is dotted), histograms of numeric ones"""
+        aggs = {}
+        for path in request.terms:
+            terms = {"terms": {"field": path, "size": request.size}}
+            if '.' in path:
+                terms = {"nested": {"path": cls.facet_name(path)}, "aggs": {"values": terms}}
+            aggs[cls.facet_name(path)] = terms
+        for path, interval in request.histograms.items():
+            aggs[cls.facet_name(path)] = {"histogram": {"field": path, "interval": interval, "min_doc_count": 1}}
+        return aggs
+
+    @staticmethod
+    def get_match_query(request: SearchRequest) -> dict:
         parent = request.path.split('.')[0] if '.' in request.path else None
         target_query = {
             "match": {
@@ -76,15 +204,194 @@ class ElasticSearcher(SearchAPI):
                 "query": target_query,
             },
         }
-        return await self.query_elastic(
-            parent_query if parent else target_query,
-            cursor
-        )
+        return parent_query if parent else target_query
+
+    @staticmethod
+    def encode_token(pit: str, after: list, sort: Optional[str]) -> str:
+        return base64.urlsafe_b64encode(orjson.dumps({'pit': pit, 'after': after, 'sort': sort})).decode()
+
+    @staticmethod
+    def decode_token(token: Optional[str], sort: Optional[str]) -> tuple[Optional[str], Optional[list]]:
+        """Get point-in-time and sort values to search after from token (empty token starts over)
+
+        Token only continues the walk with the sort it was issued for
+        """
+        if not token:
+            return None, None
+        try:
+            state = orjson.loads(base64.urlsafe_b64decode(token))
+            pit, after, issued = state['pit'], state['after'], state['sort']
+        except (ValueError, KeyError, TypeError) as e:
+            raise SearchCursorError(f'Malformed cursor token: {token}') from e
+        if issued != sort:
+            raise SearchCursorError(f'Cursor token issued for sort {issued}, not {sort}: {token}')
+        return pit, after
+
+    @traced('elastic.search_after')
+    async def page_index(self, cursor: SearchCursor, request: Optional[Matching] = None,
+                         fields: Optional[list[str]] = None) -> SearchPage:
+        """Page through point-in-time snapshot of the index with search_after, not limited by result window
 
+        Once the snapshot has expired (the walk paused for longer than its keep-alive), the walk goes on
+        in the same order through the live index, without a snapshot.
+        """
+        pit, after = self.decode_token(cursor.token, cursor.sort)
+        query = self.get_query(request) if request else {'match_all': {}}
+
+        # relevance orders multi-field search unless sorted, id tiebreaker makes sort values unique
+        # for search_after, with point-in-time or without
+        relevance = [{'_score': 'desc'}] if isinstance(request, MultiFieldRequest) else []
+        order = self.get_sort_query(cursor.sort) or relevance
+        sort_query = order + [{'id': 'asc'}]
+
+        async def search(pit: Optional[str]) -> dict:
+            target = {'pit': {'id': pit, 'keep_alive': self.PIT_KEEP_ALIVE}} if pit else {'index': self.index}
+            async with self.request('search_after'):
+                return await self.elastic.search(
+                    **target,
+                    query=query,
+                    size=cursor.size + 1,
+                    sort=sort_query,
+                    search_after=after,
+                    source_includes=fields,
+                    source_excludes=self.SOURCE_EXCLUDES)
+
+        try:
+            if after is None:
+                async with self.request('open_point_in_time'):
+                    resp = await self.elastic.open_point_in_time(index=self.index, keep_alive=self.PIT_KEEP_ALIVE)
+                pit = resp['id']
+            try:
+                resp = await search(pit)
+            except NotFoundError:
+                if pit is None:
+                    raise
+                self.logger.info("Cursor point-in-time expired, paging on without it: %s", pit)
+                pit = None
+                resp = await search(pit)
+        except NotFoundError:
+            self.logger.exception("The requested index was not found")
+            return SearchPage([], None)
+        except BadRequestError as e:
+            # sort values of a tampered token do not fit the sort
+            if after is not None:
+                raise SearchCursorError(f'Cursor sort values rejected: {after}') from e
+            self.failed(e, "The cursor search request could not be performed as requested")
+            return SearchPage([], None)
+        except SearchUnavailableError:
+            raise
+        except Exception as e:
+            self.failed(e, "The cursor search request could not be performed as requested")
+            return SearchPage([], None)
+
+        # one extra document tells if there is a page after this one
+        hits = resp['hits']['hits'][:cursor.size]
+        last = len(resp['hits']['hits']) <= cursor.size
+        self.count_fetched(len(hits))
+        self.logger.info('elastic: index=%s, query=%s, after=%s, size=%d sort=%s',
+                         self.index, query, after, cursor.size, sort_query)
+
+        # no need to keep snapshot after the last page
+        pit = resp.get('pit_id', pit)
+        if last and pit:
+            try:
+                await self.elastic.close_point_in_time(id=pit)
+            except Exception:
+                self.logger.exception("The point-in-time could not be closed")
+        if last:
+            return SearchPage([doc['_source'] for doc in hits], None)
+        return SearchPage([doc['_source'] for doc in hits], self.encode_token(pit, hits[-1]['sort'], cursor.sort))
+
+    @traced('elastic.suggest')
+    async def suggest_index(self, request: SuggestRequest, fields: Optional[list[str]] = None) -> list[object]:
+        """Documents completing the prefix, from completion suggester of the index (heavier weight first)"""
+        try:
+            async with self.request('suggest'):
+                resp = await self.elastic.search(
+                    index=self.index,
+                    # options carry their documents, no hits of the (match all) query are needed
+                    size=0,
+                    suggest={'completion': {
+                        'prefix': request.prefix,
+                        'completion': {'field': 'suggest', 'size': request.size},
+                    }},
+                    source_includes=fields,
+                    source_excludes=self.SOURCE_EXCLUDES)
+        except NotFoundError:
+            self.logger.exception("The requested index was not found")
+            return []
+        except SearchUnavailableError:
+            raise
+        except Exception as e:
+            self.failed(e, "The suggest request could not be performed as requested")
+            return []
+
+        options = resp['suggest']['completion'][0]['options']
+        self.count_fetched(len(options))
+        self.logger.info('elastic: index=%s, suggest=%s, found=%d', self.index, request.prefix, len(options))
+        return [option['_source'] for option in options]
+
+    @traced('elastic.aggregate')
+    async def facet_index(self, request: FacetRequest) -> Optional[dict]:
+        """Count documents by facets with aggregations only, in one request without hits
+
+        Requests of size 0 are served from the shard request cache until the index is refreshed.
+        """
+        query = {"bool": {"filter": self.get_filters(request.filters)}} if request.filters else {"match_all": {}}
+        try:
+            async with self.request('aggregate'):
+                resp = await self.elastic.search(
+                    index=self.index,
+                    query=query,
+                    aggs=self.get_facet_aggregations(request),
+                    size=0,
+                    track_total_hits=True,
+                    request_cache=True)
+        except NotFoundError:
+            self.logger.exception("The requested index was not found")
+            return None
+        except SearchUnavailableError:
+            raise
+        except Exception as e:
+            self.failed(e, "The aggregation request could not be performed as requested")
+            return None
+
+        facets = {'total': resp['hits']['total']['value']}
+        for name, agg in resp['aggregations'].items():
+            buckets = agg['values']['buckets'] if 'values' in agg else agg['buckets']
+            facets[name] = [{'key': bucket['key'], 'count': bucket['doc_count']} for bucket in buckets]
+        self.logger.info('elastic: index=%s, facets=%s, query=%s', self.index, request, query)
+        return facets
+
+    @traced('elastic.get')
     async def get_document(self, uuid: UUID) -> Optional[object]:
         """Retrieve specific document from index, using its identifier"""
         try:
-            doc = await self.elastic.get(index=self.index, id=uuid)
+            async with self.request('get'):
+                doc = await self.elastic.get(index=self.index, id=uuid, source_excludes=self.SOURCE_EXCLUDES)
         except NotFoundError:
             return None
+        except SearchUnavailableError:
+            raise
+        except Exception as e:
+            self.failed(e, "The document could not be retrieved")
+            raise
+        self.count_fetched(1)
         return doc['_source']
+
+    @traced('elastic.mget')
+    async def get_documents(self, uuids: list[UUID]) -> list[Optional[object]]:
+        """Retrieve several documents from index in one request, using their identifiers"""
+        try:
+            async with self.request('mget'):
+                resp = await self.elastic.mget(index=self.index, ids=[str(uuid) for uuid in uuids],
+                                               source_excludes=self.SOURCE_EXCLUDES)
+        except NotFoundError:
+            return [None] * len(uuids)
+        except SearchUnavailableError:
+            raise
+        except Exception as e:
+            self.failed(e, "The documents could not be retrieved")
+            raise
+        self.count_fetched(len(resp['docs']))
+        return [doc['_source'] if doc.get('found') else None for doc in resp['docs']]
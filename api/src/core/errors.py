@@ -17,6 +17,7 @@ class FilmErrors:
     NO_SUCH_ID = _create_id_error("film")
     FILMS_NOT_FOUND = _create_list_error("films")
     SEARCH_WO_RESULTS = Template(_create_search_error("films"))
+    FACETS_NOT_AVAILABLE = "Films facets not available"
 
 
 class GenreErrors:
@@ -29,3 +30,16 @@ class PersonErrors:
     NO_SUCH_ID = _create_id_error("person")
     PERSONS_NOT_FOUND = _create_list_error("persons")
     SEARCH_WO_RESULTS = Template(_create_search_error("persons"))
+
+
+class SearchErrors:
+    OVERLOADED = "Search is overloaded, retry in a while"
+    UNAVAILABLE = "Search is unavailable, retry in a while"
+
+
+class CursorErrors:
+    INVALID = "Page cursor is malformed or expired"
+
+
+class BatchErrors:
+    TOO_MANY_IDS = Template("At most $limit ids can be requested at once")
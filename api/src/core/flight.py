@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from core.metrics import CACHE_COLLAPSED, CACHE_FILL_TIMEOUTS
+from interfaces.cache import CacheAPI
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """Collapses concurrent identical calls in the process into one shared execution"""
+
+    def __init__(self, index: str) -> None:
+        self.calls: dict[str, asyncio.Task] = {}
+        self.executed = 0
+        self.collapsed = 0
+        self.collapsed_counter = CACHE_COLLAPSED.labels(index, 'process')
+
+    def launch(self, key: str, call: Callable[[], Awaitable[T]]) -> asyncio.Task:
+        """Start call for the key, unless one is already in flight"""
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            task.add_done_callback(lambda _: self.calls.pop(key, None))
+            self.calls[key] = task
+            self.executed += 1
+        else:
+            self.collapsed += 1
+            self.collapsed_counter.inc()
+        return task
+
+    async def do(self, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        """Run call for the key, or join the one already in flight"""
+        # shielded, so a cancelled caller does not cancel the call for the others
+        return await asyncio.shield(self.launch(key, call))
+
+
+class FillLock:
+    """Cross-worker lock, letting only one worker recompute a missing cache key
+
+    Workers failing to take the lock wait for the key to be filled by the owner,
+    and recompute it themselves only if the wait times out.
+    """
+
+    def __init__(self, index: str, cacher: CacheAPI, ttl: float, wait: float, poll: float) -> None:
+        self.cacher = cacher
+        self.ttl = ttl
+        self.wait = wait
+        self.poll = poll
+        self.collapsed = 0
+        self.timeouts = 0
+        self.collapsed_counter = CACHE_COLLAPSED.labels(index, 'cluster')
+        self.timeout_counter = CACHE_FILL_TIMEOUTS.labels(index)
+        self.logger = logging.getLogger("FillLock:")
+
+    async def fill(self,
+                   key: str,
+                   lookup: Callable[[], Awaitable[Optional[T]]],
+                   compute: Callable[[], Awaitable[T]]) -> T:
+        if await self.cacher.acquire(key, self.ttl):
+            try:
+                return await compute()
+            finally:
+                await self.cacher.release(key)
+
+        deadline = time.monotonic() + self.wait
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll)
+            if (value := await lookup()) is not None:
+                self.collapsed += 1
+                self.collapsed_counter.inc()
+                return value
+
+        self.timeouts += 1
+        self.timeout_counter.inc()
+        self.logger.warning('Timed out waiting for key fill: %s', key)
+        return await compute()
@@ -1,6 +1,26 @@
+import os
+import shutil
+
 from core.config import settings
 
+# must be set before prometheus_client is imported, so that workers write metrics to shared files
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', settings.METRICS_MULTIPROC_DIR)
+
+from prometheus_client import multiprocess  # noqa: E402
+
 bind = f'{settings.APP_HOST}:{settings.APP_PORT}'
 workers = settings.APP_WORKERS
 reload = settings.DEBUG
 worker_class = settings.APP_WORKERS_CLASS
+
+
+def on_starting(server):
+    """Drop metrics left by workers of a previous run"""
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def child_exit(server, worker):
+    """Stop reporting live gauges of a dead worker"""
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Optional
+
+from interfaces.search import SearchOverloadedError
+
+# set while requests are made in background (e.g. revalidation of stale keys): they are shed at once
+# instead of queueing, leaving capacity to requests of clients, which are served from cache meanwhile
+background: ContextVar[bool] = ContextVar('limiter_background', default=False)
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit of requests to a backend, adapted to its observed latency
+
+    The limit grows by one after about limit requests completed within latency seconds while the limit
+    is in use, and shrinks by backoff on a slower or failed request (at most once per latency seconds,
+    so that one burst of slow requests does not collapse it). Requests over the limit wait in queue
+    for at most queue_wait seconds, then are shed. Exceptions of benign types are not failures.
+    """
+
+    def __init__(self, initial: int = 20, min_limit: int = 2, max_limit: int = 200, latency: float = 0.25,
+                 backoff: float = 0.8, queue_wait: float = 0.1, benign: tuple[type, ...] = ()) -> None:
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency = latency
+        self.backoff = backoff
+        self.queue_wait = queue_wait
+        self.benign = benign
+        self.in_flight = 0
+        self.shed = 0
+        self.decreased = 0.0
+        self.waiters: deque[asyncio.Future] = deque()
+
+    def reject(self) -> None:
+        self.shed += 1
+        raise SearchOverloadedError(f'Concurrency limit {int(self.limit)} reached, {len(self.waiters)} queued')
+
+    async def acquire(self) -> None:
+        """Take a slot under the limit, waiting in queue for a while; SearchOverloadedError if none is freed"""
+        if self.in_flight < int(self.limit) and not self.waiters:
+            self.in_flight += 1
+            return
+        wait = 0.0 if background.get() else self.queue_wait
+        if wait <= 0:
+            self.reject()
+
+        # a freed slot is handed over to the first waiter, still counted in flight
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), wait)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                waiter.cancel()
+                self.reject()
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release_slot()
+            waiter.cancel()
+            raise
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+    def release_slot(self) -> None:
+        self.in_flight -= 1
+        while self.waiters and self.in_flight < int(self.limit):
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self.in_flight += 1
+
+    def release(self, latency: float, failed: bool) -> None:
+        """Return a slot, adapting the limit to latency of the request"""
+        now = time.monotonic()
+        if failed or latency > self.latency:
+            if now - self.decreased >= self.latency:
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                self.decreased = now
+        elif self.in_flight * 2 >= self.limit:
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+        self.release_slot()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Run a request within the limit, measuring its latency"""
+        await self.acquire()
+        started = time.monotonic()
+        failed = False
+        try:
+            yield
+        except self.benign:
+            raise
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.release(time.monotonic() - started, failed)
+
+
+# concurrency limit of Elasticsearch requests of the worker, unless disabled
+elastic_limiter: Optional[AdaptiveLimiter] = None
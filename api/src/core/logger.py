@@ -1,4 +1,7 @@
 import logging
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
 
 DEBUG = logging.DEBUG
 INFO = logging.INFO
@@ -7,6 +10,11 @@ WARNING = logging.WARNING
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 LOG_DEFAULT_HANDLERS = ['console', ]
 
+# Логгеры, пишущие на каждый запрос: их записи уровня ниже WARNING ограничиваются по частоте
+HOT_PATH_LOGGERS = ('DocumentService', 'ElasticSearcher', 'CacheAPI', 'FillLock')
+# Логгеры, обработчики которых выносятся из event loop в поток записи
+QUEUED_LOGGERS = ('', 'uvicorn.access')
+
 # В логгере настраивается логгирование uvicorn-сервера.
 # Про логирование в Python можно прочитать в документации
 # https://docs.python.org/3/howto/logging.html
@@ -66,3 +74,66 @@ LOGGING = {
         'handlers': LOG_DEFAULT_HANDLERS,
     },
 }
+
+
+class RateLimitFilter(logging.Filter):
+    """Pass records of every call site of hot path loggers at most rate per second, with bursts
+
+    Warnings and errors, and records of other loggers always pass.
+    """
+
+    def __init__(self, prefixes: tuple[str, ...], rate: float, burst: int) -> None:
+        super().__init__()
+        self.prefixes = prefixes
+        self.rate = rate
+        self.burst = burst
+        # call site to tokens left and time they were counted at
+        self.buckets: dict[tuple, tuple[float, float]] = {}
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not record.name.startswith(self.prefixes):
+            return True
+        now = time.monotonic()
+        site = (record.name, record.pathname, record.lineno)
+        tokens, counted = self.buckets.get(site, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - counted) * self.rate)
+        if tokens < 1:
+            self.buckets[site] = (tokens, now)
+            self.dropped += 1
+            return False
+        self.buckets[site] = (tokens - 1, now)
+        return True
+
+
+class LazyQueueHandler(QueueHandler):
+    """Enqueue records as they are: message is formatted by the listener thread, off the event loop
+
+    Arguments of records are kept by reference, so they must not be changed once logged.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def enqueue(names: tuple[str, ...] = QUEUED_LOGGERS,
+            filters: tuple[logging.Filter, ...] = ()) -> list[QueueListener]:
+    """Move handlers of loggers behind queues, written to by listener threads
+
+    Filters are applied before records are enqueued, so dropped records are never formatted.
+    Listeners should be stopped on shutdown, to flush records left in queues.
+    """
+    listeners = []
+    for name in names:
+        logger = logging.getLogger(name)
+        if not logger.handlers or any(isinstance(h, QueueHandler) for h in logger.handlers):
+            continue
+        records = queue.SimpleQueue()
+        listener = QueueListener(records, *logger.handlers, respect_handler_level=True)
+        handler = LazyQueueHandler(records)
+        for fltr in filters:
+            handler.addFilter(fltr)
+        logger.handlers = [handler]
+        listener.start()
+        listeners.append(listener)
+    return listeners
@@ -0,0 +1,82 @@
+from typing import Optional
+
+from core.tracing import span
+
+
+# Mappers build response bodies straight from documents of the index, in one pass
+# and without intermediate models: the result is what the matching converter
+# would produce from the validated model, dumped (see tests/unit/test_mapper.py)
+
+
+class FilmBaseMapper:
+    @staticmethod
+    def map(doc: dict) -> dict:
+        return {
+            'uuid': doc['id'],
+            'title': doc['title'],
+            'imdb_rating': float(doc['imdb_rating']),
+        }
+
+
+class FilmSuggestionMapper:
+    @staticmethod
+    def map(doc: dict) -> dict:
+        return {
+            'uuid': doc['id'],
+            'title': doc['title'],
+        }
+
+
+class GenreMapper:
+    @staticmethod
+    def map(doc: dict) -> dict:
+        return {
+            'uuid': doc['id'],
+            'name': doc['name'],
+        }
+
+
+class PersonBaseMapper:
+    @staticmethod
+    def map(doc: dict) -> dict:
+        return {
+            'uuid': doc['id'],
+            'full_name': doc['full_name'],
+        }
+
+
+class FilmMapper:
+    @staticmethod
+    def map(doc: dict) -> dict:
+        def pers_base(persons: Optional[list[dict]]) -> list[dict]:
+            return [{'uuid': prsn['id'], 'full_name': prsn['full_name']} for prsn in persons or []]
+
+        return {
+            'uuid': doc['id'],
+            'title': doc['title'],
+            'imdb_rating': float(doc['imdb_rating']),
+            'description': doc['description'],
+            'genre': [{'uuid': gnr['id'], 'name': gnr['name']} for gnr in doc.get('genre') or []],
+            'actors': pers_base(doc.get('actors')),
+            'writers': pers_base(doc.get('writers')),
+            'directors': pers_base(doc.get('directors')),
+        }
+
+
+class PersonMapper:
+    @staticmethod
+    def map(doc: dict) -> dict:
+        return {
+            'uuid': doc['id'],
+            'full_name': doc['full_name'],
+            'films': [
+                {'film_uuid': film['film_id'], 'role': film['role'], 'title': film['title']}
+                for film in doc.get('films') or []
+            ],
+        }
+
+
+def map_many(mapper: type, docs: list[dict]) -> list[dict]:
+    """Map a list of index documents to response bodies with the mapper"""
+    with span('mapper.map', mapper=mapper.__name__, count=len(docs)):
+        return [mapper.map(doc) for doc in docs]
@@ -0,0 +1,236 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Union
+
+from pydantic import BaseModel
+
+from core.metrics import MeteredStats
+from interfaces.cache import CacheAPI, CacheEntry, CacheIndex
+
+
+class LocalStore:
+    """Bounded in-process key-value store with TTL and LRU eviction"""
+
+    def __init__(self, size: int, ttl: float) -> None:
+        self.size = size
+        self.ttl = ttl
+        self.entries: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires < time.monotonic():
+            self.drop(key)
+            return None
+        self.touch(key)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        if key not in self.entries and len(self.entries) >= self.size:
+            self.evict()
+        self.entries[key] = (value, time.monotonic() + self.ttl)
+        self.touch(key)
+
+    def drop(self, key: str) -> None:
+        self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def touch(self, key: str) -> None:
+        """Mark key as recently used"""
+        self.entries.move_to_end(key)
+
+    def evict(self) -> None:
+        """Drop least recently used key"""
+        self.entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class LFUStore(LocalStore):
+    """Local store evicting the least frequently used key (oldest among equals)"""
+
+    def __init__(self, size: int, ttl: float) -> None:
+        super().__init__(size, ttl)
+        self.counts: dict[str, int] = {}
+        self.buckets: dict[int, OrderedDict[str, None]] = {}
+        self.lowest = 0
+
+    def drop(self, key: str) -> None:
+        if key not in self.entries:
+            return
+        super().drop(key)
+        count = self.counts.pop(key)
+        self.unlink(key, count)
+        if self.lowest == count and count not in self.buckets:
+            self.lowest = min(self.buckets, default=0)
+
+    def clear(self) -> None:
+        super().clear()
+        self.counts.clear()
+        self.buckets.clear()
+        self.lowest = 0
+
+    def touch(self, key: str) -> None:
+        count = self.counts.get(key, 0)
+        if count:
+            self.unlink(key, count)
+        self.counts[key] = count + 1
+        self.buckets.setdefault(count + 1, OrderedDict())[key] = None
+        if not count:
+            self.lowest = 1
+        elif self.lowest == count and count not in self.buckets:
+            self.lowest = count + 1
+
+    def evict(self) -> None:
+        key, _ = self.buckets[self.lowest].popitem(last=False)
+        if not self.buckets[self.lowest]:
+            del self.buckets[self.lowest]
+        del self.counts[key]
+        del self.entries[key]
+
+    def unlink(self, key: str, count: int) -> None:
+        bucket = self.buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[count]
+
+
+class MemoryCacher(CacheAPI):
+    """Per-process cacher, serving hot keys from memory in front of a shared cache tier
+
+    Local keys carry the index generation of the shared tier, so keys of an index invalidated by any worker
+    are not served once the worker learns the new generation.
+    """
+
+    POLICIES = {'lru': LocalStore, 'lfu': LFUStore}
+
+    def __init__(self, index: str, backend: CacheAPI,
+                 size: int, ttl: float, policy: str = 'lru') -> None:
+        self.index = index
+        self.backend = backend
+        self.store = self.POLICIES[policy](size, ttl)
+        self.stats = MeteredStats(index, 'local')
+        self.logger = logging.getLogger("CacheAPI:")
+
+    @staticmethod
+    def plain(value: Any) -> Any:
+        return value.dict() if isinstance(value, BaseModel) else value
+
+    async def local(self, key: str) -> str:
+        """Local key of the current index generation"""
+        return f'{await self.backend.get_generation()}__{key}'
+
+    async def get_scalar(self, key: str) -> Optional[dict]:
+        local = await self.local(key)
+        if (value := self.store.get(local)) is not None:
+            self.stats.hit()
+            return value
+        self.stats.miss()
+
+        value = await self.backend.get_scalar(key)
+        if value is not None:
+            self.store.put(local, value)
+        return value
+
+    async def put_scalar(self, key: str, value: Union[dict, BaseModel], ttl: Optional[int] = None) -> None:
+        self.store.put(await self.local(key), self.plain(value))
+        await self.backend.put_scalar(key, value, ttl)
+
+    async def get_scalars(self, keys: list[str]) -> list[Optional[dict]]:
+        generation = await self.backend.get_generation()
+        values = [self.store.get(f'{generation}__{key}') for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        self.stats.hit(len(keys) - len(missing))
+        self.stats.miss(len(missing))
+        if not missing:
+            return values
+
+        fetched = await self.backend.get_scalars([keys[i] for i in missing])
+        for i, value in zip(missing, fetched):
+            if value is not None:
+                self.store.put(f'{generation}__{keys[i]}', value)
+                values[i] = value
+        return values
+
+    async def put_scalars(self, values: dict[str, Union[dict, BaseModel]]) -> None:
+        generation = await self.backend.get_generation()
+        for key, value in values.items():
+            self.store.put(f'{generation}__{key}', self.plain(value))
+        await self.backend.put_scalars(values)
+
+    async def put_missing(self, keys: list[str]) -> None:
+        generation = await self.backend.get_generation()
+        for key in keys:
+            self.store.put(f'{generation}__{key}', {})
+        await self.backend.put_missing(keys)
+
+    async def get_vector(self, key: str) -> Optional[list[dict]]:
+        result = await self.get_index(key)
+        return result.values if result else None
+
+    async def get_index(self, key: str) -> Optional[CacheIndex]:
+        local = await self.local(key)
+        if (result := self.store.get(local)) is not None:
+            self.stats.hit()
+            return result
+        self.stats.miss()
+
+        result = await self.backend.get_index(key)
+        if result is not None:
+            self.store.put(local, result)
+        return result
+
+    async def put_vector(self, key: str, data: list[dict]) -> None:
+        # just fetched values are fresh for the whole local TTL
+        self.store.put(await self.local(key), CacheIndex.construct(values=[self.plain(value) for value in data]))
+        await self.backend.put_vector(key, data)
+
+    async def get_raw(self, key: str) -> Optional[CacheEntry]:
+        local = await self.local(key)
+        if (cached := self.store.get(local)) is not None:
+            self.stats.hit()
+            return cached
+        self.stats.miss()
+
+        cached = await self.backend.get_raw(key)
+        if cached is not None:
+            self.store.put(local, cached)
+        return cached
+
+    async def get_etag(self, key: str) -> Optional[str]:
+        if (cached := self.store.get(await self.local(key))) is not None:
+            self.stats.hit()
+            return cached.etag
+        self.stats.miss()
+        return await self.backend.get_etag(key)
+
+    async def get_fallback(self, key: str) -> Optional[CacheEntry]:
+        return await self.backend.get_fallback(key)
+
+    async def put_raw(self, key: str, data: bytes, ttl: Optional[int] = None) -> CacheEntry:
+        cached = await self.backend.put_raw(key, data, ttl)
+        self.store.put(await self.local(key), cached)
+        return cached
+
+    async def drop_key(self, key: str) -> None:
+        self.store.drop(await self.local(key))
+        await self.backend.drop_key(key)
+
+    async def get_generation(self) -> int:
+        return await self.backend.get_generation()
+
+    async def drop_index(self) -> int:
+        self.store.clear()
+        return await self.backend.drop_index()
+
+    async def acquire(self, key: str, ttl: float) -> bool:
+        return await self.backend.acquire(key, ttl)
+
+    async def release(self, key: str) -> None:
+        await self.backend.release(key)
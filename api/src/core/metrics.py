@@ -0,0 +1,187 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+from starlette.routing import Match
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from core.admission import FrequencyAdmission
+from core.breaker import CircuitBreaker
+from core.limiter import AdaptiveLimiter
+from interfaces.cache import CacheStats
+
+# gunicorn workers write metrics to files in this directory, aggregated on every scrape
+MULTIPROC_DIR = 'PROMETHEUS_MULTIPROC_DIR'
+
+REQUEST_LATENCY = Histogram(
+    'api_request_duration_seconds', 'API request latency', ['method', 'route', 'status'])
+REQUESTS_IN_FLIGHT = Gauge(
+    'api_requests_in_flight', 'API requests being served', ['method', 'route'], multiprocess_mode='livesum')
+
+CACHE_REQUESTS = Counter(
+    'api_cache_requests_total', 'Cache lookups by index, tier and result (hit or miss)', ['index', 'tier', 'result'])
+CACHE_MISSING_HITS = Counter(
+    'api_cache_missing_hits_total', 'Cache hits of documents known to be missing and empty pages', ['index'])
+CACHE_FALLBACKS = Counter(
+    'api_cache_fallbacks_total', 'Expired values served while Elasticsearch is unavailable', ['index'])
+CACHE_COLLAPSED = Counter(
+    'api_cache_fills_collapsed_total', 'Cache misses joined to a fill of the same key by index and scope',
+    ['index', 'scope'])
+CACHE_FILL_TIMEOUTS = Counter(
+    'api_cache_fill_timeouts_total', 'Cache misses recomputed after timing out waiting for the fill lock', ['index'])
+CACHE_ADMISSIONS = Counter(
+    'api_cache_admissions_total', 'Cache fills by index and admission decision', ['index', 'result'])
+
+ELASTIC_LATENCY = Histogram(
+    'api_elastic_request_duration_seconds', 'Elasticsearch request latency', ['index', 'operation'])
+ELASTIC_ERRORS = Counter(
+    'api_elastic_errors_total', 'Failed Elasticsearch requests', ['index', 'operation'])
+ELASTIC_FETCHED = Counter(
+    'api_elastic_documents_fetched_total', 'Documents fetched from Elasticsearch', ['index'])
+ELASTIC_LIMIT = Gauge(
+    'api_elastic_concurrency_limit', 'Adaptive limit of concurrent Elasticsearch requests', multiprocess_mode='livesum')
+ELASTIC_IN_FLIGHT = Gauge(
+    'api_elastic_requests_in_flight', 'Elasticsearch requests in flight', multiprocess_mode='livesum')
+ELASTIC_SHED = Counter(
+    'api_elastic_requests_shed_total', 'Elasticsearch requests shed over the concurrency limit')
+ELASTIC_CIRCUIT = Gauge(
+    'api_elastic_circuit_state', 'Circuit breaker of Elasticsearch requests (0 closed, 1 half open, 2 open)',
+    multiprocess_mode='liveall')
+ELASTIC_CIRCUIT_OPENED = Counter(
+    'api_elastic_circuit_opened_total', 'Circuit breaker of Elasticsearch requests opened')
+
+
+class MeteredStats(CacheStats):
+    """Cache tier counters, exported as metrics as well"""
+
+    def __init__(self, index: str, tier: str) -> None:
+        super().__init__(tier)
+        self.hit_counter = CACHE_REQUESTS.labels(index, tier, 'hit')
+        self.miss_counter = CACHE_REQUESTS.labels(index, tier, 'miss')
+
+    def hit(self, count: int = 1) -> None:
+        super().hit(count)
+        self.hit_counter.inc(count)
+
+    def miss(self, count: int = 1) -> None:
+        super().miss(count)
+        self.miss_counter.inc(count)
+
+
+class MeteredAdmission(FrequencyAdmission):
+    """Cache admission policy, exporting its decisions as metrics"""
+
+    def __init__(self, index: str, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.admitted_counter = CACHE_ADMISSIONS.labels(index, 'admitted')
+        self.rejected_counter = CACHE_ADMISSIONS.labels(index, 'rejected')
+
+    def admit(self, key: str) -> bool:
+        if admitted := super().admit(key):
+            self.admitted_counter.inc()
+        else:
+            self.rejected_counter.inc()
+        return admitted
+
+
+class MeteredLimiter(AdaptiveLimiter):
+    """Concurrency limit of Elasticsearch requests, exporting the limit, requests in flight and shed as metrics"""
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        ELASTIC_LIMIT.set(int(self.limit))
+
+    def reject(self) -> None:
+        ELASTIC_SHED.inc()
+        super().reject()
+
+    async def acquire(self) -> None:
+        await super().acquire()
+        ELASTIC_IN_FLIGHT.set(self.in_flight)
+
+    def release(self, latency: float, failed: bool) -> None:
+        super().release(latency, failed)
+        ELASTIC_LIMIT.set(int(self.limit))
+        ELASTIC_IN_FLIGHT.set(self.in_flight)
+
+
+class MeteredBreaker(CircuitBreaker):
+    """Circuit breaker of Elasticsearch requests, exporting its state and openings as metrics"""
+
+    STATES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        ELASTIC_CIRCUIT.set(self.STATES[self.state])
+
+    def switch(self, state: str) -> None:
+        super().switch(state)
+        ELASTIC_CIRCUIT.set(self.STATES[state])
+        if state == self.OPEN:
+            ELASTIC_CIRCUIT_OPENED.inc()
+
+
+@contextmanager
+def observe_elastic(index: str, operation: str, rejected: tuple[type, ...] = ()) -> Iterator[None]:
+    """Measure latency of an Elasticsearch request, counting failures (requests elastic rejected are not ones)"""
+    start = time.perf_counter()
+    try:
+        yield
+    except rejected:
+        raise
+    except Exception:
+        ELASTIC_ERRORS.labels(index, operation).inc()
+        raise
+    finally:
+        ELASTIC_LATENCY.labels(index, operation).observe(time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """ASGI middleware measuring latency and concurrency of requests per route template"""
+
+    def __init__(self, app: ASGIApp, routes: list) -> None:
+        self.app = app
+        self.routes = routes
+
+    def route(self, scope: Scope) -> str:
+        # route template (not the path itself) keeps the number of label values bounded
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return 'unmatched'
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method, route = scope['method'], self.route(scope)
+        status = 500
+
+        async def send_status(message: dict) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        start = time.perf_counter()
+        in_flight = REQUESTS_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            in_flight.dec()
+            REQUEST_LATENCY.labels(method, route, status).observe(time.perf_counter() - start)
+
+
+def render() -> tuple[bytes, str]:
+    """Metrics in text exposition format, collected from all workers when run under gunicorn"""
+    registry = REGISTRY
+    if MULTIPROC_DIR in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
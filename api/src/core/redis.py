@@ -1,16 +1,30 @@
-import json
+import hashlib
 import logging
-from typing import Optional
+import time
+import uuid
+from typing import Optional, Union
 
+import orjson
 from aioredis import Redis
 from pydantic import BaseModel
 
-from interfaces.cache import CacheAPI, CacheIndex
+from core.metrics import MeteredStats
+from core.tracing import traced
+from interfaces.cache import CacheAPI, CacheEntry, CacheIndex, CacheTTL
+from models.base import dumps
 
 
 class RedisCacher(CacheAPI):
     """Redis-based cacher service implementation"""
 
+    # delete lock key only if it is still held by us
+    RELEASE_SCRIPT = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('del', KEYS[1])
+        end
+        return 0
+    """
+
     @classmethod
     def decode_redis(cls, src):
         """Decode redis bytes streams into Python structs"""
@@ -26,34 +40,163 @@ class RedisCacher(CacheAPI):
                 rv[key.decode()] = cls.decode_redis(src[key])
             return rv
         elif isinstance(src, bytes):
-            return json.loads(src.decode())
+            return orjson.loads(src)
         else:
             raise Exception("type not handled: " + type(src))
 
-    def __init__(self, index: str, redis: Redis) -> None:
+    def __init__(self, index: str, redis: Redis,
+                 ttl: CacheTTL = CacheTTL(), generation_ttl: float = 1.0) -> None:
         self.index = index
         self.redis = redis
+        self.ttl = ttl
+        self.stats = MeteredStats(index, 'redis')
         self.logger = logging.getLogger("CacheAPI:")
 
-    async def get_scalar(self, key: str) -> Optional[BaseModel]:
-        entry = f'{self.index}__{key}'
+        # index generation is shared by all workers through redis,
+        # but trusted locally for generation_ttl seconds to save a round trip
+        self.generation_key = f'{index}__generation'
+        self.generation_ttl = generation_ttl
+        self.generation = 0
+        self.generation_expires = 0.0
+
+        self.locks: dict[str, str] = {}
+
+    async def get_generation(self) -> int:
+        """Current index generation, baked into every key of the index"""
+        if self.generation_expires < time.monotonic():
+            value = await self.redis.get(self.generation_key)
+            self.generation = int(value) if value else 0
+            self.generation_expires = time.monotonic() + self.generation_ttl
+        return self.generation
+
+    async def entry(self, key: str) -> str:
+        return f'{self.index}__{await self.get_generation()}__{key}'
+
+    # compact value of keys known to be missing, distinct from any document
+    MISSING = b'{}'
+
+    @traced('redis.get_scalar')
+    async def get_scalar(self, key: str) -> Optional[dict]:
+        entry = await self.entry(key)
         object = await self.redis.get(f'{entry}')
         if object:
-            self.logger.debug(f'Redis state key found: {entry}')
+            self.logger.debug('Redis state key found: %s', entry)
+            self.stats.hit()
             return self.decode_redis(object)
+        self.stats.miss()
         return None
 
-    async def put_scalar(self, key: str, value: BaseModel) -> None:
-        entry = f'{self.index}__{key}'
-        self.logger.debug(f'Redis state put key: {entry}')
-        await self.redis.set(entry, value.json())
+    @traced('redis.put_scalar')
+    async def put_scalar(self, key: str, value: Union[dict, BaseModel], ttl: Optional[int] = None) -> None:
+        entry = await self.entry(key)
+        self.logger.debug('Redis state put key: %s', entry)
+        await self.redis.set(entry, dumps(value), ex=ttl or self.ttl.scalar)
+
+    @traced('redis.get_scalars')
+    async def get_scalars(self, keys: list[str]) -> list[Optional[dict]]:
+        entries = [await self.entry(key) for key in keys]
+        objects = await self.redis.mget(entries)
+        found = sum(object is not None for object in objects)
+        self.stats.hit(found)
+        self.stats.miss(len(keys) - found)
+        return [self.decode_redis(object) if object else None for object in objects]
+
+    @traced('redis.put_scalars')
+    async def put_scalars(self, values: dict[str, Union[dict, BaseModel]]) -> None:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, value in values.items():
+                pipe.set(await self.entry(key), dumps(value), ex=self.ttl.scalar)
+            await pipe.execute()
+
+    @traced('redis.put_missing')
+    async def put_missing(self, keys: list[str]) -> None:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.set(await self.entry(key), self.MISSING, ex=self.ttl.missing)
+            await pipe.execute()
 
     async def get_vector(self, key: str) -> list[Optional[dict]]:
+        result = await self.get_index(key)
+        return result.values if result else None
+
+    @traced('redis.get_index')
+    async def get_index(self, key: str) -> Optional[CacheIndex]:
         result = await self.get_scalar(key)
-        return CacheIndex(**result).values if result else None
+        # values were written by put_vector as they are, no need to validate them again
+        return CacheIndex.construct(**result) if result else None
 
+    @traced('redis.put_vector')
     async def put_vector(self, key: str, data: list[dict]) -> int:
-        await self.put_scalar(key, CacheIndex(values=data))
+        if not data:
+            # empty pages are not worth revalidation, just expire soon
+            await self.put_scalar(key, {'values': data}, self.ttl.missing)
+            return
+        # expired pages are kept for a while, to be served when they can not be fetched anew
+        now = time.time()
+        await self.put_scalar(
+            key,
+            {'values': data, 'fresh_until': now + self.ttl.vector,
+             'expires': now + self.ttl.vector + self.ttl.revalidate},
+            self.ttl.vector + self.ttl.revalidate + self.ttl.fallback)
+
+    @staticmethod
+    def content_tag(data: bytes) -> str:
+        """Strong entity tag of raw bytes"""
+        return f'"{hashlib.blake2b(data, digest_size=16).hexdigest()}"'
+
+    @traced('redis.get_raw')
+    async def get_raw(self, key: str) -> Optional[CacheEntry]:
+        entry = await self.entry(key)
+        data, etag = await self.redis.mget([entry, f'{entry}__etag'])
+        # bytes without entity tag are expired, only kept for fallback
+        if data is not None and etag is not None:
+            self.stats.hit()
+            return CacheEntry(data, etag.decode())
+        self.stats.miss()
+        return None
+
+    @traced('redis.get_fallback')
+    async def get_fallback(self, key: str) -> Optional[CacheEntry]:
+        data = await self.redis.get(await self.entry(key))
+        return CacheEntry(data, self.content_tag(data)) if data is not None else None
+
+    @traced('redis.get_etag')
+    async def get_etag(self, key: str) -> Optional[str]:
+        etag = await self.redis.get(f'{await self.entry(key)}__etag')
+        if etag is not None:
+            self.stats.hit()
+            return etag.decode()
+        self.stats.miss()
+        return None
+
+    @traced('redis.put_raw')
+    async def put_raw(self, key: str, data: bytes, ttl: Optional[int] = None) -> CacheEntry:
+        # hash is stored next to the bytes, so that conditional requests never read the bytes
+        cached = CacheEntry(data, self.content_tag(data))
+        entry = await self.entry(key)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(entry, data, ex=(ttl or self.ttl.vector) + self.ttl.fallback)
+            pipe.set(f'{entry}__etag', cached.etag, ex=ttl or self.ttl.vector)
+            await pipe.execute()
+        return cached
 
     async def drop_key(self, key: str) -> int:
-        await self.redis.delete(key)
+        return await self.redis.delete(await self.entry(key))
+
+    async def drop_index(self) -> int:
+        """Bump index generation: keys of previous generations are never read again and expire by TTL"""
+        self.generation = await self.redis.incr(self.generation_key)
+        self.generation_expires = time.monotonic() + self.generation_ttl
+        self.logger.info(f'{self.index} cache invalidated, generation {self.generation}')
+        return self.generation
+
+    async def acquire(self, key: str, ttl: float) -> bool:
+        token = uuid.uuid4().hex
+        if await self.redis.set(f'{await self.entry(key)}__lock', token, px=int(ttl * 1000), nx=True):
+            self.locks[key] = token
+            return True
+        return False
+
+    async def release(self, key: str) -> None:
+        if token := self.locks.pop(key, None):
+            await self.redis.eval(self.RELEASE_SCRIPT, 1, f'{await self.entry(key)}__lock', token)
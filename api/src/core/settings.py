@@ -1,5 +1,7 @@
 import multiprocessing
 import os
+import tempfile
+from typing import Optional
 
 from pydantic import BaseSettings
 
@@ -20,10 +22,145 @@ class Settings(BaseSettings):
     APP_WORKERS: int = multiprocessing.cpu_count() * 2 + 1
     APP_WORKERS_CLASS: str = 'uvicorn.workers.UvicornWorker'
 
+    # Максимальное число документов в одном запросе по списку идентификаторов
+    BATCH_MAX_IDS: int = 100
+
+    # Выгрузка индекса потоком NDJSON: число документов в одном запросе к Elasticsearch (по умолчанию и наибольшее)
+    EXPORT_PAGE_SIZE: int = 1000
+    EXPORT_MAX_PAGE_SIZE: int = 10000
+
+    # Поиск фильмов: поля, по которым ищется запрос, и их вес в релевантности найденного
+    FILM_SEARCH_FIELDS: dict[str, float] = {
+        'title': 3.0,
+        'actors.full_name': 2.0,
+        'directors.full_name': 1.5,
+        'writers.full_name': 1.0,
+        'description': 1.0,
+    }
+
+    # Похожие фильмы: поля, по совпадению терминов в которых ищутся похожие, и наибольшее число похожих в ответе
+    FILM_SIMILAR_FIELDS: list[str] = [
+        'title', 'description', 'genre.name', 'actors.full_name', 'directors.full_name', 'writers.full_name',
+    ]
+    SIMILAR_MAX_SIZE: int = 50
+
+    # Фасеты фильмов: поля, по значениям которых считаются фильмы, и шаг гистограмм числовых полей;
+    # число значений в фасете не больше FACETS_SIZE
+    FILM_FACET_TERMS: list[str] = ['genre.name', 'type']
+    FILM_FACET_HISTOGRAMS: dict[str, float] = {'imdb_rating': 1.0}
+    FACETS_SIZE: int = 50
+
+    # Подсказки (автодополнение): наибольшее число подсказок в ответе, и длина префикса, до которой
+    # подсказки кэшируются (короткие префиксы немногочисленны и запрашиваются постоянно)
+    SUGGEST_MAX_SIZE: int = 20
+    SUGGEST_CACHED_PREFIX: int = 3
+
+    # Проверять документы из Elasticsearch по моделям перед кэшированием (для отладки: в обычном режиме
+    # документы отдаются без построения моделей, соответствие схемам ответов проверяется тестами)
+    VALIDATE_DOCUMENTS: bool = False
+
+    # Логирование: запись логов в отдельном потоке через очередь, и не больше LOG_HOT_PATH_RATE записей
+    # в секунду (с всплесками до LOG_HOT_PATH_BURST) от каждой строки логирования, выполняемой на каждый запрос
+    LOG_QUEUE: bool = True
+    LOG_HOT_PATH_RATE: float = 1.0
+    LOG_HOT_PATH_BURST: int = 10
+
+    # Прогрев кэшей при старте воркера: запросы популярных адресов API (из лога доступа nginx/uvicorn,
+    # если задан, иначе WARMUP_URLS) не больше WARMUP_CONCURRENCY одновременно; до окончания прогрева
+    # или WARMUP_TIMEOUT секунд /ready отвечает 503
+    WARMUP_ENABLED: bool = False
+    WARMUP_ACCESS_LOG: Optional[str] = None
+    WARMUP_TOP_N: int = 200
+    WARMUP_CONCURRENCY: int = 4
+    WARMUP_TIMEOUT: float = 30.0
+    WARMUP_URLS: list[str] = [
+        *(f'/api/v1/films/?sort=-imdb_rating&page[size]=50&page[number]={page}' for page in range(1, 6)),
+        '/api/v1/films/?page[size]=50&page[number]=1',
+        '/api/v1/genres/?page[size]=100',
+        *(f'/api/v1/persons/?page[size]=50&page[number]={page}' for page in range(1, 3)),
+    ]
+
     # Настройки Redis
     REDIS_HOST: str = '127.0.0.1'
     REDIS_PORT: int = 6379
 
+    # Время жизни ключей кэша (секунды): документы и страницы, время отдачи устаревших страниц
+    # с фоновым обновлением, а также переопределения по индексам, например {"genres": {"scalar": 3600}}
+    CACHE_SCALAR_TTL: int = 300
+    CACHE_VECTOR_TTL: int = 60
+    CACHE_VECTOR_REVALIDATE: int = 60
+
+    # Как долго помнить отсутствующие документы и пустые страницы (секунды)
+    CACHE_MISSING_TTL: int = 10
+
+    # Время жизни посчитанных фасетов (секунды): счетчики меняются только при переиндексации
+    CACHE_FACETS_TTL: int = 300
+
+    # Сколько еще хранить истекшие страницы и ответы (секунды): они отдаются, только пока Elasticsearch недоступен
+    CACHE_FALLBACK_TTL: int = 3600
+    CACHE_INDEX_TTL: dict[str, dict[str, int]] = {}
+
+    # Как долго воркер доверяет локальной копии поколения индекса (секунды)
+    CACHE_GENERATION_TTL: float = 1.0
+
+    # Блокировка заполнения ключа между воркерами: ключ пересчитывает только один воркер,
+    # остальные ждут его заполнения (секунды)
+    CACHE_LOCK_ENABLED: bool = False
+    CACHE_LOCK_TTL: float = 2.0
+    CACHE_LOCK_WAIT: float = 1.0
+    CACHE_LOCK_POLL: float = 0.05
+
+    # Настройки локального кэша воркера (L1 перед Redis). Локальные ключи содержат поколение индекса:
+    # после сброса индекса другим воркером они перестают отдаваться не позже чем через CACHE_GENERATION_TTL
+    CACHE_LOCAL_SIZE: int = 1024
+    CACHE_LOCAL_TTL: float = 5.0
+    CACHE_LOCAL_POLICY: str = 'lru'
+
+    # Допуск в кэш (TinyLFU): результат кэшируется, только если ключ запрошен не меньше
+    # CACHE_ADMISSION_THRESHOLD раз за последние CACHE_ADMISSION_WINDOW заполнений кэша воркером.
+    # Частоты считаются скетчем count-min из CACHE_ADMISSION_DEPTH строк по CACHE_ADMISSION_WIDTH счетчиков
+    CACHE_ADMISSION_ENABLED: bool = False
+    CACHE_ADMISSION_WIDTH: int = 65536
+    CACHE_ADMISSION_DEPTH: int = 4
+    CACHE_ADMISSION_WINDOW: int = 100000
+    CACHE_ADMISSION_THRESHOLD: int = 2
+
+    # Адаптивное ограничение числа одновременных запросов воркера к Elasticsearch (AIMD): предел растет,
+    # пока запросы укладываются в ELASTIC_LIMIT_LATENCY секунд, и умножается на ELASTIC_LIMIT_BACKOFF
+    # при медленных или неудачных запросах. Запросы сверх предела ждут не дольше ELASTIC_LIMIT_QUEUE_WAIT
+    # секунд, затем получают 503 с заголовком Retry-After (ELASTIC_RETRY_AFTER секунд)
+    ELASTIC_LIMIT_ENABLED: bool = False
+    ELASTIC_LIMIT_INITIAL: int = 20
+    ELASTIC_LIMIT_MIN: int = 2
+    ELASTIC_LIMIT_MAX: int = 200
+    ELASTIC_LIMIT_LATENCY: float = 0.25
+    ELASTIC_LIMIT_BACKOFF: float = 0.8
+    ELASTIC_LIMIT_QUEUE_WAIT: float = 0.1
+    ELASTIC_RETRY_AFTER: int = 1
+
+    # Предохранитель запросов к Elasticsearch: после ELASTIC_BREAKER_FAILURES неудачных запросов подряд
+    # запросы не выполняются (503 или последний закэшированный ответ) ELASTIC_BREAKER_RESET секунд,
+    # затем пробный запрос проверяет, восстановился ли Elasticsearch
+    ELASTIC_BREAKER_ENABLED: bool = False
+    ELASTIC_BREAKER_FAILURES: int = 5
+    ELASTIC_BREAKER_RESET: float = 10.0
+
+    # Время (секунды), на которое клиенты и nginx могут сохранять ответы API (заголовок Cache-Control)
+    HTTP_CACHE_MAX_AGE: int = 60
+
+    # Каталог, через который воркеры gunicorn собирают общие метрики Prometheus (очищается при старте)
+    METRICS_MULTIPROC_DIR: str = os.path.join(tempfile.gettempdir(), 'prometheus')
+
+    # Трассировка запросов: доля трассируемых запросов (0 - выключена), получатель спанов
+    # ('json' - файл TRACE_FILE, 'otlp' - коллектор OTLP/HTTP по адресу TRACE_OTLP_ENDPOINT)
+    # и период отправки накопленных спанов (секунды)
+    TRACE_SAMPLE_RATE: float = 0.0
+    TRACE_EXPORTER: str = 'json'
+    TRACE_FILE: str = os.path.join(tempfile.gettempdir(), 'traces.jsonl')
+    TRACE_OTLP_ENDPOINT: str = 'http://127.0.0.1:4318'
+    TRACE_SERVICE_NAME: str = 'movies-api'
+    TRACE_FLUSH_INTERVAL: float = 5.0
+
     # Настройки Elasticsearch
     ELASTIC_SCHEME: str = 'http'
     ELASTIC_HOST: str = '127.0.0.1'
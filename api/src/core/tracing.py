@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Iterator, Optional
+
+import aiohttp
+import orjson
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from interfaces.tracing import Span, SpanExporter
+
+logger = logging.getLogger(__name__)
+
+# innermost span of the current request, None when request is not sampled
+current: ContextVar[Optional[Span]] = ContextVar('span', default=None)
+
+
+def otlp_batch(spans: list[Span], service: str) -> dict:
+    """Spans wrapped into OTLP/JSON export request"""
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': service}}]},
+        'scopeSpans': [{'scope': {'name': __name__}, 'spans': [span.otlp() for span in spans]}],
+    }]}
+
+
+class JSONFileExporter(SpanExporter):
+    """Appends batches of spans to a file, one OTLP/JSON export request per line"""
+
+    def __init__(self, path: str, service: str) -> None:
+        self.path = path
+        self.service = service
+
+    def write(self, data: bytes) -> None:
+        with open(self.path, 'ab') as sink:
+            sink.write(data + b'\n')
+
+    async def export(self, spans: list[Span]) -> None:
+        await asyncio.to_thread(self.write, orjson.dumps(otlp_batch(spans, self.service)))
+
+    async def close(self) -> None:
+        pass
+
+
+class OTLPExporter(SpanExporter):
+    """Posts batches of spans to an OTLP/HTTP collector (JSON encoding)"""
+
+    def __init__(self, endpoint: str, service: str) -> None:
+        self.url = f"{endpoint.rstrip('/')}/v1/traces"
+        self.service = service
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def export(self, spans: list[Span]) -> None:
+        if self.session is None:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5))
+        async with self.session.post(
+                self.url,
+                data=orjson.dumps(otlp_batch(spans, self.service)),
+                headers={'Content-Type': 'application/json'}) as response:
+            response.raise_for_status()
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+
+
+class Tracer:
+    """Samples requests to trace upfront, collects their spans and ships them to exporter in background"""
+
+    def __init__(self, exporter: Optional[SpanExporter], rate: float, interval: float, limit: int = 10000) -> None:
+        self.exporter = exporter
+        self.threshold = int(rate * 2 ** 32) if exporter else 0
+        self.interval = interval
+        self.limit = limit
+        self.pending: list[Span] = []
+        self.dropped = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def sampled(self) -> bool:
+        return self.threshold > 0 and secrets.randbits(32) < self.threshold
+
+    @contextmanager
+    def trace(self, name: str, **attributes) -> Iterator[Optional[Span]]:
+        """Root span of a request, if it is sampled (decision holds for all nested spans)"""
+        if not self.sampled():
+            yield None
+            return
+        root = Span(name, secrets.token_hex(16), secrets.token_hex(8), None, time.time_ns(), attributes=attributes)
+        token = current.set(root)
+        try:
+            yield root
+        finally:
+            root.end = time.time_ns()
+            current.reset(token)
+            root.finished.append(root)
+            self.finish(root.finished)
+
+    def finish(self, spans: list[Span]) -> None:
+        # spans are dropped rather than piled up while exporter is down
+        if len(self.pending) >= self.limit:
+            self.dropped += len(spans)
+            return
+        self.pending.extend(spans)
+
+    async def flush(self) -> None:
+        spans, self.pending = self.pending, []
+        if not spans:
+            return
+        try:
+            await self.exporter.export(spans)
+        except Exception:
+            logger.exception(f"Failed to export {len(spans)} spans")
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self) -> None:
+        if self.exporter:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+        if self.exporter:
+            await self.flush()
+            await self.exporter.close()
+
+
+# replaced by configured one on application startup
+tracer = Tracer(None, 0.0, 0.0)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """Span nested into the current one, nothing (and next to no overhead) when request is not sampled"""
+    parent = current.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, parent.trace_id, secrets.token_hex(8), parent.span_id, time.time_ns(),
+                 attributes=attributes, finished=parent.finished, root=parent.root or parent)
+    token = current.set(child)
+    try:
+        yield child
+    finally:
+        child.end = time.time_ns()
+        current.reset(token)
+        if child.root.end:
+            # background work outliving the request, its trace is already shipped
+            tracer.finish([child])
+        else:
+            child.finished.append(child)
+
+
+def traced(name: str):
+    """Decorate a coroutine method to run in a span, tagged by index of its instance"""
+    def decorator(method):
+        @wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            if current.get() is None:
+                return await method(self, *args, **kwargs)
+            with span(name, index=self.index):
+                return await method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TracingMiddleware:
+    """ASGI middleware opening a root span for sampled requests"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        with tracer.trace(f"{scope['method']} {scope['path']}") as root:
+            if root is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_status(message: dict) -> None:
+                if message['type'] == 'http.response.start':
+                    root.attributes['http.status_code'] = message['status']
+                await send(message)
+
+            await self.app(scope, receive, send_status)
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import re
+import time
+from collections import Counter
+from typing import Iterator, Optional
+from urllib.parse import urlsplit
+
+from core import admission
+
+logger = logging.getLogger(__name__)
+
+# request line and status of successful GET requests to API, in nginx and uvicorn access logs
+ACCESS_LINE = re.compile(r'''["']GET (/api/\S+) HTTP/[\d.]+["'] (\d{3})''')
+
+
+def access_urls(path: str) -> Iterator[str]:
+    """API urls successfully requested, in order of access log"""
+    with open(path, encoding='utf-8', errors='replace') as log:
+        for line in log:
+            if (match := ACCESS_LINE.search(line)) and match.group(2) == '200':
+                yield match.group(1)
+
+
+def top_urls(path: str, limit: int) -> list[str]:
+    """Most requested API urls found in access log, most popular first"""
+    return [url for url, _ in Counter(access_urls(path)).most_common(limit)]
+
+
+class Warmup:
+    """Replays popular urls through the application to fill its caches, before it is ready to serve
+
+    Requests go through the whole application, as real ones do: pages, documents and response
+    bodies are cached in redis and in memory of the worker. Failed urls are only counted.
+    """
+
+    def __init__(self) -> None:
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        """Warm-up is over, or was never started"""
+        return self.task is None or self.finished is not None
+
+    def state(self) -> dict:
+        return {
+            'ready': self.ready,
+            'total': self.total,
+            'done': self.done,
+            'failed': self.failed,
+            'seconds': round((self.finished or time.monotonic()) - self.started, 3) if self.started else None,
+        }
+
+    @staticmethod
+    async def request(app, url: str) -> int:
+        """Status of GET request to ASGI application, with response body discarded"""
+        parts = urlsplit(url)
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': parts.path,
+            'raw_path': parts.path.encode(),
+            'query_string': parts.query.encode(),
+            'root_path': '',
+            'headers': [(b'host', b'warmup'), (b'user-agent', b'warmup')],
+            'client': None,
+            'server': None,
+        }
+        status = 0
+
+        async def receive() -> dict:
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message: dict) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        # warmed urls are cached at once, as if they were popular already
+        token = admission.bypass.set(True)
+        try:
+            await app(scope, receive, send)
+        finally:
+            admission.bypass.reset(token)
+        return status
+
+    async def replay(self, app, urls: list[str], concurrency: int) -> None:
+        """Request every url once, with at most concurrency requests in flight"""
+        queue = iter(urls)
+
+        async def worker():
+            for url in queue:
+                try:
+                    status = await self.request(app, url)
+                except Exception:
+                    logger.exception('Warm-up request failed: %s', url)
+                    status = 0
+                self.done += 1
+                if status != 200:
+                    self.failed += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def run(self, app, urls: list[str], concurrency: int, timeout: float) -> None:
+        """Replay urls, reporting ready when they are done or timeout is over, whichever is first"""
+        self.total = len(urls)
+        self.started = time.monotonic()
+        try:
+            await asyncio.wait_for(self.replay(app, urls, concurrency), timeout)
+        except asyncio.TimeoutError:
+            logger.warning('Warm-up timed out after %.1fs, %d of %d urls done', timeout, self.done, self.total)
+        finally:
+            self.finished = time.monotonic()
+        logger.info('Warm-up done: %d urls (%d failed) in %.3fs',
+                    self.done, self.failed, self.finished - self.started)
+
+    def start(self, app, urls: list[str], concurrency: int, timeout: float) -> None:
+        """Run warm-up in background, serving readiness state meanwhile"""
+        self.task = asyncio.create_task(self.run(app, urls, concurrency, timeout))
+
+    async def stop(self) -> None:
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+
+# warm-up state of the worker
+warmup = Warmup()
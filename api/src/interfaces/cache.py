@@ -1,5 +1,7 @@
+import time
 from abc import ABC, abstractmethod
-from typing import Optional
+from dataclasses import dataclass
+from typing import Optional, Union
 
 from pydantic import BaseModel
 
@@ -10,19 +12,88 @@ from pydantic import BaseModel
 class CacheIndex(BaseModel):
     """Class holding data values for vector-based cache keys"""
     values: list[dict]
+    fresh_until: Optional[float] = None
+    expires: Optional[float] = None
+
+    @property
+    def stale(self) -> bool:
+        """Values are past soft expiry: still served, but should be revalidated"""
+        return self.fresh_until is not None and self.fresh_until < time.time()
+
+    @property
+    def expired(self) -> bool:
+        """Values are past hard expiry: only kept to be served while they can not be fetched anew"""
+        return self.expires is not None and self.expires < time.time()
+
+
+@dataclass(frozen=True)
+class CacheTTL:
+    """Expiration policy (seconds) for scalar (document) and vector (page) keys
+
+    Vector keys are fresh for vector seconds, then served stale while revalidated for revalidate seconds more.
+    Missing documents and empty pages are remembered for missing seconds, facet counts for facets seconds.
+    Expired pages and response bodies are kept for fallback seconds more, to be served while search is unavailable.
+    """
+    scalar: int = 300
+    vector: int = 60
+    revalidate: int = 60
+    missing: int = 10
+    facets: int = 300
+    fallback: int = 3600
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    """Raw bytes kept in cache along with the entity tag (content hash) computed when they were written"""
+    data: bytes
+    etag: str
+
+
+@dataclass
+class CacheStats:
+    """Hit and miss counters of a single cache tier"""
+    tier: str
+    hits: int = 0
+    misses: int = 0
+
+    def hit(self, count: int = 1) -> None:
+        self.hits += count
+
+    def miss(self, count: int = 1) -> None:
+        self.misses += count
+
+    @property
+    def ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
 
 
 class CacheAPI(ABC):
     """Interface class to support caching of scalar and vector keys"""
 
     @abstractmethod
-    async def get_scalar(self, key: str) -> Optional[BaseModel]:
-        """Get single scalar value from cache, using its key"""
+    async def get_scalar(self, key: str) -> Optional[dict]:
+        """Get single scalar value from cache, using its key (empty for keys marked missing)"""
         pass
 
     @abstractmethod
-    async def put_scalar(self, key: str, obj: BaseModel) -> int:
-        """Add a scalar value to cache, using key to index"""
+    async def put_scalar(self, key: str, obj: Union[dict, BaseModel], ttl: Optional[int] = None) -> int:
+        """Add a scalar value to cache, using key to index (for ttl seconds, scalar TTL by default)"""
+        pass
+
+    @abstractmethod
+    async def get_scalars(self, keys: list[str]) -> list[Optional[dict]]:
+        """Get several scalar values from cache at once, None for missing keys"""
+        pass
+
+    @abstractmethod
+    async def put_scalars(self, values: dict[str, Union[dict, BaseModel]]) -> int:
+        """Add several scalar values to cache at once, indexed by their keys"""
+        pass
+
+    @abstractmethod
+    async def put_missing(self, keys: list[str]) -> int:
+        """Mark scalar keys as known to be missing, for a short time"""
         pass
 
     @abstractmethod
@@ -30,12 +101,57 @@ class CacheAPI(ABC):
         """Fetches previously stored vector-based key"""
         pass
 
+    @abstractmethod
+    async def get_index(self, key: str) -> Optional[CacheIndex]:
+        """Fetches previously stored vector-based key along with its freshness"""
+        pass
+
     @abstractmethod
     async def put_vector(self, key: str, data: list[dict]) -> int:
         """Adds a vector-based key to cache, allowing to store list data"""
         pass
 
+    @abstractmethod
+    async def get_raw(self, key: str) -> Optional[CacheEntry]:
+        """Fetches previously stored raw bytes, returned as is without decoding"""
+        pass
+
+    @abstractmethod
+    async def get_etag(self, key: str) -> Optional[str]:
+        """Fetches entity tag of previously stored raw bytes, without the bytes themselves"""
+        pass
+
+    @abstractmethod
+    async def get_fallback(self, key: str) -> Optional[CacheEntry]:
+        """Fetches raw bytes stored previously, even if expired (but still kept for fallback)"""
+        pass
+
+    @abstractmethod
+    async def put_raw(self, key: str, data: bytes, ttl: Optional[int] = None) -> CacheEntry:
+        """Adds raw bytes to cache along with their entity tag, using key to index (for ttl seconds, if given)"""
+        pass
+
     @abstractmethod
     async def drop_key(self, key: str) -> int:
-        """Drop index from cache (delete all inner key-value pairs from it)"""
+        """Drop a single key from cache"""
+        pass
+
+    @abstractmethod
+    async def get_generation(self) -> int:
+        """Current generation of the index, bumped to invalidate it"""
+        pass
+
+    @abstractmethod
+    async def drop_index(self) -> int:
+        """Drop index from cache (invalidate all inner key-value pairs at once)"""
+        pass
+
+    @abstractmethod
+    async def acquire(self, key: str, ttl: float) -> bool:
+        """Take a short-lived exclusive lock on a key, shared by all cache clients"""
+        pass
+
+    @abstractmethod
+    async def release(self, key: str) -> None:
+        """Release a lock previously taken on a key"""
         pass
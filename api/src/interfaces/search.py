@@ -1,18 +1,31 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Optional, Union
 from uuid import UUID
 
 
 # Search interfaces
 
 
+class SearchCursorError(ValueError):
+    """Cursor token can not be used to continue search (malformed or expired)"""
+
+
+class SearchUnavailableError(RuntimeError):
+    """Search can not be performed: the search engine is down, failing or overloaded"""
+
+
+class SearchOverloadedError(SearchUnavailableError):
+    """Search request shed: too many requests are in flight already"""
+
+
 @dataclass
 class SearchCursor:
     """Interface to provide cursor parameters for a search reqeust"""
     page: Optional[int]
     size: Optional[int]
     sort: Optional[int]
+    token: Optional[str] = None
 
     def __post_init__(self):
         self.offset = (self.page - 1) * self.size if self.page > 0 else 0
@@ -31,20 +44,116 @@ class SearchRequest:
         return f'SearchFilter::field={self.path},query={self.query}'
 
 
+@dataclass
+class MultiFieldRequest:
+    """Interface to provide a query matched on several fields at once, more relevant fields boosted
+
+    Filters restrict found documents to exact field values, without affecting relevance.
+    """
+    query: str
+    fields: dict[str, float]
+    filters: dict[str, str] = field(default_factory=dict)
+
+    def __repr__(self):
+        fields = ','.join(f'{path}^{boost}' for path, boost in self.fields.items())
+        filters = ','.join(f'{path}={value}' for path, value in sorted(self.filters.items()))
+        return f'MultiFieldFilter::fields={fields},query={self.query},filters={filters}'
+
+
+@dataclass
+class SimilarRequest:
+    """Interface to provide a document to find documents like it, by terms of its fields
+
+    Values of nested fields are given along, as they can not be taken from the document by identifier.
+    """
+    uuid: str
+    fields: list[str]
+    like: dict[str, list[str]] = field(default_factory=dict)
+
+    def __repr__(self):
+        return f"SimilarRequest::id={self.uuid},fields={','.join(self.fields)}"
+
+
+# any request matching documents in index
+Matching = Union[SearchRequest, MultiFieldRequest, SimilarRequest]
+
+
+@dataclass
+class SuggestRequest:
+    """Interface to provide a prefix typed so far, to complete it with suggestions of documents"""
+    prefix: str
+    size: int
+
+    def __post_init__(self):
+        # suggestions are case insensitive, extra spaces do not matter either
+        self.prefix = ' '.join(self.prefix.lower().split())
+
+    def __repr__(self):
+        return f'SuggestRequest::prefix={self.prefix},size={self.size}'
+
+
+@dataclass
+class FacetRequest:
+    """Interface to provide facets to count documents by: values of keyword fields, histograms of numeric ones
+
+    Facets are named after top level fields (e.g. genre for genre.name), and count only documents
+    with exact field values of filters.
+    """
+    terms: list[str]
+    histograms: dict[str, float]
+    filters: dict[str, str] = field(default_factory=dict)
+    size: int = 50
+
+    def __repr__(self):
+        histograms = ','.join(f'{path}/{interval}' for path, interval in self.histograms.items())
+        filters = ','.join(f'{path}={value}' for path, value in sorted(self.filters.items()))
+        return (f"FacetRequest::terms={','.join(self.terms)},histograms={histograms},"
+                f"filters={filters},size={self.size}")
+
+
+@dataclass
+class SearchPage:
+    """Page of found documents, with an opaque token to continue search after it"""
+    documents: list[object]
+    token: Optional[str]
+
+
 class SearchAPI(ABC):
     """Interface class to support common search tasks for indexed data"""
 
     @abstractmethod
-    async def list_index(self, cursor: SearchCursor) -> list[object]:
-        """List all documents in an index, starting at cursor"""
+    async def list_index(self, cursor: SearchCursor, fields: Optional[list[str]] = None) -> list[object]:
+        """List all documents in an index, starting at cursor (only given fields of documents, if any)"""
         pass
 
     @abstractmethod
-    async def search_index(self, cursor: SearchCursor, request: SearchRequest) -> list[object]:
-        """Search documents in an index, using cursor and filter to query on a field"""
+    async def search_index(self, cursor: SearchCursor, request: Matching,
+                           fields: Optional[list[str]] = None) -> list[object]:
+        """Search documents in an index, using cursor and filter to query on a field (or several ones)"""
+        pass
+
+    @abstractmethod
+    async def page_index(self, cursor: SearchCursor, request: Optional[Matching] = None,
+                         fields: Optional[list[str]] = None) -> SearchPage:
+        """List (or search, if request given) documents in an index, continuing after cursor token"""
+        pass
+
+    @abstractmethod
+    async def suggest_index(self, request: SuggestRequest, fields: Optional[list[str]] = None) -> list[object]:
+        """Documents of an index completing the prefix, most relevant first"""
+        pass
+
+    @abstractmethod
+    async def facet_index(self, request: FacetRequest) -> Optional[dict]:
+        """Count documents of an index by facets: total and [{key, count}] buckets of each facet, None on failure"""
         pass
 
     @abstractmethod
     async def get_document(self, uuid: UUID) -> Optional[object]:
         """Retrieve specific document from database, using its identifier"""
         pass
+
+    @abstractmethod
+    async def get_documents(self, uuids: list[UUID]) -> list[Optional[object]]:
+        """Retrieve several documents at once, None for missing identifiers"""
+        pass
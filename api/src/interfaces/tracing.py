@@ -0,0 +1,64 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+# Tracing interfaces
+
+
+@dataclass
+class Span:
+    """Timed operation of a request, nested into the parent one (none for the request itself)"""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start: int
+    end: int = 0
+    attributes: dict = field(default_factory=dict)
+
+    # spans of the trace finished so far, shared by all spans of the trace
+    finished: list = field(default_factory=list, repr=False)
+    # span of the request, the trace is shipped when it ends (none for the request itself)
+    root: Optional['Span'] = field(default=None, repr=False)
+
+    def otlp(self) -> dict:
+        """Span in OTLP/JSON encoding"""
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': 2 if self.parent_id is None else 1,
+            'startTimeUnixNano': str(self.start),
+            'endTimeUnixNano': str(self.end),
+            'attributes': [
+                {'key': key, 'value': self.otlp_value(value)}
+                for key, value in self.attributes.items()
+            ],
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+    @staticmethod
+    def otlp_value(value) -> dict:
+        # bool is checked first, being a subclass of int
+        if isinstance(value, bool):
+            return {'boolValue': value}
+        if isinstance(value, int):
+            return {'intValue': str(value)}
+        return {'stringValue': str(value)}
+
+
+class SpanExporter(ABC):
+    """Interface class to ship finished spans to a collector"""
+
+    @abstractmethod
+    async def export(self, spans: list[Span]) -> None:
+        """Ship a batch of finished spans"""
+        pass
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Release resources held by exporter"""
+        pass
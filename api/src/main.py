@@ -1,13 +1,21 @@
 import aioredis
 import uvicorn as uvicorn
 from elasticsearch import AsyncElasticsearch
-from fastapi import FastAPI
+from http import HTTPStatus
+from logging.handlers import QueueListener
+
+from fastapi import FastAPI, Request, Response
 from fastapi.responses import ORJSONResponse
 
 from api.v1 import films, genres, persons
-from core import logger
+from core import breaker, limiter, logger, metrics, tracing
+from core.warmup import top_urls, warmup
 from core.config import settings
+from core.elastic import ElasticSearcher
+from core.errors import CursorErrors, SearchErrors
 from db import elastic, redis
+from api.v1.responses import fallback_response
+from interfaces.search import SearchCursorError, SearchOverloadedError, SearchUnavailableError
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -18,6 +26,9 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# потоки записи логов, запущенные при старте сервера
+log_listeners: list[QueueListener] = []
+
 
 @app.on_event('startup')
 async def startup():
@@ -31,6 +42,33 @@ async def startup():
     elastic.es = AsyncElasticsearch(
         hosts=[f'{settings.ELASTIC_SCHEME}://{settings.ELASTIC_HOST}:{settings.ELASTIC_PORT}']
     )
+    if settings.ELASTIC_LIMIT_ENABLED:
+        limiter.elastic_limiter = metrics.MeteredLimiter(
+            initial=settings.ELASTIC_LIMIT_INITIAL,
+            min_limit=settings.ELASTIC_LIMIT_MIN,
+            max_limit=settings.ELASTIC_LIMIT_MAX,
+            latency=settings.ELASTIC_LIMIT_LATENCY,
+            backoff=settings.ELASTIC_LIMIT_BACKOFF,
+            queue_wait=settings.ELASTIC_LIMIT_QUEUE_WAIT,
+            benign=ElasticSearcher.REJECTED)
+    if settings.ELASTIC_BREAKER_ENABLED:
+        breaker.elastic_breaker = metrics.MeteredBreaker(
+            failures=settings.ELASTIC_BREAKER_FAILURES,
+            reset=settings.ELASTIC_BREAKER_RESET)
+    if settings.LOG_QUEUE:
+        hot_path = logger.RateLimitFilter(
+            logger.HOT_PATH_LOGGERS, settings.LOG_HOT_PATH_RATE, settings.LOG_HOT_PATH_BURST)
+        log_listeners.extend(logger.enqueue(filters=(hot_path,)))
+    if settings.TRACE_SAMPLE_RATE > 0:
+        exporter = tracing.OTLPExporter(settings.TRACE_OTLP_ENDPOINT, settings.TRACE_SERVICE_NAME) \
+            if settings.TRACE_EXPORTER == 'otlp' \
+            else tracing.JSONFileExporter(settings.TRACE_FILE, settings.TRACE_SERVICE_NAME)
+        tracing.tracer = tracing.Tracer(exporter, settings.TRACE_SAMPLE_RATE, settings.TRACE_FLUSH_INTERVAL)
+        tracing.tracer.start()
+    if settings.WARMUP_ENABLED:
+        urls = top_urls(settings.WARMUP_ACCESS_LOG, settings.WARMUP_TOP_N) \
+            if settings.WARMUP_ACCESS_LOG else settings.WARMUP_URLS
+        warmup.start(app, urls, settings.WARMUP_CONCURRENCY, settings.WARMUP_TIMEOUT)
 
 
 @app.on_event('shutdown')
@@ -39,10 +77,47 @@ async def shutdown():
 
     :return:
     """
+    await warmup.stop()
+    await tracing.tracer.stop()
     await redis.redis.close()
     await elastic.es.close()
+    while log_listeners:
+        log_listeners.pop().stop()
+
+
+@app.exception_handler(SearchCursorError)
+async def cursor_error_handler(request: Request, exc: SearchCursorError) -> ORJSONResponse:
+    """Отвечаем ошибкой клиента на неверный или устаревший курсор страницы"""
+    return ORJSONResponse(status_code=HTTPStatus.BAD_REQUEST, content={'detail': CursorErrors.INVALID})
+
+
+@app.exception_handler(SearchUnavailableError)
+async def unavailable_error_handler(request: Request, exc: SearchUnavailableError) -> Response:
+    """Пока Elasticsearch недоступен или перегружен, отдаем последний закэшированный ответ на запрос,
+    а если его нет - 503, предлагая повторить позже"""
+    if fallback := await fallback_response(request):
+        return fallback
+    detail = SearchErrors.OVERLOADED if isinstance(exc, SearchOverloadedError) else SearchErrors.UNAVAILABLE
+    return ORJSONResponse(status_code=HTTPStatus.SERVICE_UNAVAILABLE, content={'detail': detail},
+                          headers={'Retry-After': str(settings.ELASTIC_RETRY_AFTER)})
+
+
+@app.get('/metrics', include_in_schema=False)
+async def metrics_endpoint() -> Response:
+    """Метрики Prometheus, собранные со всех воркеров"""
+    content, media_type = metrics.render()
+    return Response(content, headers={'Content-Type': media_type})
+
+
+@app.get('/ready', include_in_schema=False)
+async def ready_endpoint() -> ORJSONResponse:
+    """Готовность воркера к нагрузке: 503, пока идет прогрев кэшей"""
+    return ORJSONResponse(status_code=HTTPStatus.OK if warmup.ready else HTTPStatus.SERVICE_UNAVAILABLE,
+                          content=warmup.state())
 
 
+app.add_middleware(tracing.TracingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware, routes=app.routes)
 app.include_router(films.router, prefix='/api/v1/films', tags=['films'])
 app.include_router(genres.router, prefix='/api/v1/genres', tags=['genres'])
 app.include_router(persons.router, prefix='/api/v1/persons', tags=['persons'])
@@ -1,5 +1,6 @@
 import orjson
 from pydantic import BaseModel
+from pydantic.json import pydantic_encoder
 
 
 def _json_dumps(v, *, default):
@@ -12,6 +13,15 @@ def _json_dumps(v, *, default):
     return orjson.dumps(v, default=default).decode()
 
 
+def dumps(v) -> bytes:
+    """
+    orjson-сериализация моделей (и их коллекций) сразу в bytes тела ответа
+    :param v:
+    :return:
+    """
+    return orjson.dumps(v, default=pydantic_encoder)
+
+
 class BaseOrJsonModel(BaseModel):
     """Базовая модель с orjson сериализацией."""
 
@@ -3,6 +3,19 @@ from uuid import UUID
 from models import base, genre, person
 
 
+class FilmBase(base.BaseOrJsonModel):
+    """Проекция фильма для списков."""
+    id: UUID
+    title: str
+    imdb_rating: float
+
+
+class FilmSuggestion(base.BaseOrJsonModel):
+    """Проекция фильма для подсказок."""
+    id: UUID
+    title: str
+
+
 class Film(base.BaseOrJsonModel):
     """Модель фильма."""
     id: UUID
@@ -10,6 +10,12 @@ class PersonFilm(base.BaseOrJsonModel):
     title: str
 
 
+class PersonBase(base.BaseOrJsonModel):
+    """Проекция персоны для подсказок."""
+    id: UUID
+    full_name: str
+
+
 class Person(base.BaseOrJsonModel):
     """Модель персоны."""
     id: UUID
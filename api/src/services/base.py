@@ -1,44 +1,239 @@
 import logging
-from typing import Optional
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Optional, Union
 
-from interfaces.search import SearchAPI, SearchCursor, SearchRequest
-from interfaces.cache import CacheAPI
+from interfaces.search import (FacetRequest, MultiFieldRequest, SearchAPI, SearchCursor, SearchPage, SearchRequest,
+                               SearchUnavailableError, SimilarRequest, SuggestRequest)
+from interfaces.cache import CacheAPI, CacheEntry, CacheTTL
+from core.config import settings
 from core.elastic import ElasticSearcher
+from core import limiter
+from core.flight import FillLock, SingleFlight
+from core.memory import MemoryCacher
+from core.metrics import CACHE_FALLBACKS, CACHE_MISSING_HITS, MeteredAdmission
 from core.redis import RedisCacher
+from core.tracing import span
+from models.base import dumps
+
+
+# cached mark of a document known not to exist
+MISSING = object()
+
+
+@dataclass(frozen=True)
+class Served:
+    """How the value the response to a request is built of was served
+
+    Soft expiry of a page taken from cache (None if just fetched): response bytes are cached no longer
+    than the page stays fresh, and not at all when built of a stale one. Admission decision of a value
+    just fetched (None if taken from cache): the response is cached along with it, the request counted once.
+    """
+    fresh_until: Optional[float] = None
+    admitted: Optional[bool] = None
+
+
+# value served to the current request
+served: ContextVar[Served] = ContextVar('served', default=Served())
 
 
 class DocumentService:
-    """API Service providing cache-enabled operations in an indexed document database"""
+    """API Service providing cache-enabled operations in an indexed document database
+
+    Documents are passed as they are stored in the index (dicts), without model construction:
+    model describes them, and is only checked against when VALIDATE_DOCUMENTS is on.
+    Cache backend and searcher default to redis and elastic ones, unless given ready made
+    """
     def __init__(self, index: str, model: object,
-                 redis: CacheAPI, elastic: SearchAPI):
+                 redis: CacheAPI, elastic: SearchAPI,
+                 backend: Optional[CacheAPI] = None, searcher: Optional[SearchAPI] = None):
         self.index = index
-        self.cacher = RedisCacher(index, redis)
-        self.searcher = ElasticSearcher(index, elastic)
+        self.ttl = ttl = CacheTTL(**{
+            'scalar': settings.CACHE_SCALAR_TTL,
+            'vector': settings.CACHE_VECTOR_TTL,
+            'revalidate': settings.CACHE_VECTOR_REVALIDATE,
+            'missing': settings.CACHE_MISSING_TTL,
+            'facets': settings.CACHE_FACETS_TTL,
+            'fallback': settings.CACHE_FALLBACK_TTL,
+            **settings.CACHE_INDEX_TTL.get(index, {}),
+        })
+        self.cacher = MemoryCacher(
+            index, backend or RedisCacher(index, redis, ttl, settings.CACHE_GENERATION_TTL),
+            size=settings.CACHE_LOCAL_SIZE,
+            ttl=settings.CACHE_LOCAL_TTL,
+            policy=settings.CACHE_LOCAL_POLICY)
+        self.searcher = searcher or ElasticSearcher(index, elastic)
         self.logger = logging.getLogger(f"DocumentService: {index}")
         self.model = model
 
+        # elastic requests saved by remembering missing documents and empty pages
+        self.missing_hits = 0
+        self.missing_counter = CACHE_MISSING_HITS.labels(index)
+
+        # expired values served while elastic is unavailable
+        self.fallbacks = 0
+        self.fallback_counter = CACHE_FALLBACKS.labels(index)
+
+        # concurrent misses of the same key go to elastic once per process,
+        # and once per cluster of workers when fill lock is enabled
+        self.flight = SingleFlight(index)
+        self.filler = FillLock(
+            index,
+            self.cacher,
+            ttl=settings.CACHE_LOCK_TTL,
+            wait=settings.CACHE_LOCK_WAIT,
+            poll=settings.CACHE_LOCK_POLL,
+        ) if settings.CACHE_LOCK_ENABLED else None
+
+        # fills of keys requested once in a while are not cached, so they do not evict hot ones
+        self.admission = MeteredAdmission(
+            index,
+            width=settings.CACHE_ADMISSION_WIDTH,
+            depth=settings.CACHE_ADMISSION_DEPTH,
+            window=settings.CACHE_ADMISSION_WINDOW,
+            threshold=settings.CACHE_ADMISSION_THRESHOLD,
+        ) if settings.CACHE_ADMISSION_ENABLED else None
+
+    def checked(self, model: type, docs: list[dict]) -> list[dict]:
+        """Documents fetched from the index, validated against the model first if enabled"""
+        if settings.VALIDATE_DOCUMENTS:
+            with span('service.validate', index=self.index, model=model.__name__, count=len(docs)):
+                for doc in docs:
+                    model(**doc)
+        return docs
+
+    async def load(self,
+                   key: str,
+                   lookup: Callable[[], Awaitable[Optional[object]]],
+                   fetch: Callable[[], Awaitable[Optional[object]]],
+                   store: bool = True) -> Optional[object]:
+        """Fetch a key missing in cache, collapsing concurrent identical fetches
+
+        Keys not stored once fetched (refused admission) are not locked: other workers would wait in vain
+        """
+        if self.filler and store:
+            return await self.flight.do(key, lambda: self.filler.fill(key, lookup, fetch))
+        return await self.flight.do(key, fetch)
+
+    def revalidate(self, key: str, fetch: Callable[[], Awaitable[object]]) -> None:
+        """Refresh a stale key in background, at most once at a time per key
+
+        Refreshes are shed first when elastic is overloaded or unavailable: the stale value is served meanwhile
+        """
+        refresh_key = f'{key}__refresh'
+        if refresh_key in self.flight.calls:
+            return
+
+        async def refresh():
+            limiter.background.set(True)
+            try:
+                if self.filler is None:
+                    await fetch()
+                elif await self.cacher.acquire(key, self.filler.ttl):
+                    try:
+                        await fetch()
+                    finally:
+                        await self.cacher.release(key)
+            except SearchUnavailableError:
+                self.logger.info("%s background refresh skipped, search unavailable: %s", self.index, key)
+            except Exception:
+                self.logger.exception("%s background refresh failed: %s", self.index, key)
+
+        self.flight.launch(refresh_key, refresh)
+
+    def admits(self, key: str) -> bool:
+        """Fetched value of key is worth caching (always, without admission policy)"""
+        return self.admission is None or self.admission.admit(key)
+
+    def admits_served(self, key: str) -> bool:
+        """Value of key about to be fetched for the response to the request is worth caching, the response too"""
+        admitted = self.admits(key)
+        served.set(Served(admitted=admitted))
+        return admitted
+
+    @staticmethod
+    def projected(key: str, projection: Optional[type]) -> str:
+        """Cache key of a page holding only fields of projection model"""
+        if projection is None:
+            return key
+        return f"{key}_fields={','.join(projection.__fields__)}"
+
+    async def cached_vector(self, key: str,
+                            search: Callable[[], Awaitable[list[dict]]],
+                            model: type) -> list[dict]:
+        """Page from cache (revalidated in background once stale), or fetched from elastic on miss
+
+        An expired page is only served while elastic is unavailable
+        """
+        cached = await self.cacher.get_index(key)
+        if cached is not None and not cached.expired:
+            self.logger.info("%s index get from cache: %s", self.index, key)
+            served.set(Served(fresh_until=cached.fresh_until))
+            if not cached.values:
+                self.count_missing()
+            elif cached.stale:
+                self.revalidate(key, lambda: self.fetch_vector(key, search, model))
+            return cached.values
+
+        store = self.admits_served(key)
+        try:
+            return await self.load(
+                key,
+                lambda: self.lookup_vector(key),
+                lambda: self.fetch_vector(key, search, model, store),
+                store)
+        except SearchUnavailableError:
+            if cached is None:
+                raise
+            served.set(Served(fresh_until=cached.fresh_until))
+            self.count_fallback()
+            self.logger.info("%s expired index served, search unavailable: %s", self.index, key)
+            return cached.values
+
+    async def lookup_vector(self, key: str) -> Optional[list[dict]]:
+        if (cached := await self.cacher.get_index(key)) is not None and not cached.expired:
+            self.logger.info("%s index get from cache: %s", self.index, key)
+            return cached.values
+        return None
+
+    def count_missing(self, count: int = 1) -> None:
+        self.missing_hits += count
+        self.missing_counter.inc(count)
+
+    def count_fallback(self) -> None:
+        self.fallbacks += 1
+        self.fallback_counter.inc()
+
+    async def fetch_vector(self, key: str,
+                           search: Callable[[], Awaitable[list[dict]]],
+                           model: type, store: bool = True) -> list[dict]:
+        resp = await search()
+        docs = self.checked(model, list(resp) if resp else [])
+        self.logger.info("Fetched %d %s elastic docs", len(docs), self.index)
+
+        # put page to cache, empty one as well
+        if store:
+            await self.cacher.put_vector(key, docs)
+            self.logger.info("%s index put as key: %s", self.index, key)
+        return docs
+
     async def list_all(self, page: Optional[int], size: Optional[int],
-                       sort: Optional[str]) -> list[Optional[object]]:
-        """List all documents in the index, with sorting by field"""
+                       sort: Optional[str], projection: Optional[type] = None) -> list[Optional[object]]:
+        """List all documents in the index, with sorting by field
+
+        Documents are fetched as projection model (only its fields), if given
+        """
         cursor = SearchCursor(page, size, sort)
-        self.logger.info(cursor)
+        key = self.projected(repr(cursor), projection)
+        fields = list(projection.__fields__) if projection else None
+        self.logger.info("%r", cursor)
 
-        # look in cache upfront
-        if cached := await self.cacher.get_vector(repr(cursor)):
-            self.logger.info("%s index get from cache: %s"
-                             % (self.index, repr(cursor)))
-            return [self.model(**c) for c in cached]
-
-        # search all from elastic and convert
-        resp = list(await self.searcher.list_index(cursor))
-        converted = [self.model(**entry) 
-                     for entry in (resp if resp else [])]
-        self.logger.info(
-            f"Fetched and converted {len(converted)} {self.index} elastic docs\n")
-
-        # put page to cache
-        await self.cacher.put_vector(repr(cursor), converted)
-        return converted
+        # look in cache upfront, search all from elastic and convert on miss
+        return await self.cached_vector(
+            key,
+            lambda: self.searcher.list_index(cursor, fields),
+            projection or self.model)
 
     async def search_by_field(
             self,
@@ -46,51 +241,241 @@ class DocumentService:
             query: Optional[str],
             page: Optional[int],
             size: Optional[int],
-            sort: Optional[str]
+            sort: Optional[str],
+            projection: Optional[type] = None
     ) -> list[Optional[object]]:
         """ Looking for docs where specific field matches query"""
 
         cursor = SearchCursor(page, size, sort)
         match = SearchRequest(path, query)
-        key = ('_'.join([repr(cursor), repr(match)]))
+        key = self.projected('_'.join([repr(cursor), repr(match)]), projection)
+        fields = list(projection.__fields__) if projection else None
 
-        # look in cache upfront
-        if cached := await self.cacher.get_vector(key):
-            self.logger.info(
-                f"{self.index} index get from cache: {key}")
-            return [self.model(**c) for c in cached]
-
-        # search for field matches in elastic
-        resp = await self.searcher.search_index(cursor, match)
-        converted = [self.model(**entry)
-                     for entry in (resp if resp else [])]
-        self.logger.info(
-            f"Fetched and converted {len(converted)} {self.index} elastic docs"
-        )
-
-        # put page to cache
-        if converted:
-            await self.cacher.put_vector(
-                key,
-                list(map(lambda o: o.dict(), converted)))
-            self.logger.info(
-                f"{self.index} index put as key: {key}")
-        return converted
+        # look in cache upfront, search for field matches in elastic on miss
+        return await self.cached_vector(
+            key,
+            lambda: self.searcher.search_index(cursor, match, fields),
+            projection or self.model)
 
-    async def get_single(self, uuid: str) -> Optional[object]:
-        """Get a single document, knowing its identifier directly"""
+    async def search_by_fields(
+            self,
+            request: MultiFieldRequest,
+            page: Optional[int],
+            size: Optional[int],
+            sort: Optional[str],
+            projection: Optional[type] = None
+    ) -> list[Optional[object]]:
+        """Looking for docs where any of the fields matches query, the most relevant first (unless sorted)"""
 
-        # look in cache upfront
-        if cached := await self.cacher.get_scalar(uuid):
-            self.logger.info("%s id record get from cache: %s"
-                             % (self.index, cached))
-            return self.model(**cached)
+        cursor = SearchCursor(page, size, sort)
+        key = self.projected('_'.join([repr(cursor), repr(request)]), projection)
+        fields = list(projection.__fields__) if projection else None
+
+        # look in cache upfront, search for fields matches in elastic on miss
+        return await self.cached_vector(
+            key,
+            lambda: self.searcher.search_index(cursor, request, fields),
+            projection or self.model)
+
+    @staticmethod
+    def values(doc: dict, path: str) -> list[str]:
+        """Values of a field of nested documents (of the document itself, if path is not dotted)"""
+        if '.' not in path:
+            return [doc[path]] if doc.get(path) else []
+        parent, child = path.split('.', 1)
+        return [item[child] for item in doc.get(parent) or [] if item.get(child)]
+
+    async def similar(
+            self,
+            uuid: str,
+            fields: list[str],
+            size: int,
+            projection: Optional[type] = None
+    ) -> Optional[list[dict]]:
+        """Documents most like the document by terms of the fields, cached per document (None if it does not exist)"""
+        doc = await self.get_single(uuid)
+        if doc is None:
+            return None
+
+        cursor = SearchCursor(1, size, None)
+        request = SimilarRequest(uuid, fields, {path: self.values(doc, path) for path in fields if '.' in path})
+        key = self.projected('_'.join([repr(cursor), repr(request)]), projection)
+        projected = list(projection.__fields__) if projection else None
+
+        # look in cache upfront, search for documents like this one in elastic on miss
+        return await self.cached_vector(
+            key,
+            lambda: self.searcher.search_index(cursor, request, projected),
+            projection or self.model)
+
+    async def page_all(
+            self,
+            token: str,
+            size: Optional[int],
+            sort: Optional[str],
+            path: Optional[str] = None,
+            query: Optional[str] = None,
+            projection: Optional[type] = None,
+            request: Optional[MultiFieldRequest] = None,
+    ) -> tuple[list[dict], Optional[str]]:
+        """Page through documents (matching query on a field or request, if given) continuing after cursor token
+
+        Cursor pages are never cached: tokens are unique for every walk through the index
+        """
+        cursor = SearchCursor(1, size, sort, token)
+        match = request or (SearchRequest(path, query) if path else None)
+
+        fields = list(projection.__fields__) if projection else None
+
+        page = await self.searcher.page_index(cursor, match, fields)
+        return self.checked(projection or self.model, page.documents), page.token
+
+    async def export(self, token: str, size: int) -> AsyncIterator[SearchPage]:
+        """Walk the whole index page by page, continuing after cursor token, until the last page
+
+        Pages come from one point-in-time snapshot (the live index, once the snapshot expired while the walk
+        was paused) and bypass the cache altogether: every document is read once per walk, and only one page
+        is held in memory at a time.
+        """
+        while True:
+            page = await self.searcher.page_index(SearchCursor(1, size, None, token))
+            yield SearchPage(self.checked(self.model, page.documents), page.token)
+            if page.token is None:
+                return
+            token = page.token
+
+    @staticmethod
+    def suggestion_cached(request: SuggestRequest) -> bool:
+        """Suggestions of the prefix are kept in cache"""
+        return len(request.prefix) <= settings.SUGGEST_CACHED_PREFIX
+
+    async def suggest(self, request: SuggestRequest, projection: Optional[type] = None) -> list[dict]:
+        """Documents completing the prefix, with only fields of projection model, if given
+
+        Suggestions of short prefixes are few and asked for all the time, so they are cached,
+        longer ones are taken from elastic directly
+        """
+        fields = list(projection.__fields__) if projection else None
+        model = projection or self.model
+        if not self.suggestion_cached(request):
+            return self.checked(model, list(await self.searcher.suggest_index(request, fields)))
+        return await self.cached_vector(
+            self.projected(repr(request), projection),
+            lambda: self.searcher.suggest_index(request, fields),
+            model)
 
+    async def facets(self, request: FacetRequest) -> Optional[dict]:
+        """Counts of documents by facets, cached for their own TTL (None if they could not be counted)
+
+        One aggregation request counts all facets at once, instead of paging documents of every facet value.
+        """
+        key = repr(request)
+        if cached := await self.cacher.get_scalar(key):
+            self.logger.info("%s facets get from cache: %s", self.index, key)
+            served.set(Served())
+            return cached
+
+        store = self.admits_served(key)
+
+        async def fetch() -> Optional[dict]:
+            facets = await self.searcher.facet_index(request)
+            if facets is not None and store:
+                await self.cacher.put_scalar(key, facets, self.ttl.facets)
+                self.logger.info("%s facets cached: %s", self.index, key)
+            return facets
+
+        return await self.load(key, lambda: self.cacher.get_scalar(key), fetch, store)
+
+    async def lookup_single(self, uuid: str) -> Optional[Union[dict, object]]:
+        """Document from cache, MISSING if it is known not to exist, None on cache miss"""
+        cached = await self.cacher.get_scalar(uuid)
+        if cached is None:
+            return None
+        if not cached:
+            self.count_missing()
+            return MISSING
+        self.logger.info("%s id record get from cache: %s", self.index, uuid)
+        return cached
+
+    async def fetch_single(self, uuid: str, store: bool = True) -> Union[dict, object]:
         result = await self.searcher.get_document(uuid)
-        self.logger.info("got result search: " + str(result))
         if result:
-            response = self.model(**result)
-            await self.cacher.put_scalar(uuid, response)
-            self.logger.info("object cached as key: %s" % uuid)
-            return response
-        return None
+            self.checked(self.model, [result])
+            if store:
+                await self.cacher.put_scalar(uuid, result)
+                self.logger.info("%s id record cached: %s", self.index, uuid)
+            return result
+        await self.cacher.put_missing([uuid])
+        return MISSING
+
+    async def get_single(self, uuid: str) -> Optional[dict]:
+        """Get a single document, knowing its identifier directly"""
+
+        # look in cache upfront
+        if (result := await self.lookup_single(uuid)) is None:
+            store = self.admits_served(uuid)
+            result = await self.load(
+                uuid,
+                lambda: self.lookup_single(uuid),
+                lambda: self.fetch_single(uuid, store),
+                store)
+        else:
+            served.set(Served())
+        return None if result is MISSING else result
+
+    async def get_many(self, uuids: list[str]) -> list[dict]:
+        """Get documents by identifiers with one cache and one elastic round trip, skipping missing ones"""
+        uuids = list(dict.fromkeys(uuids))
+        cached = dict(zip(uuids, await self.cacher.get_scalars(uuids)))
+        found = {uuid: c for uuid, c in cached.items() if c}
+        self.logger.info("%d/%d %s records get from cache", len(found), len(uuids), self.index)
+
+        self.count_missing(sum(c == {} for c in cached.values()))
+        if missing := [uuid for uuid, c in cached.items() if c is None]:
+            result = await self.searcher.get_documents(missing)
+            fetched = {uuid: doc for uuid, doc in zip(missing, result) if doc}
+            self.checked(self.model, list(fetched.values()))
+            if admitted := {uuid: doc for uuid, doc in fetched.items() if self.admits(uuid)}:
+                await self.cacher.put_scalars(admitted)
+                self.logger.info("%d %s records cached", len(admitted), self.index)
+            if len(fetched) < len(missing):
+                await self.cacher.put_missing([uuid for uuid in missing if uuid not in fetched])
+            found.update(fetched)
+        return [found[uuid] for uuid in uuids if uuid in found]
+
+    async def get_response(self, key: str) -> Optional[CacheEntry]:
+        """Get response body cached as is, skipping any decoding and mapping"""
+        return await self.cacher.get_raw(key)
+
+    async def get_etag(self, key: str) -> Optional[str]:
+        """Get entity tag of a cached response body, without reading the body"""
+        return await self.cacher.get_etag(key)
+
+    async def get_fallback(self, key: str) -> Optional[CacheEntry]:
+        """Get response body cached as is even if expired, to be served while search is unavailable"""
+        if (cached := await self.cacher.get_fallback(key)) is not None:
+            self.count_fallback()
+        return cached
+
+    async def put_response(self, key: str, content: object) -> CacheEntry:
+        """Serialize response content once and cache the resulting bytes along with their entity tag
+
+        Bytes are cached if the value they are built of was admitted (or, taken from cache, if they are admitted
+        themselves), not when built of a stale page (so that its refreshed values are served next), and no longer
+        than the page stays fresh. The entity tag is computed all the same
+        """
+        with span('service.serialize', index=self.index):
+            data = dumps(content)
+        state = served.get()
+        served.set(Served())
+        ttl = None
+        if state.fresh_until is not None:
+            ttl = min(self.ttl.vector, int(state.fresh_until - time.time()))
+        admitted = self.admits(key) if state.admitted is None else state.admitted
+        if not admitted or (ttl is not None and ttl <= 0):
+            return CacheEntry(data, RedisCacher.content_tag(data))
+        return await self.cacher.put_raw(key, data, ttl)
+
+    async def invalidate(self) -> int:
+        """Invalidate all cached documents and pages of the index"""
+        return await self.cacher.drop_index()
@@ -1,12 +1,13 @@
 import asyncio
 
 from dataclasses import dataclass
-from typing import Awaitable, Optional, Callable
+from http import HTTPStatus
+from typing import Awaitable, Optional, Callable, Union
 
 import aiohttp
 import pytest
 
-from multidict import CIMultiDictProxy
+from multidict import CIMultiDictProxy, MultiDict
 from settings import settings
 
 pytest_plugins = ("fixtures.redis", "fixtures.elastic", "fixtures.genre", "fixtures.person")
@@ -36,23 +37,25 @@ async def backend_cleaner(get_es_cleaner, get_cache_cleaner) -> Callable:
 
 @dataclass
 class HTTPResponse:
-    body: dict
+    body: Optional[Union[dict, list]]
     headers: CIMultiDictProxy[str]
     status: int
 
 
 @pytest.fixture
-def http_requester(session) -> Callable[[str, Optional[dict]], Awaitable[HTTPResponse]]:
-    async def requester_factory(endpoint: str, params: Optional[dict] = None) -> HTTPResponse:
-        extra = {'sort': 'id'}
-        if params:
-            extra.update(params)
+def http_requester(session) -> Callable[..., Awaitable[HTTPResponse]]:
+    async def requester_factory(endpoint: str,
+                                params: Optional[Union[dict, list]] = None,
+                                headers: Optional[dict] = None) -> HTTPResponse:
+        extra = MultiDict(params or {})
+        extra.setdefault('sort', 'id')
 
         # в боевых системах старайтесь так не делать!
         url = f"{settings.API_SCHEME}://{settings.API_HOST}:{settings.API_PORT}/api/v1/{endpoint}"
 
-        async with session.get(url, params=extra) as response:
-            response_body = await response.json()
+        async with session.get(url, params=extra, headers=headers) as response:
+            # 304 Not Modified has neither body nor content type to decode
+            response_body = None if response.status == HTTPStatus.NOT_MODIFIED else await response.json()
 
             return HTTPResponse(
                 body=response_body,
@@ -81,3 +81,33 @@ class TestGenreIdEp:
 
         # Read again to check that page was cached
         await checker.check_cached_page(self.INDEX, genres.production())
+
+    async def test_cursor_walk(self, http_requester, genres: Factory):
+        """Test makes sure cursor pagination walks through all elements once, in order"""
+
+        walked, cursor = [], ''
+        while cursor is not None:
+            response = await http_requester(self.GENRES_LIST, {"page[size]": 30, "page[cursor]": cursor})
+            assert response.status == HTTPStatus.OK
+            walked += [genre['uuid'] for genre in response.body]
+            cursor = response.headers.get('X-Next-Page-Cursor')
+
+        assert walked == [GenreConverter.convert(genre)['uuid'] for genre in genres.production()]
+
+    async def test_cursor_malformed(self, http_requester):
+        """Test makes sure API rejects malformed page cursors"""
+
+        response = await http_requester(self.GENRES_LIST, {"page[cursor]": "malformed"})
+        assert response.status == HTTPStatus.BAD_REQUEST
+
+    async def test_etag_not_modified(self, http_requester):
+        """Test makes sure API answers conditional requests for unchanged pages with bare 304"""
+
+        response = await http_requester(self.GENRES_LIST)
+        assert response.status == HTTPStatus.OK
+        etag = response.headers["ETag"]
+
+        response = await http_requester(self.GENRES_LIST, headers={"If-None-Match": etag})
+        assert response.status == HTTPStatus.NOT_MODIFIED
+        assert response.headers["ETag"] == etag
+        assert not response.body
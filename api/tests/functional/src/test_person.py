@@ -33,3 +33,13 @@ class TestPersonIdEp:
         """Test makes sure API correctly returns and orders existing elements and pages"""
 
         await APITester.test_page(self.PERSON_LIST, PersonConverter, page, http_requester, get_es_updater, persons)
+
+    async def test_batch_ids(self, http_requester, persons: Factory):
+        """Test makes sure API returns persons requested by ids at once, in requested order"""
+
+        expected = [PersonConverter.convert(person) for person in persons.production()][:5]
+        ids = [person['uuid'] for person in reversed(expected)]
+
+        response = await http_requester(self.PERSON_LIST, [("ids", uid) for uid in ids])
+        assert response.status == HTTPStatus.OK
+        assert response.body == list(reversed(expected))
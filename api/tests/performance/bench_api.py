@@ -0,0 +1,192 @@
+"""End-to-end latency benchmark of the API on in-memory search and cache backends
+
+Drives the application in-process through ASGI transport, on a generated catalogue.
+Every endpoint is run cache-cold (empty caches, every url requested once) and then
+cache-warm (the same urls replayed), reporting latency percentiles and throughput.
+
+    PYTHONPATH=src python tests/performance/bench_api.py --out bench.json --compare previous.json
+"""
+import argparse
+import asyncio
+import logging
+import platform
+import statistics
+import subprocess  # noqa: S404
+import time
+from datetime import datetime, timezone
+from functools import partial
+from http import HTTPStatus
+from typing import Optional
+
+import httpx
+import orjson
+
+from catalogue import Catalogue
+from fakes import FakeCacher, FakeSearcher, Latency
+
+import main
+from interfaces.cache import CacheTTL
+from models.film import Film
+from models.genre import Genre
+from models.person import Person
+from services.base import DocumentService
+from services.film import get_film_service
+from services.genre import get_genre_service
+from services.person import get_person_service
+
+SERVICES = {
+    'films': (Film, get_film_service),
+    'genres': (Genre, get_genre_service),
+    'persons': (Person, get_person_service),
+}
+
+
+def endpoints(catalogue: Catalogue, count: int, faker) -> dict[str, list[str]]:
+    """Distinct urls of every benchmarked endpoint, drawn from the catalogue"""
+    def sample(items: list, key: str) -> list:
+        return [item[key] for item in faker.random_elements(items, min(count, len(items)), unique=True)]
+
+    words = list({word for film in catalogue.films for word in film['title'].lower().split()})
+    pages = range(1, min(count, len(catalogue.films) // 50) + 1)
+    return {
+        'films list': [f'/api/v1/films/?page[size]=50&page[number]={page}' for page in pages],
+        'films sorted': [f'/api/v1/films/?sort=-imdb_rating&page[size]=50&page[number]={page}' for page in pages],
+        'films by genre': [f'/api/v1/films/?filter[genre]={name}&page[size]=50'
+                           for name in sample(catalogue.genres, 'name')],
+        'films facets': ['/api/v1/films/facets'] + [f'/api/v1/films/facets?filter[genre]={name}'
+                                                    for name in sample(catalogue.genres, 'name')],
+        'films search': [f'/api/v1/films/search?query={word}&page[size]=50'
+                         for word in faker.random_elements(words, min(count, len(words)), unique=True)],
+        'films suggest': [f'/api/v1/films/suggest?query={word[:length]}'
+                          for word in faker.random_elements(words, min(count, len(words)), unique=True)
+                          for length in (2, 5)],
+        'film details': [f'/api/v1/films/{uuid}/' for uuid in sample(catalogue.films, 'id')],
+        'films similar': [f'/api/v1/films/{uuid}/similar' for uuid in sample(catalogue.films, 'id')],
+        'films batch': ['/api/v1/films/?' + '&'.join(f'ids={uuid}' for uuid in sample(catalogue.films, 'id')[:20])
+                        for _ in range(count)],
+        'genres list': ['/api/v1/genres/?page[size]=50'],
+        'persons search': [f'/api/v1/persons/search?query={name.split()[-1]}'
+                           for name in sample(catalogue.persons, 'full_name')],
+        'person details': [f'/api/v1/persons/{uuid}' for uuid in sample(catalogue.persons, 'id')],
+    }
+
+
+def install(catalogue: Catalogue, args: argparse.Namespace) -> dict[str, DocumentService]:
+    """Fresh services with empty caches on in-memory backends, replacing redis and elastic ones"""
+    services = {}
+    for index, documents in catalogue.indices().items():
+        model, dependency = SERVICES[index]
+        service = DocumentService(
+            index, model, None, None,
+            backend=FakeCacher(index, CacheTTL(), Latency(args.cache_latency, args.jitter, seed=1)),
+            searcher=FakeSearcher(index, documents, Latency(args.search_latency, args.jitter, seed=2)))
+        # no arguments: fastapi would take them for request parameters
+        main.app.dependency_overrides[dependency] = partial(lambda service: service, service)
+        services[index] = service
+    return services
+
+
+def summary(latencies: list[float], errors: int, elapsed: float) -> dict:
+    quantiles = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'p50_ms': round(quantiles[49] * 1000, 3),
+        'p95_ms': round(quantiles[94] * 1000, 3),
+        'p99_ms': round(quantiles[98] * 1000, 3),
+    }
+
+
+async def run(client: httpx.AsyncClient, urls: list[str], concurrency: int) -> dict:
+    """Request every url once, with at most concurrency requests in flight"""
+    latencies, errors = [], 0
+    queue = iter(urls)
+
+    async def worker():
+        nonlocal errors
+        for url in queue:
+            start = time.perf_counter()
+            response = await client.get(url)
+            latencies.append(time.perf_counter() - start)
+            # anything but 200 is an error, a redirect away from a misspelled route included
+            errors += response.status_code != HTTPStatus.OK
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summary(latencies, errors, time.perf_counter() - start)
+
+
+async def bench(args: argparse.Namespace) -> dict:
+    catalogue = Catalogue(args.films, args.persons, args.genres, args.seed)
+    targets = endpoints(catalogue, args.urls, catalogue.faker)
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        for name, urls in targets.items():
+            install(catalogue, args)
+            results[name] = {
+                'cold': await run(client, urls, args.concurrency),
+                'warm': await run(client, urls * args.repeat, args.concurrency),
+            }
+    return results
+
+
+def revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],  # noqa: S603, S607
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results: dict, baseline: Optional[dict]) -> None:
+    print(f"{'endpoint':<16}{'phase':<6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"
+          f"{'p95 vs base':>14}")
+    for name, phases in results.items():
+        for phase, stats in phases.items():
+            change = ''
+            if baseline and (base := baseline.get(name, {}).get(phase)) and base['p95_ms']:
+                change = f"{(stats['p95_ms'] / base['p95_ms'] - 1) * 100:+.1f}%"
+            print(f"{name:<16}{phase:<6}{stats['rps']:>10}{stats['p50_ms']:>10}{stats['p95_ms']:>10}"
+                  f"{stats['p99_ms']:>10}{stats['errors']:>8}{change:>14}")
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--films', type=int, default=2000)
+    parser.add_argument('--persons', type=int, default=5000)
+    parser.add_argument('--genres', type=int, default=25)
+    parser.add_argument('--seed', type=int, default=4231)
+    parser.add_argument('--urls', type=int, default=100, help='distinct urls per endpoint')
+    parser.add_argument('--repeat', type=int, default=3, help='replays of urls in cache-warm run')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--search-latency', type=float, default=0.005, help='elastic round trip, seconds')
+    parser.add_argument('--cache-latency', type=float, default=0.0005, help='redis round trip, seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random latency up to, seconds')
+    parser.add_argument('--out', help='save results to JSON file')
+    parser.add_argument('--compare', help='JSON file of a previous run to compare with')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    results = asyncio.run(bench(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'rb') as previous:
+            baseline = orjson.loads(previous.read())['results']
+    report(results, baseline)
+
+    if args.out:
+        with open(args.out, 'wb') as out:
+            out.write(orjson.dumps({
+                'created': datetime.now(timezone.utc).isoformat(),
+                'revision': revision(),
+                'python': platform.python_version(),
+                'args': vars(args),
+                'results': results,
+            }, option=orjson.OPT_INDENT_2))
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,168 @@
+"""Micro-benchmarks of the per-request CPU path: models, converters, mappers and cache codecs
+
+Every stage runs on generated films and persons of realistic cast sizes, reporting
+operations per second (best of repeats) and memory allocated at peak per operation.
+A run fails when a stage is slower or allocates more than the baseline allows.
+
+    PYTHONPATH=src python tests/performance/bench_micro.py --save-baseline baseline.json
+    PYTHONPATH=src python tests/performance/bench_micro.py --baseline baseline.json --threshold 0.2
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from typing import Callable, Optional
+
+import orjson
+
+from catalogue import Catalogue
+from fakes import FakeSearcher
+
+from core.converter import FilmBaseConverter, FilmConverter, FilmSuggestionConverter, PersonConverter
+from core.mapper import FilmBaseMapper, FilmMapper, FilmSuggestionMapper, PersonMapper
+from core.redis import RedisCacher
+from interfaces.cache import CacheIndex
+from models.base import dumps
+from models.film import Film, FilmBase, FilmSuggestion
+from models.person import Person
+
+PAGE_SIZE = 50
+
+
+def stages(catalogue: Catalogue) -> dict[str, tuple[Callable[[object], object], list]]:
+    """Stage name to its operation and inputs the operation is run on, one by one"""
+    # documents as they are returned by elastic
+    films = [FakeSearcher.project(film, None) for film in catalogue.films]
+    persons = [FakeSearcher.project(person, None) for person in catalogue.persons]
+    film_models = [Film(**film) for film in films]
+    person_models = [Person(**person) for person in persons]
+    suggestions = [{'id': film['id'], 'title': film['title']} for film in films]
+    suggestion_models = [FilmSuggestion(**suggestion) for suggestion in suggestions]
+
+    pages = [films[i:i + PAGE_SIZE] for i in range(0, len(films), PAGE_SIZE)]
+    encoded = [dumps({'values': page}) for page in pages]
+    scalars = [model.json().encode() for model in film_models]
+    responses = [[FilmConverter.convert(model) for model in film_models[i:i + PAGE_SIZE]]
+                 for i in range(0, len(film_models), PAGE_SIZE)]
+    mapped = [[FilmMapper.map(film) for film in page] for page in pages]
+
+    return {
+        'film model': (lambda film: Film(**film), films),
+        'film base model': (lambda film: FilmBase(**film), films),
+        'person model': (lambda person: Person(**person), persons),
+        'film converter': (FilmConverter.convert, film_models),
+        'film base converter': (FilmBaseConverter.convert, film_models),
+        'person converter': (PersonConverter.convert, person_models),
+        'film suggestion converter': (FilmSuggestionConverter.convert, suggestion_models),
+        'film mapper': (FilmMapper.map, films),
+        'film base mapper': (FilmBaseMapper.map, films),
+        'person mapper': (PersonMapper.map, persons),
+        'film suggestion mapper': (FilmSuggestionMapper.map, suggestions),
+        'scalar encode': (lambda model: model.json(), film_models),
+        'scalar dumps': (dumps, films),
+        'scalar decode_redis': (RedisCacher.decode_redis, scalars),
+        'cache index encode': (lambda page: dumps({'values': page}), pages),
+        'cache index decode': (lambda data: CacheIndex.construct(**RedisCacher.decode_redis(data)), encoded),
+        'response dumps': (dumps, responses),
+        'mapped response dumps': (dumps, mapped),
+    }
+
+
+def measure(operation: Callable[[object], object], inputs: list, repeat: int, duration: float) -> dict:
+    """Best time per operation over repeats, and peak memory allocated per operation"""
+    # calibrate number of passes over inputs to run for about duration
+    start = time.perf_counter()
+    for item in inputs:
+        operation(item)
+    passes = max(1, int(duration / max(time.perf_counter() - start, 1e-9)))
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(passes):
+            for item in inputs:
+                operation(item)
+        best = min(best, (time.perf_counter() - start) / (passes * len(inputs)))
+
+    peaks = []
+    tracemalloc.start()
+    for item in inputs:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        operation(item)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+    tracemalloc.stop()
+
+    return {
+        'ops_per_sec': round(1 / best, 1),
+        'us_per_op': round(best * 1e6, 3),
+        'peak_bytes_per_op': round(sum(peaks) / len(peaks)),
+    }
+
+
+def regressions(results: dict, baseline: dict, threshold: float) -> dict[str, list[str]]:
+    """Stages slower or allocating more than baseline, beyond threshold share"""
+    found = {}
+    for name, stats in results.items():
+        if not (base := baseline.get(name)):
+            continue
+        problems = []
+        if stats['ops_per_sec'] < base['ops_per_sec'] * (1 - threshold):
+            problems.append(f"ops/sec {stats['ops_per_sec']} < {base['ops_per_sec']}")
+        if stats['peak_bytes_per_op'] > base['peak_bytes_per_op'] * (1 + threshold):
+            problems.append(f"peak bytes {stats['peak_bytes_per_op']} > {base['peak_bytes_per_op']}")
+        if problems:
+            found[name] = problems
+    return found
+
+
+def report(results: dict, baseline: Optional[dict]) -> None:
+    print(f"{'stage':<28}{'ops/sec':>12}{'us/op':>10}{'peak B/op':>12}{'ops vs base':>14}")
+    for name, stats in results.items():
+        change = ''
+        if baseline and (base := baseline.get(name)):
+            change = f"{(stats['ops_per_sec'] / base['ops_per_sec'] - 1) * 100:+.1f}%"
+        print(f"{name:<28}{stats['ops_per_sec']:>12}{stats['us_per_op']:>10}{stats['peak_bytes_per_op']:>12}"
+              f"{change:>14}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--films', type=int, default=200)
+    parser.add_argument('--persons', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=4231)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--duration', type=float, default=0.2, help='seconds per repeat of a stage')
+    parser.add_argument('--stage', action='append', help='run only given stages')
+    parser.add_argument('--baseline', help='JSON file of stored baseline results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed regression share')
+    parser.add_argument('--save-baseline', help='store results to JSON file as a new baseline')
+    args = parser.parse_args()
+
+    catalogue = Catalogue(args.films, args.persons, seed=args.seed)
+    results = {}
+    for name, (operation, inputs) in stages(catalogue).items():
+        if args.stage and name not in args.stage:
+            continue
+        results[name] = measure(operation, inputs, args.repeat, args.duration)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'rb') as stored:
+            baseline = orjson.loads(stored.read())
+    report(results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'wb') as out:
+            out.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+
+    if baseline and (found := regressions(results, baseline, args.threshold)):
+        for name, problems in found.items():
+            print(f"REGRESSION {name}: {', '.join(problems)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,49 @@
+from faker import Faker
+
+
+class Catalogue:
+    """Generated catalogue of films, genres and persons, shaped as documents of elastic indices
+
+    Cast sizes follow real films: dozens of actors, a few writers and directors.
+    Films and persons carry suggestion inputs and weights, as the indexer makes them.
+    """
+
+    def __init__(self, films: int = 2000, persons: int = 5000, genres: int = 25, seed: int = 4231) -> None:
+        Faker.seed(seed)
+        self.faker = Faker()
+
+        self.genres = [{'id': self.faker.uuid4(), 'name': name}
+                       for name in self.faker.words(genres, unique=True)]
+        self.persons = [{'id': self.faker.uuid4(), 'full_name': self.faker.name(), 'films': []}
+                        for _ in range(persons)]
+        self.films = [self.make_film() for _ in range(films)]
+        for person in self.persons:
+            person['suggest'] = {'input': self.suggest_inputs(person['full_name']), 'weight': len(person['films'])}
+
+    @staticmethod
+    def suggest_inputs(text: str, limit: int = 5) -> list[str]:
+        words = text.split()
+        return list(dict.fromkeys(' '.join(words[i:]) for i in range(min(len(words), limit))))
+
+    def cast(self, low: int, high: int) -> list[dict]:
+        return self.faker.random_elements(self.persons, self.faker.random_int(low, high), unique=True)
+
+    def make_film(self) -> dict:
+        film = {
+            'id': self.faker.uuid4(),
+            'type': 'movie',
+            'title': self.faker.sentence(self.faker.random_int(1, 5)).rstrip('.'),
+            'description': self.faker.paragraph(self.faker.random_int(3, 10)),
+            'imdb_rating': round(self.faker.pyfloat(min_value=1, max_value=10), 1),
+            'genre': self.faker.random_elements(self.genres, self.faker.random_int(1, 3), unique=True),
+        }
+        film['suggest'] = {'input': self.suggest_inputs(film['title']), 'weight': round(film['imdb_rating'] * 10)}
+        for role, low, high in (('actors', 5, 40), ('writers', 1, 5), ('directors', 1, 2)):
+            people = self.cast(low, high)
+            film[role] = [{'id': person['id'], 'full_name': person['full_name']} for person in people]
+            for person in people:
+                person['films'].append({'film_id': film['id'], 'role': role[:-1], 'title': film['title']})
+        return film
+
+    def indices(self) -> dict[str, list[dict]]:
+        return {'films': self.films, 'genres': self.genres, 'persons': self.persons}
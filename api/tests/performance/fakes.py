@@ -0,0 +1,408 @@
+import asyncio
+import base64
+import hashlib
+import math
+import random
+import time
+from collections import Counter
+from operator import itemgetter
+from typing import Optional, Union
+from uuid import UUID
+
+import orjson
+from pydantic import BaseModel
+
+from interfaces.cache import CacheAPI, CacheEntry, CacheIndex, CacheStats, CacheTTL
+from interfaces.search import (FacetRequest, Matching, MultiFieldRequest, SearchAPI, SearchCursor, SearchCursorError,
+                               SearchPage, SearchRequest, SearchUnavailableError, SimilarRequest, SuggestRequest)
+from models.base import dumps
+
+
+class Latency:
+    """Injected round trip latency: fixed delay plus uniformly distributed jitter (seconds)"""
+
+    def __init__(self, delay: float = 0.0, jitter: float = 0.0, seed: int = 0) -> None:
+        self.delay = delay
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+
+    async def wait(self) -> None:
+        # even a zero delay yields to event loop, as a real round trip does
+        await asyncio.sleep(self.delay + (self.rng.uniform(0, self.jitter) if self.jitter else 0))
+
+
+class FakeSearcher(SearchAPI):
+    """In-memory index with elastic-like matching, sorting and source filtering
+
+    Documents are returned through JSON round trip, as they are decoded from elastic response.
+    """
+
+    # fields only used to search documents, never returned
+    SOURCE_EXCLUDES = ('suggest',)
+
+    def __init__(self, index: str, documents: list[dict], latency: Optional[Latency] = None) -> None:
+        self.index = index
+        self.documents = documents
+        self.by_id = {str(doc['id']): doc for doc in documents}
+        self.latency = latency or Latency()
+        self.calls = Counter()
+        # set to make every request fail as it would while elastic is down
+        self.down = False
+
+    async def request(self, operation: str) -> None:
+        """Count a request of the operation and make its round trip"""
+        self.calls[operation] += 1
+        await self.latency.wait()
+        if self.down:
+            raise SearchUnavailableError(f'{self.index} is down')
+
+    @staticmethod
+    def tokens(value: object) -> set[str]:
+        return set(str(value).lower().split())
+
+    @classmethod
+    def matches_field(cls, doc: dict, path: str, query: set[str]) -> bool:
+        """Any token of query found in the field (nested field, if path is dotted)"""
+        if '.' in path:
+            parent, child = path.split('.', 1)
+            return any(query & cls.tokens(item.get(child, '')) for item in doc.get(parent) or [])
+        return bool(query & cls.tokens(doc.get(path, '')))
+
+    @staticmethod
+    def filtered(doc: dict, path: str, value: str) -> bool:
+        """Value equal to the field (to a nested field of any item, if path is dotted)"""
+        if '.' in path:
+            parent, child = path.split('.', 1)
+            return any(item.get(child) == value for item in doc.get(parent) or [])
+        return doc.get(path) == value
+
+    def score(self, doc: dict, request: Matching) -> float:
+        """Relevance of document: sum of boosts of fields matching query, 0 if it is not found or filtered out"""
+        if isinstance(request, SearchRequest):
+            return float(self.matches_field(doc, request.path, self.tokens(request.query)))
+        if isinstance(request, SimilarRequest):
+            return self.likeness(doc, request)
+        if not all(self.filtered(doc, path, value) for path, value in request.filters.items()):
+            return 0.0
+        query = self.tokens(request.query)
+        return sum(boost for path, boost in request.fields.items() if self.matches_field(doc, path, query))
+
+    def likeness(self, doc: dict, request: SimilarRequest) -> float:
+        """Number of terms shared with the liked document in its fields, 0 for the document itself"""
+        if str(doc['id']) == request.uuid or request.uuid not in self.by_id:
+            return 0.0
+        liked = self.by_id[request.uuid]
+        shared = 0
+        for path in request.fields:
+            like = request.like.get(path, []) if '.' in path else self.values(liked, path)
+            terms = set().union(*map(self.tokens, like))
+            shared += len(terms & set().union(*map(self.tokens, self.values(doc, path))))
+        return float(shared)
+
+    def matches(self, doc: dict, request: Matching) -> bool:
+        return self.score(doc, request) > 0
+
+    @classmethod
+    def project(cls, doc: dict, fields: Optional[list[str]]) -> dict:
+        source = {field: value for field, value in doc.items()
+                  if (field in fields if fields else field not in cls.SOURCE_EXCLUDES)}
+        return orjson.loads(orjson.dumps(source))
+
+    def select(self, cursor: SearchCursor, request: Optional[Matching]) -> list[dict]:
+        docs = [doc for doc in self.documents if self.matches(doc, request)] if request else self.documents
+        if isinstance(request, (MultiFieldRequest, SimilarRequest)) and not cursor.sort:
+            # the most relevant first, as elastic scores boosted fields (stable for equal scores)
+            docs = sorted(docs, key=lambda doc: self.score(doc, request), reverse=True)
+        if cursor.sort:
+            # documents without the field go last, whatever the order is
+            field, reverse = cursor.sort.lstrip('-'), cursor.sort.startswith('-')
+            present = [doc for doc in docs if doc.get(field) is not None]
+            docs = sorted(present, key=itemgetter(field), reverse=reverse) + \
+                [doc for doc in docs if doc.get(field) is None]
+        return docs
+
+    async def query(self, cursor: SearchCursor, request: Optional[Matching],
+                    fields: Optional[list[str]]) -> list[object]:
+        await self.request('search')
+        docs = self.select(cursor, request)[cursor.offset:cursor.offset + cursor.size]
+        return [self.project(doc, fields) for doc in docs]
+
+    async def list_index(self, cursor: SearchCursor, fields: Optional[list[str]] = None) -> list[object]:
+        return await self.query(cursor, None, fields)
+
+    async def search_index(self, cursor: SearchCursor, request: Matching,
+                           fields: Optional[list[str]] = None) -> list[object]:
+        return await self.query(cursor, request, fields)
+
+    async def page_index(self, cursor: SearchCursor, request: Optional[Matching] = None,
+                         fields: Optional[list[str]] = None) -> SearchPage:
+        await self.request('page')
+        try:
+            offset = int(base64.urlsafe_b64decode(cursor.token)) if cursor.token else 0
+        except ValueError as e:
+            raise SearchCursorError(f'Malformed cursor token: {cursor.token}') from e
+
+        docs = self.select(cursor, request)
+        page = [self.project(doc, fields) for doc in docs[offset:offset + cursor.size]]
+        offset += cursor.size
+        token = base64.urlsafe_b64encode(str(offset).encode()).decode() if offset < len(docs) else None
+        return SearchPage(page, token)
+
+    async def suggest_index(self, request: SuggestRequest, fields: Optional[list[str]] = None) -> list[object]:
+        """Documents with suggestion inputs starting with the prefix, heavier weight first"""
+        await self.request('suggest')
+        found = [doc for doc in self.documents if 'suggest' in doc and any(
+            text.lower().startswith(request.prefix) for text in doc['suggest']['input'])]
+        found.sort(key=lambda doc: doc['suggest']['weight'], reverse=True)
+        return [self.project(doc, fields) for doc in found[:request.size]]
+
+    @staticmethod
+    def values(doc: dict, path: str) -> set:
+        """Distinct values of the field (of nested documents, if path is dotted)"""
+        if '.' in path:
+            parent, child = path.split('.', 1)
+            return {item[child] for item in doc.get(parent) or [] if item.get(child) is not None}
+        return {doc[path]} if doc.get(path) is not None else set()
+
+    async def facet_index(self, request: FacetRequest) -> Optional[dict]:
+        """Documents counted by facets as elastic aggregations do: terms most frequent first, histograms by key"""
+        await self.request('aggregate')
+        docs = [doc for doc in self.documents
+                if all(self.filtered(doc, path, value) for path, value in request.filters.items())]
+
+        facets = {'total': len(docs)}
+        for path in request.terms:
+            counts = Counter(value for doc in docs for value in self.values(doc, path))
+            top = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:request.size]
+            facets[path.split('.')[0]] = [{'key': key, 'count': count} for key, count in top]
+        for path, interval in request.histograms.items():
+            counts = Counter(float(math.floor(value / interval) * interval)
+                             for doc in docs for value in self.values(doc, path))
+            facets[path.split('.')[0]] = [{'key': key, 'count': count} for key, count in sorted(counts.items())]
+        return facets
+
+    async def get_document(self, uuid: UUID) -> Optional[object]:
+        await self.request('get')
+        doc = self.by_id.get(str(uuid))
+        return self.project(doc, None) if doc else None
+
+    async def get_documents(self, uuids: list[UUID]) -> list[Optional[object]]:
+        await self.request('mget')
+        return [self.project(self.by_id[str(uuid)], None) if str(uuid) in self.by_id else None for uuid in uuids]
+
+
+class FakeCacher(CacheAPI):
+    """In-memory cache backend with redis cacher semantics (TTLs, generations, locks)
+
+    Values are stored serialized and decoded on every read, as they are in redis.
+    """
+
+    MISSING = b'{}'
+
+    def __init__(self, index: str, ttl: CacheTTL = CacheTTL(), latency: Optional[Latency] = None) -> None:
+        self.index = index
+        self.ttl = ttl
+        self.latency = latency or Latency()
+        self.stats = CacheStats('fake')
+        self.store: dict[str, tuple[bytes, float]] = {}
+        self.generation = 0
+
+    def entry(self, key: str) -> str:
+        return f'{self.generation}__{key}'
+
+    def read(self, key: str) -> Optional[bytes]:
+        value, expires = self.store.get(self.entry(key), (None, 0.0))
+        if value is None or expires < time.monotonic():
+            return None
+        return value
+
+    def write(self, key: str, value: bytes, ttl: float) -> None:
+        self.store[self.entry(key)] = (value, time.monotonic() + ttl)
+
+    def count(self, found: int, total: int = 1) -> None:
+        self.stats.hit(found)
+        self.stats.miss(total - found)
+
+    async def get_scalar(self, key: str) -> Optional[dict]:
+        await self.latency.wait()
+        value = self.read(key)
+        self.count(int(value is not None))
+        return orjson.loads(value) if value else None
+
+    async def put_scalar(self, key: str, value: Union[dict, BaseModel], ttl: Optional[int] = None) -> None:
+        await self.latency.wait()
+        self.write(key, dumps(value), ttl or self.ttl.scalar)
+
+    async def get_scalars(self, keys: list[str]) -> list[Optional[dict]]:
+        await self.latency.wait()
+        values = [self.read(key) for key in keys]
+        self.count(sum(value is not None for value in values), len(keys))
+        return [orjson.loads(value) if value else None for value in values]
+
+    async def put_scalars(self, values: dict[str, Union[dict, BaseModel]]) -> None:
+        await self.latency.wait()
+        for key, value in values.items():
+            self.write(key, dumps(value), self.ttl.scalar)
+
+    async def put_missing(self, keys: list[str]) -> None:
+        await self.latency.wait()
+        for key in keys:
+            self.write(key, self.MISSING, self.ttl.missing)
+
+    async def get_vector(self, key: str) -> Optional[list[dict]]:
+        result = await self.get_index(key)
+        return result.values if result else None
+
+    async def get_index(self, key: str) -> Optional[CacheIndex]:
+        result = await self.get_scalar(key)
+        return CacheIndex.construct(**result) if result else None
+
+    async def put_vector(self, key: str, data: list[dict]) -> None:
+        if not data:
+            await self.put_scalar(key, {'values': data}, self.ttl.missing)
+            return
+        now = time.time()
+        await self.put_scalar(
+            key,
+            {'values': data, 'fresh_until': now + self.ttl.vector,
+             'expires': now + self.ttl.vector + self.ttl.revalidate},
+            self.ttl.vector + self.ttl.revalidate + self.ttl.fallback)
+
+    async def get_raw(self, key: str) -> Optional[CacheEntry]:
+        await self.latency.wait()
+        data, etag = self.read(key), self.read(f'{key}__etag')
+        self.count(int(data is not None and etag is not None))
+        return CacheEntry(data, etag.decode()) if data is not None and etag is not None else None
+
+    async def get_fallback(self, key: str) -> Optional[CacheEntry]:
+        await self.latency.wait()
+        data = self.read(key)
+        return CacheEntry(data, f'"{hashlib.blake2b(data, digest_size=16).hexdigest()}"') if data is not None else None
+
+    async def get_etag(self, key: str) -> Optional[str]:
+        await self.latency.wait()
+        etag = self.read(f'{key}__etag')
+        self.count(int(etag is not None))
+        return etag.decode() if etag is not None else None
+
+    async def put_raw(self, key: str, data: bytes, ttl: Optional[int] = None) -> CacheEntry:
+        await self.latency.wait()
+        cached = CacheEntry(data, f'"{hashlib.blake2b(data, digest_size=16).hexdigest()}"')
+        self.write(key, data, (ttl or self.ttl.vector) + self.ttl.fallback)
+        self.write(f'{key}__etag', cached.etag.encode(), ttl or self.ttl.vector)
+        return cached
+
+    async def drop_key(self, key: str) -> int:
+        await self.latency.wait()
+        return int(self.store.pop(self.entry(key), None) is not None)
+
+    async def get_generation(self) -> int:
+        return self.generation
+
+    async def drop_index(self) -> int:
+        await self.latency.wait()
+        self.generation += 1
+        return self.generation
+
+    async def acquire(self, key: str, ttl: float) -> bool:
+        await self.latency.wait()
+        if self.read(f'{key}__lock') is not None:
+            return False
+        self.write(f'{key}__lock', b'1', ttl)
+        return True
+
+    async def release(self, key: str) -> None:
+        await self.latency.wait()
+        self.store.pop(self.entry(f'{key}__lock'), None)
+
+
+class FakeRedis:
+    """In-memory stand-in of the redis client, serving the commands RedisCacher sends
+
+    Values are kept as bytes and expire by TTL, as they do in redis. Time of the fake can be moved on by tests.
+    """
+
+    def __init__(self) -> None:
+        self.data: dict[str, tuple[bytes, Optional[float]]] = {}
+        self.offset = 0.0
+
+    def now(self) -> float:
+        return time.monotonic() + self.offset
+
+    def advance(self, seconds: float) -> None:
+        self.offset += seconds
+
+    @staticmethod
+    def encode(value: Union[bytes, str, int]) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def read(self, key: str) -> Optional[bytes]:
+        value, expires = self.data.get(key, (None, None))
+        if expires is not None and expires <= self.now():
+            del self.data[key]
+            return None
+        return value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self.read(key)
+
+    async def mget(self, keys: list[str]) -> list[Optional[bytes]]:
+        return [self.read(key) for key in keys]
+
+    async def set(self, key: str, value: Union[bytes, str, int],
+                  ex: Optional[float] = None, px: Optional[int] = None, nx: bool = False) -> Optional[bool]:
+        if nx and self.read(key) is not None:
+            return None
+        ttl = ex if ex is not None else px / 1000 if px is not None else None
+        self.data[key] = (self.encode(value), self.now() + ttl if ttl is not None else None)
+        return True
+
+    async def incr(self, key: str) -> int:
+        value = int(self.read(key) or 0) + 1
+        self.data[key] = (self.encode(value), self.data.get(key, (None, None))[1])
+        return value
+
+    async def delete(self, *keys: str) -> int:
+        deleted = [key for key in keys if self.read(key) is not None]
+        for key in deleted:
+            del self.data[key]
+        return len(deleted)
+
+    async def ttl(self, key: str) -> int:
+        """Seconds the key lives for, -1 if it does not expire, -2 if there is no key"""
+        if self.read(key) is None:
+            return -2
+        expires = self.data[key][1]
+        return -1 if expires is None else round(expires - self.now())
+
+    async def eval(self, script: str, numkeys: int, *args) -> int:
+        """Runs the only script sent: delete the key if it still holds the value"""
+        keys, values = args[:numkeys], args[numkeys:]
+        if self.read(keys[0]) == self.encode(values[0]):
+            return await self.delete(keys[0])
+        return 0
+
+    def pipeline(self, transaction: bool = True) -> 'FakePipeline':
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Commands queued to fake redis, sent at once on execute"""
+
+    def __init__(self, redis: FakeRedis) -> None:
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self) -> 'FakePipeline':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.commands.clear()
+
+    def set(self, *args, **kwargs) -> 'FakePipeline':
+        self.commands.append((self.redis.set, args, kwargs))
+        return self
+
+    async def execute(self) -> list:
+        commands, self.commands = self.commands, []
+        return [await command(*args, **kwargs) for command, args, kwargs in commands]
@@ -0,0 +1,91 @@
+"""Simulation of cache hit ratio with and without frequency-aware admission (TinyLFU)
+
+A cache of given capacity, evicting least recently used keys (as redis does with allkeys-lru),
+is driven by a workload of popular keys (film pages, documents) drawn from a Zipf distribution,
+mixed with long-tail keys requested once (random search queries). Every miss fills the cache,
+unless the admission policy rejects the key. Keys may be replayed from an access log instead.
+
+    PYTHONPATH=src python tests/performance/sim_admission.py --capacity 500 --capacity 2000
+    PYTHONPATH=src python tests/performance/sim_admission.py --access-log /var/log/nginx/access.log
+"""
+import argparse
+import itertools
+import random
+from collections import Counter, OrderedDict
+from typing import Iterable, Iterator, Optional
+
+from core.admission import FrequencyAdmission
+from core.warmup import access_urls
+
+
+def workload(requests: int, popular: int, skew: float, tail: float, seed: int) -> Iterator[tuple[str, bool]]:
+    """Requested keys, telling if the key is a popular one"""
+    rng = random.Random(seed)
+    weights = list(itertools.accumulate(1 / rank ** skew for rank in range(1, popular + 1)))
+    for _ in range(requests):
+        if rng.random() < tail:
+            yield f'search?query={rng.getrandbits(64):x}', False
+        else:
+            yield f'films?page={rng.choices(range(popular), cum_weights=weights)[0]}', True
+
+
+def simulate(keys: Iterable[tuple[str, bool]], capacity: int,
+             admission: Optional[FrequencyAdmission]) -> dict:
+    """Hit ratio of all and of popular keys, and number of cache fills"""
+    cache: OrderedDict[str, None] = OrderedDict()
+    requests = hits = popular = popular_hits = fills = 0
+    for key, hot in keys:
+        requests += 1
+        popular += hot
+        if key in cache:
+            cache.move_to_end(key)
+            hits += 1
+            popular_hits += hot
+            continue
+        if admission is None or admission.admit(key):
+            fills += 1
+            cache[key] = None
+            if len(cache) > capacity:
+                cache.popitem(last=False)
+    return {
+        'hit_ratio': hits / requests if requests else 0.0,
+        'popular_hit_ratio': popular_hits / popular if popular else 0.0,
+        'fills': fills,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200000)
+    parser.add_argument('--popular', type=int, default=5000, help='number of popular keys')
+    parser.add_argument('--skew', type=float, default=0.9, help='Zipf exponent of popular keys')
+    parser.add_argument('--tail', type=float, default=0.3, help='share of one-off long-tail requests')
+    parser.add_argument('--seed', type=int, default=4231)
+    parser.add_argument('--access-log', help='replay API urls of nginx/uvicorn access log instead')
+    parser.add_argument('--capacity', type=int, action='append', help='cache capacities, keys')
+    parser.add_argument('--width', type=int, default=65536)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--window', type=int, default=100000)
+    parser.add_argument('--threshold', type=int, default=2)
+    args = parser.parse_args()
+
+    if args.access_log:
+        # popular keys of a log are not known upfront: ones requested more than once are counted as such
+        urls = list(access_urls(args.access_log))
+        repeated = {url for url, count in Counter(urls).items() if count > 1}
+        keys = [(url, url in repeated) for url in urls]
+    else:
+        keys = list(workload(args.requests, args.popular, args.skew, args.tail, args.seed))
+
+    print(f"{'capacity':>9}{'policy':>11}{'hit ratio':>11}{'popular':>10}{'fills':>10}")
+    for capacity in args.capacity or [500, 1000, 2000, 5000]:
+        for policy, admission in (
+                ('lru', None),
+                ('tinylfu', FrequencyAdmission(args.width, args.depth, args.window, args.threshold))):
+            result = simulate(keys, capacity, admission)
+            print(f"{capacity:>9}{policy:>11}{result['hit_ratio']:>11.3f}{result['popular_hit_ratio']:>10.3f}"
+                  f"{result['fills']:>10}")
+
+
+if __name__ == '__main__':
+    main()
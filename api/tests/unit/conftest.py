@@ -0,0 +1,70 @@
+from functools import partial
+
+import httpx
+import pytest
+
+from catalogue import Catalogue
+from fakes import FakeCacher, FakeSearcher
+
+import main
+from core.config import settings
+from interfaces.cache import CacheTTL
+from models.film import Film
+from models.genre import Genre
+from models.person import Person
+from services.base import DocumentService
+from services.film import get_film_service
+from services.genre import get_genre_service
+from services.person import get_person_service
+
+# model and service provider of every index
+INDICES = {
+    'films': (Film, get_film_service),
+    'genres': (Genre, get_genre_service),
+    'persons': (Person, get_person_service),
+}
+
+
+@pytest.fixture(scope='session')
+def catalogue() -> Catalogue:
+    """Documents of every index, shared by tests (which never change them)"""
+    return Catalogue(films=200, persons=300, genres=10)
+
+
+@pytest.fixture
+def cache_ttl() -> CacheTTL:
+    """TTL of cache backends of services, overridden by tests of expiry"""
+    return CacheTTL()
+
+
+@pytest.fixture
+def overrides() -> dict:
+    """Settings services are created with, overridden by tests of optional features"""
+    return {}
+
+
+@pytest.fixture
+def services(catalogue, cache_ttl, overrides, monkeypatch) -> dict[str, DocumentService]:
+    """Services of every index on in-memory backends, installed into the application"""
+    for name, value in overrides.items():
+        monkeypatch.setattr(settings, name, value)
+    installed = {}
+    for index, (model, dependency) in INDICES.items():
+        service = DocumentService(index, model, None, None, backend=FakeCacher(index, cache_ttl),
+                                  searcher=FakeSearcher(index, catalogue.indices()[index]))
+        main.app.dependency_overrides[dependency] = partial(lambda service: service, service)
+        installed[index] = service
+    yield installed
+    main.app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def service(services) -> DocumentService:
+    """Film service on in-memory backends, installed into the application"""
+    return services['films']
+
+
+@pytest.fixture
+async def client():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url='http://test') as client:
+        yield client
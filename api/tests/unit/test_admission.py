@@ -0,0 +1,93 @@
+import time
+from collections import Counter
+
+import pytest
+
+from catalogue import Catalogue
+from fakes import FakeCacher, FakeSearcher
+
+from core import admission
+from core.admission import CountMinSketch, FrequencyAdmission
+from interfaces.search import SearchCursor
+from models.film import Film
+from services.base import DocumentService
+
+
+def test_sketch_never_underestimates():
+    """Estimates are at least true counts, even when a small sketch collides a lot"""
+    sketch = CountMinSketch(width=64, depth=3)
+    counts = Counter(f'key{i % 300}' for i in range(3000) if i % 7)
+    for key, count in counts.items():
+        for _ in range(count):
+            sketch.add(key)
+    assert all(sketch.estimate(key) >= count for key, count in counts.items())
+
+
+def test_sketch_saturates_and_halves():
+    sketch = CountMinSketch(width=1024, depth=4)
+    for _ in range(300):
+        sketch.add('hot')
+    sketch.add('warm')
+    assert sketch.estimate('hot') == 255
+    sketch.halve()
+    assert sketch.estimate('hot') == 127
+    assert sketch.estimate('warm') == 0
+
+
+def test_admits_keys_requested_again():
+    policy = FrequencyAdmission(width=1024, depth=4, window=1000, threshold=2)
+    assert not policy.admit('search?query=once')
+    assert policy.admit('search?query=once')
+    assert (policy.admitted, policy.rejected) == (1, 1)
+
+
+def test_forgets_keys_out_of_window():
+    """Counts are halved every window, so a key requested once per window never gets in"""
+    policy = FrequencyAdmission(width=1024, depth=4, window=4, threshold=2)
+    for i in range(20):
+        assert not policy.admit('rare') if i % 4 == 3 else not policy.admit(f'other{i}')
+
+
+def test_bypass_admits_anything():
+    policy = FrequencyAdmission(width=1024, depth=4, window=1000, threshold=2)
+    token = admission.bypass.set(True)
+    try:
+        assert policy.admit('warmed')
+    finally:
+        admission.bypass.reset(token)
+    assert not policy.admit('cold')
+
+
+async def test_service_caches_pages_requested_again(monkeypatch):
+    """Page fetched once is not cached, fetched again it is, and served from cache since"""
+    monkeypatch.setattr('services.base.settings.CACHE_ADMISSION_ENABLED', True)
+    films = Catalogue(films=60, persons=50, genres=5).films
+    service = DocumentService('films', Film, None, None, backend=FakeCacher('films'),
+                              searcher=FakeSearcher('films', films))
+    for _ in range(4):
+        await service.list_all(1, 10, None)
+    assert service.searcher.calls['search'] == 2
+    assert await service.cacher.backend.get_vector(repr(SearchCursor(1, 10, None)))
+
+
+@pytest.mark.parametrize('overrides', [{'CACHE_ADMISSION_ENABLED': True}])
+async def test_request_counted_once(service, client):
+    """Response is cached along with the page it is built of, the request counted for the page alone"""
+    for requested in range(1, 4):
+        response = await client.get('/api/v1/films/', params={'page[size]': 10})
+        assert response.status_code == 200
+        assert service.admission.seen == min(requested, 2)
+    assert service.searcher.calls['search'] == 2
+
+
+@pytest.mark.parametrize('overrides', [{'CACHE_ADMISSION_ENABLED': True, 'CACHE_LOCK_ENABLED': True}])
+async def test_cold_keys_not_locked(service):
+    """Key refused admission is fetched at once, without waiting for another worker to fill it"""
+    key = repr(SearchCursor(1, 10, None))
+    # another worker fetches the key, and will not store it either
+    assert await service.cacher.acquire(key, 10)
+
+    started = time.monotonic()
+    assert await service.list_all(1, 10, None)
+    assert time.monotonic() - started < service.filler.wait / 2
+    assert service.filler.timeouts == 0
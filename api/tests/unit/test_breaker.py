@@ -0,0 +1,144 @@
+import asyncio
+import uuid
+
+import pytest
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig
+from elasticsearch import BadRequestError, ConnectionError
+
+from core import breaker
+from core.breaker import CircuitBreaker
+from core.elastic import ElasticSearcher
+from interfaces.cache import CacheTTL
+from interfaces.search import SearchCursor, SearchOverloadedError, SearchUnavailableError
+
+
+def always(error: Exception) -> bool:
+    return True
+
+
+def run(policy: CircuitBreaker, error: Exception = None, failure=always) -> None:
+    """Make a request through the circuit, failing with error if given"""
+    with policy.guard(failure):
+        if error is not None:
+            raise error
+
+
+def test_opens_after_consecutive_failures():
+    policy = CircuitBreaker(failures=3, reset=60)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            run(policy, ConnectionError('refused'))
+    # a success in between starts counting anew
+    run(policy)
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            run(policy, ConnectionError('refused'))
+    assert policy.state == CircuitBreaker.OPEN
+
+    # open circuit fails fast, without making requests
+    with pytest.raises(SearchUnavailableError):
+        run(policy, AssertionError('request made'))
+
+
+async def test_half_open_lets_single_probe():
+    policy = CircuitBreaker(failures=1, reset=0.01)
+    with pytest.raises(ConnectionError):
+        run(policy, ConnectionError('refused'))
+    await asyncio.sleep(0.02)
+
+    with policy.guard(always):
+        assert policy.state == CircuitBreaker.HALF_OPEN
+        with pytest.raises(SearchUnavailableError):
+            run(policy)
+    assert policy.state == CircuitBreaker.CLOSED
+
+    # failed probe opens the circuit again
+    with pytest.raises(ConnectionError):
+        run(policy, ConnectionError('refused'))
+    await asyncio.sleep(0.02)
+    with pytest.raises(ConnectionError):
+        run(policy, ConnectionError('refused'))
+    assert policy.state == CircuitBreaker.OPEN
+    assert not policy.probing
+
+
+def test_rejected_and_shed_requests_not_failures():
+    policy = CircuitBreaker(failures=1, reset=60)
+    with pytest.raises(KeyError):
+        run(policy, KeyError('bad request'), failure=lambda error: not isinstance(error, KeyError))
+    with pytest.raises(SearchOverloadedError):
+        run(policy, SearchOverloadedError('Concurrency limit reached'))
+    assert policy.state == CircuitBreaker.CLOSED
+
+
+class BrokenElastic:
+    """Elasticsearch client failing search requests with the given error"""
+
+    def __init__(self, error: Exception) -> None:
+        self.error = error
+        self.calls = 0
+
+    async def search(self, **kwargs):
+        self.calls += 1
+        raise self.error
+
+
+async def test_elastic_outage_raised_bad_request_not():
+    """Elastic failing to answer is an outage, opening the circuit; rejected request is just nothing found"""
+    bad_request = BadRequestError(
+        'parsing_exception', ApiResponseMeta(400, '1.1', HttpHeaders(), 0.0, NodeConfig('http', 'localhost', 9200)), {})
+    assert await ElasticSearcher('films', BrokenElastic(bad_request)).list_index(SearchCursor(1, 10, None)) == []
+
+    breaker.elastic_breaker = CircuitBreaker(failures=2, reset=60)
+    try:
+        elastic = BrokenElastic(ConnectionError('refused'))
+        searcher = ElasticSearcher('films', elastic)
+        for _ in range(3):
+            with pytest.raises(SearchUnavailableError):
+                await searcher.list_index(SearchCursor(1, 10, None))
+        assert elastic.calls == 2
+        assert breaker.elastic_breaker.state == CircuitBreaker.OPEN
+    finally:
+        breaker.elastic_breaker = None
+
+
+@pytest.fixture
+def cache_ttl() -> CacheTTL:
+    """Everything cached expires at once, only kept for fallback"""
+    return CacheTTL(scalar=0, vector=0, revalidate=0)
+
+
+async def test_expired_page_served_while_down(service):
+    """Expired page is fetched anew while search is up, and served as it is while down"""
+    first = await service.list_all(1, 10, None)
+    service.cacher.store.clear()
+    assert await service.list_all(1, 10, None) == first
+    assert service.searcher.calls['search'] == 2
+
+    service.searcher.down = True
+    service.cacher.store.clear()
+    assert await service.list_all(1, 10, None) == first
+    assert service.fallbacks == 1
+
+    # nothing to fall back on
+    with pytest.raises(SearchUnavailableError):
+        await service.list_all(2, 10, None)
+
+
+async def test_expired_response_served_while_down(service, catalogue, client):
+    film_id = catalogue.films[0]['id']
+    fresh = await client.get(f'/api/v1/films/{film_id}/')
+    assert fresh.status_code == 200
+
+    service.searcher.down = True
+    service.cacher.store.clear()
+    stale = await client.get(f'/api/v1/films/{film_id}/')
+    assert stale.status_code == 200
+    assert stale.content == fresh.content
+    assert stale.headers['etag'] == fresh.headers['etag']
+    assert stale.headers['warning'].startswith('110')
+    assert stale.headers['cache-control'] == 'no-store'
+
+    missing = await client.get(f'/api/v1/films/{uuid.uuid4()}/')
+    assert missing.status_code == 503
+    assert missing.headers['retry-after'] == '1'
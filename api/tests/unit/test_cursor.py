@@ -0,0 +1,113 @@
+import base64
+
+import orjson
+import pytest
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig
+from elasticsearch import BadRequestError, NotFoundError
+
+from api.v1.responses import NEXT_PAGE_CURSOR
+from core.elastic import ElasticSearcher
+from interfaces.search import SearchCursor, SearchCursorError
+
+
+def rejected(message: str) -> BadRequestError:
+    meta = ApiResponseMeta(400, '1.1', HttpHeaders(), 0.0, NodeConfig('http', 'localhost', 9200))
+    return BadRequestError(message, meta, {})
+
+
+class PagingElastic:
+    """Elasticsearch client paging documents with search_after, in point-in-time snapshots or the live index"""
+
+    def __init__(self, documents: list[dict]) -> None:
+        self.documents = documents
+        self.pits: set[str] = set()
+        self.opened = 0
+
+    async def open_point_in_time(self, index: str, keep_alive: str) -> dict:
+        self.opened += 1
+        self.pits.add(f'pit{self.opened}')
+        return {'id': f'pit{self.opened}'}
+
+    async def close_point_in_time(self, id: str) -> None:
+        self.pits.discard(id)
+
+    @staticmethod
+    def key(values: list, sort: list[dict]) -> tuple:
+        return tuple(-value if 'desc' in str(field) else value for value, field in zip(values, sort))
+
+    async def search(self, sort: list[dict], size: int, search_after: list = None, pit: dict = None, **kwargs) -> dict:
+        if pit is not None and pit['id'] not in self.pits:
+            raise NotFoundError('search_context_missing_exception', None, {})
+        hits = sorted(({'_source': doc, 'sort': [doc[next(iter(field))] for field in sort]} for doc in self.documents),
+                      key=lambda hit: self.key(hit['sort'], sort))
+        if search_after is not None:
+            fits = len(search_after) == len(sort) and all(isinstance(value, str) == isinstance(sample, str)
+                                                          for value, sample in zip(search_after, hits[0]['sort']))
+            if not fits:
+                raise rejected('search_after does not fit the sort')
+            hits = [hit for hit in hits if self.key(hit['sort'], sort) > self.key(search_after, sort)]
+        return {**({'pit_id': pit['id']} if pit else {}), 'hits': {'hits': hits[:size]}}
+
+
+def token(**state) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps(state)).decode()
+
+
+@pytest.fixture
+def searcher() -> ElasticSearcher:
+    return ElasticSearcher('films', PagingElastic([{'id': f'film{i}', 'imdb_rating': i % 7} for i in range(20)]))
+
+
+async def test_walks_whole_index(searcher):
+    docs, cursor = [], None
+    while True:
+        page = await searcher.page_index(SearchCursor(1, 6, '-imdb_rating', cursor))
+        docs.extend(page.documents)
+        if (cursor := page.token) is None:
+            break
+    assert [doc['imdb_rating'] for doc in docs] == sorted((i % 7 for i in range(20)), reverse=True)
+    assert len({doc['id'] for doc in docs}) == 20
+    assert not searcher.elastic.pits
+
+
+async def test_walk_goes_on_once_snapshot_expired(searcher):
+    """Walk paused for longer than the point-in-time keep-alive goes on through the live index, in the same order"""
+    first = await searcher.page_index(SearchCursor(1, 6, '-imdb_rating'))
+    searcher.elastic.pits.clear()
+
+    docs, cursor = first.documents, first.token
+    while cursor is not None:
+        page = await searcher.page_index(SearchCursor(1, 6, '-imdb_rating', cursor))
+        docs.extend(page.documents)
+        cursor = page.token
+        assert cursor is None or orjson.loads(base64.urlsafe_b64decode(cursor))['pit'] is None
+    assert [doc['imdb_rating'] for doc in docs] == sorted((i % 7 for i in range(20)), reverse=True)
+    assert len({doc['id'] for doc in docs}) == 20
+    assert searcher.elastic.opened == 1
+
+
+async def test_token_only_continues_its_sort(searcher):
+    page = await searcher.page_index(SearchCursor(1, 6, 'imdb_rating'))
+    with pytest.raises(SearchCursorError):
+        await searcher.page_index(SearchCursor(1, 6, '-imdb_rating', page.token))
+    with pytest.raises(SearchCursorError):
+        await searcher.page_index(SearchCursor(1, 6, None, page.token))
+
+
+@pytest.mark.parametrize('after', [[3], ['3', 'film3'], [3, 'film3', 5]])
+async def test_tampered_sort_values_rejected(searcher, after):
+    """Sort values elastic rejects as not fitting the sort are a bad cursor, not a page that is not found"""
+    page = await searcher.page_index(SearchCursor(1, 6, 'imdb_rating'))
+    pit = orjson.loads(base64.urlsafe_b64decode(page.token))['pit']
+    with pytest.raises(SearchCursorError):
+        await searcher.page_index(SearchCursor(1, 6, 'imdb_rating', token(pit=pit, after=after, sort='imdb_rating')))
+
+
+async def test_bad_cursor_answered_400(service, catalogue, client):
+    service.searcher = ElasticSearcher('films', PagingElastic(catalogue.films))
+    response = await client.get('/api/v1/films/', params={'page[cursor]': '', 'page[size]': 10, 'sort': 'imdb_rating'})
+    assert response.status_code == 200
+    cursor = response.headers[NEXT_PAGE_CURSOR]
+
+    response = await client.get('/api/v1/films/', params={'page[cursor]': cursor, 'page[size]': 10})
+    assert response.status_code == 400
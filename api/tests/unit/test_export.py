@@ -0,0 +1,33 @@
+import orjson
+
+
+async def export(client, index: str, **params) -> tuple[list[dict], list]:
+    """Documents and cursors of an export stream"""
+    response = await client.get(f'/api/v1/{index}/export', params=params)
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    lines = [orjson.loads(line) for line in response.content.splitlines()]
+    return [line for line in lines if 'cursor' not in line], [line['cursor'] for line in lines if 'cursor' in line]
+
+
+async def test_exports_whole_index(services, catalogue, client):
+    """Every film is streamed once, page by page, the last cursor null; nothing is cached"""
+    films, cursors = await export(client, 'films', **{'page[size]': 60})
+
+    assert [film['uuid'] for film in films] == [film['id'] for film in catalogue.films]
+    assert set(films[0]) >= {'uuid', 'title', 'genre', 'actors'}
+    assert len(cursors) == 4 and cursors[-1] is None and all(cursors[:-1])
+    assert services['films'].searcher.calls['page'] == 4
+    assert not services['films'].cacher.backend.store
+
+
+async def test_resumes_after_cursor(services, catalogue, client):
+    """Export continues right after the page of a cursor"""
+    persons, cursors = await export(client, 'persons', **{'page[size]': 50})
+    rest, _ = await export(client, 'persons', **{'page[size]': 50, 'page[cursor]': cursors[0]})
+    assert rest == persons[50:]
+
+
+async def test_malformed_cursor(services, client):
+    response = await client.get('/api/v1/films/export', params={'page[cursor]': 'not a cursor'})
+    assert response.status_code == 400
@@ -0,0 +1,60 @@
+import time
+from collections import Counter
+
+import pytest
+
+from core.config import settings
+from core.elastic import ElasticSearcher
+from interfaces.search import FacetRequest
+
+
+async def test_counts_films_by_facets(service, catalogue, client):
+    """Films are counted by genre, type and rating in one aggregation request"""
+    response = await client.get('/api/v1/films/facets')
+    assert response.status_code == 200
+    facets = response.json()
+
+    assert facets['total'] == len(catalogue.films)
+    genres = Counter(genre['name'] for film in catalogue.films for genre in film['genre'])
+    assert {bucket['key']: bucket['count'] for bucket in facets['genre']} == genres
+    assert facets['type'] == [{'key': 'movie', 'count': len(catalogue.films)}]
+    assert sum(bucket['count'] for bucket in facets['imdb_rating']) == len(catalogue.films)
+    assert service.searcher.calls['aggregate'] == 1
+
+
+async def test_filters_facets(service, catalogue, client):
+    """Filters narrow counts of every facet down to matching films"""
+    genre = catalogue.films[0]['genre'][0]['name']
+    response = await client.get('/api/v1/films/facets', params={'filter[genre]': genre})
+    facets = response.json()
+
+    matching = [film for film in catalogue.films if genre in {item['name'] for item in film['genre']}]
+    assert facets['total'] == len(matching)
+    assert {'key': genre, 'count': len(matching)} in facets['genre']
+
+
+async def test_facets_cached_for_own_ttl(service):
+    """Facets are counted once, and kept in cache for facets TTL rather than documents one"""
+    request = FacetRequest(settings.FILM_FACET_TERMS, settings.FILM_FACET_HISTOGRAMS)
+    first = await service.facets(request)
+    assert await service.facets(request) == first
+    assert service.searcher.calls['aggregate'] == 1
+
+    backend = service.cacher.backend
+    _, expires = backend.store[backend.entry(repr(request))]
+    assert expires - time.monotonic() == pytest.approx(service.ttl.facets, abs=1)
+
+    # new generation of the index is counted anew
+    await service.invalidate()
+    await service.facets(request)
+    assert service.searcher.calls['aggregate'] == 2
+
+
+def test_facet_aggregations():
+    """Keyword fields of nested documents are aggregated inside nested aggregation"""
+    request = FacetRequest(['genre.name', 'type'], {'imdb_rating': 0.5}, size=10)
+    assert ElasticSearcher.get_facet_aggregations(request) == {
+        'genre': {'nested': {'path': 'genre'}, 'aggs': {'values': {'terms': {'field': 'genre.name', 'size': 10}}}},
+        'type': {'terms': {'field': 'type', 'size': 10}},
+        'imdb_rating': {'histogram': {'field': 'imdb_rating', 'interval': 0.5, 'min_doc_count': 1}},
+    }
@@ -0,0 +1,85 @@
+import asyncio
+
+from prometheus_client import REGISTRY
+
+from fakes import FakeCacher
+
+from core.flight import FillLock, SingleFlight
+
+
+def collapsed(index: str, scope: str) -> float:
+    return REGISTRY.get_sample_value('api_cache_fills_collapsed_total', {'index': index, 'scope': scope}) or 0
+
+
+async def test_single_flight_collapses_concurrent_calls():
+    flight = SingleFlight('flight')
+    before = collapsed('flight', 'process')
+    calls = 0
+
+    async def fetch() -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    assert await asyncio.gather(*(flight.do('key', fetch) for _ in range(5))) == [1] * 5
+    assert (flight.executed, flight.collapsed) == (1, 4)
+    assert collapsed('flight', 'process') - before == 4
+    assert not flight.calls
+
+    # call finished is not joined, but run again
+    assert await flight.do('key', fetch) == 2
+
+
+async def test_single_flight_survives_cancelled_caller():
+    flight = SingleFlight('flight')
+
+    async def fetch() -> str:
+        await asyncio.sleep(0.01)
+        return 'value'
+
+    first = asyncio.create_task(flight.do('key', fetch))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(flight.do('key', fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == 'value'
+
+
+async def test_fill_lock_waiter_served_value_filled_by_owner():
+    cacher = FakeCacher('lock')
+    owner, waiter = (FillLock('lock', cacher, ttl=1.0, wait=1.0, poll=0.01) for _ in range(2))
+    before = collapsed('lock', 'cluster')
+    computed = []
+
+    async def compute(by: str) -> dict:
+        computed.append(by)
+        await asyncio.sleep(0.03)
+        await cacher.put_scalar('key', {'by': by})
+        return {'by': by}
+
+    filled = await asyncio.gather(
+        owner.fill('key', lambda: cacher.get_scalar('key'), lambda: compute('owner')),
+        waiter.fill('key', lambda: cacher.get_scalar('key'), lambda: compute('waiter')))
+    assert filled == [{'by': 'owner'}] * 2
+    assert computed == ['owner']
+    assert (waiter.collapsed, waiter.timeouts) == (1, 0)
+    assert collapsed('lock', 'cluster') - before == 1
+
+    # lock released by owner
+    assert await cacher.acquire('key', 1.0)
+
+
+async def test_fill_lock_waiter_computes_on_timeout():
+    cacher = FakeCacher('lock')
+    lock = FillLock('lock', cacher, ttl=1.0, wait=0.05, poll=0.01)
+    before = REGISTRY.get_sample_value('api_cache_fill_timeouts_total', {'index': 'lock'}) or 0
+    # owner never fills the key
+    assert await cacher.acquire('key', 1.0)
+
+    async def compute() -> dict:
+        return {'by': 'waiter'}
+
+    assert await lock.fill('key', lambda: cacher.get_scalar('key'), compute) == {'by': 'waiter'}
+    assert (lock.collapsed, lock.timeouts) == (0, 1)
+    assert REGISTRY.get_sample_value('api_cache_fill_timeouts_total', {'index': 'lock'}) - before == 1
@@ -0,0 +1,138 @@
+import asyncio
+import uuid
+
+import pytest
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig
+from elasticsearch import BadRequestError, NotFoundError
+from prometheus_client import REGISTRY
+
+from core import limiter
+from core.elastic import ElasticSearcher
+from core.limiter import AdaptiveLimiter
+from interfaces.search import SearchCursor, SearchOverloadedError
+
+
+async def hold(policy: AdaptiveLimiter, seconds: float) -> None:
+    async with policy.slot():
+        await asyncio.sleep(seconds)
+
+
+async def test_limit_grows_while_fast_and_used():
+    policy = AdaptiveLimiter(initial=4, max_limit=5, latency=1.0)
+    for _ in range(10):
+        await asyncio.gather(*(hold(policy, 0) for _ in range(4)))
+    assert policy.limit == 5
+
+    # an idle limit does not grow
+    idle = AdaptiveLimiter(initial=4, latency=1.0)
+    for _ in range(20):
+        await hold(idle, 0)
+    assert idle.limit == 4
+
+
+async def test_limit_backs_off_once_per_latency():
+    policy = AdaptiveLimiter(initial=10, min_limit=2, latency=0.01, backoff=0.5)
+    await asyncio.gather(*(hold(policy, 0.02) for _ in range(5)))
+    assert policy.limit == 5
+
+    for _ in range(5):
+        await hold(policy, 0.02)
+    assert policy.limit == 2
+
+
+async def test_failures_back_off_but_benign_do_not():
+    policy = AdaptiveLimiter(initial=10, latency=1.0, backoff=0.5, benign=(KeyError,))
+    with pytest.raises(KeyError):
+        async with policy.slot():
+            raise KeyError('missing document')
+    assert policy.limit == 10
+    with pytest.raises(ConnectionError):
+        async with policy.slot():
+            raise ConnectionError()
+    assert policy.limit == 5
+    assert policy.in_flight == 0
+
+
+async def test_queued_then_shed():
+    """Requests over the limit wait for a freed slot, and are shed when none is freed in time"""
+    policy = AdaptiveLimiter(initial=1, max_limit=1, latency=1.0, queue_wait=0.05)
+    first = asyncio.create_task(hold(policy, 0.01))
+    await asyncio.sleep(0)
+    await hold(policy, 0)
+    await first
+
+    slow = asyncio.create_task(hold(policy, 0.2))
+    await asyncio.sleep(0)
+    with pytest.raises(SearchOverloadedError):
+        await hold(policy, 0)
+    await slow
+    assert (policy.shed, policy.in_flight, len(policy.waiters)) == (1, 0, 0)
+
+
+async def test_background_requests_not_queued():
+    policy = AdaptiveLimiter(initial=1, latency=1.0, queue_wait=1.0)
+    slow = asyncio.create_task(hold(policy, 0.05))
+    await asyncio.sleep(0)
+
+    async def refresh():
+        limiter.background.set(True)
+        await hold(policy, 0)
+
+    with pytest.raises(SearchOverloadedError):
+        await asyncio.create_task(refresh())
+    await slow
+
+
+class SlowElastic:
+    """Elasticsearch client answering get requests after a delay"""
+
+    async def get(self, index, id, **kwargs):
+        await asyncio.sleep(0.05)
+        raise NotFoundError(404, 'not found', {})
+
+
+async def test_elastic_requests_limited():
+    """Requests of all searchers of the worker share its limit, missing documents are not failures"""
+    limiter.elastic_limiter = AdaptiveLimiter(initial=1, max_limit=1, latency=1.0, queue_wait=0.01,
+                                              benign=(NotFoundError,))
+    try:
+        films, persons = ElasticSearcher('films', SlowElastic()), ElasticSearcher('persons', SlowElastic())
+        found = await asyncio.gather(films.get_document('f1'), persons.get_document('p1'), return_exceptions=True)
+        assert found[0] is None
+        assert isinstance(found[1], SearchOverloadedError)
+        assert limiter.elastic_limiter.limit == 1
+    finally:
+        limiter.elastic_limiter = None
+
+
+class RejectingElastic:
+    """Elasticsearch client rejecting search requests as bad ones (e.g. sorted by an unknown field)"""
+
+    async def search(self, **kwargs):
+        raise BadRequestError('search_phase_execution_exception', ApiResponseMeta(
+            400, '1.1', HttpHeaders(), 0.0, NodeConfig('http', 'localhost', 9200)), {})
+
+
+async def test_rejected_requests_not_failures():
+    """Bad requests neither back the limit off nor count as elastic errors, as they do not for the breaker"""
+    limiter.elastic_limiter = AdaptiveLimiter(initial=10, latency=1.0, backoff=0.5, benign=ElasticSearcher.REJECTED)
+    labels = {'index': 'films', 'operation': 'search'}
+    errors = REGISTRY.get_sample_value('api_elastic_errors_total', labels) or 0
+    try:
+        searcher = ElasticSearcher('films', RejectingElastic())
+        for _ in range(5):
+            assert await searcher.list_index(SearchCursor(1, 10, 'unknown')) == []
+        assert limiter.elastic_limiter.limit == 10
+        assert (REGISTRY.get_sample_value('api_elastic_errors_total', labels) or 0) == errors
+    finally:
+        limiter.elastic_limiter = None
+
+
+async def test_shed_request_answered_503(service, client):
+    async def overloaded(uuid):
+        raise SearchOverloadedError('Concurrency limit reached')
+
+    service.searcher.get_document = overloaded
+    response = await client.get(f'/api/v1/films/{uuid.uuid4()}/')
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '1'
@@ -0,0 +1,53 @@
+import logging
+
+from core.logger import LazyQueueHandler, RateLimitFilter, enqueue
+
+
+def record(name: str, level: int = logging.INFO, lineno: int = 1) -> logging.LogRecord:
+    return logging.LogRecord(name, level, __file__, lineno, 'found %s', ('document',), None)
+
+
+def test_rate_limit_bursts_then_drops(monkeypatch):
+    """Records of a call site pass up to burst at once, then at rate per second"""
+    now = [100.0]
+    monkeypatch.setattr('core.logger.time.monotonic', lambda: now[0])
+    fltr = RateLimitFilter(('DocumentService',), rate=2.0, burst=3)
+
+    assert [fltr.filter(record('DocumentService: films')) for _ in range(5)] == [True] * 3 + [False] * 2
+    now[0] += 0.5
+    assert [fltr.filter(record('DocumentService: films')) for _ in range(2)] == [True, False]
+    assert fltr.dropped == 3
+
+
+def test_rate_limit_per_call_site():
+    """Other call sites, other loggers and warnings are not limited by a busy call site"""
+    fltr = RateLimitFilter(('DocumentService',), rate=0.0, burst=1)
+    assert fltr.filter(record('DocumentService: films'))
+    assert not fltr.filter(record('DocumentService: films'))
+    assert fltr.filter(record('DocumentService: films', lineno=2))
+    assert fltr.filter(record('DocumentService: films', level=logging.WARNING))
+    assert fltr.filter(record('uvicorn.error'))
+
+
+def test_enqueue_formats_in_listener():
+    """Handlers of logger get records through queue, formatted only by the listener thread"""
+    logger = logging.getLogger('test_enqueue')
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    written = []
+
+    class Collect(logging.Handler):
+        def emit(self, rec: logging.LogRecord) -> None:
+            written.append(self.format(rec))
+
+    logger.handlers = [Collect()]
+    listeners = enqueue(('test_enqueue',), (RateLimitFilter(('test_enqueue',), rate=0.0, burst=1),))
+    assert isinstance(logger.handlers[0], LazyQueueHandler)
+    assert enqueue(('test_enqueue',)) == []
+
+    for _ in range(3):
+        logger.info('found %s', 'document')
+    logger.warning('slow %s', 'search')
+    for listener in listeners:
+        listener.stop()
+    assert written == ['found document', 'slow search']
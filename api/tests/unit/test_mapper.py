@@ -0,0 +1,77 @@
+import orjson
+import pytest
+
+from catalogue import Catalogue
+from fakes import FakeSearcher
+
+from api.v1.schemes.film import Film, FilmBase, FilmSuggestion
+from api.v1.schemes.genre import Genre
+from api.v1.schemes.person import Person, PersonBase
+from core.converter import (FilmBaseConverter, FilmConverter, FilmSuggestionConverter, GenreConverter,
+                            PersonBaseConverter, PersonConverter)
+from core.mapper import (FilmBaseMapper, FilmMapper, FilmSuggestionMapper, GenreMapper, PersonBaseMapper, PersonMapper,
+                         map_many)
+from models.base import dumps
+from models.film import Film as FilmModel
+from models.film import FilmBase as FilmBaseModel
+from models.film import FilmSuggestion as FilmSuggestionModel
+from models.genre import Genre as GenreModel
+from models.person import Person as PersonModel
+from models.person import PersonBase as PersonBaseModel
+
+# mapper, reference converter, model the converter takes, response scheme, index of documents
+CASES = {
+    'film base': (FilmBaseMapper, FilmBaseConverter, FilmBaseModel, FilmBase, 'films'),
+    'film suggestion': (FilmSuggestionMapper, FilmSuggestionConverter, FilmSuggestionModel, FilmSuggestion, 'films'),
+    'film': (FilmMapper, FilmConverter, FilmModel, Film, 'films'),
+    'genre': (GenreMapper, GenreConverter, GenreModel, Genre, 'genres'),
+    'person base': (PersonBaseMapper, PersonBaseConverter, PersonBaseModel, PersonBase, 'persons'),
+    'person': (PersonMapper, PersonConverter, PersonModel, Person, 'persons'),
+}
+
+
+@pytest.fixture(scope='module')
+def indices() -> dict[str, list[dict]]:
+    """Documents as they are decoded from elastic response"""
+    catalogue = Catalogue(films=50, persons=200, genres=10)
+    return {index: [FakeSearcher.project(doc, None) for doc in docs] for index, docs in catalogue.indices().items()}
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_mapping_matches_converter(case, indices):
+    """Mapped document serializes exactly as the converted model does"""
+    mapper, converter, model, _, index = CASES[case]
+    for doc in indices[index]:
+        assert orjson.loads(dumps(mapper.map(doc))) == orjson.loads(converter.convert(model(**doc)).json())
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_mapping_conforms_to_scheme(case, indices):
+    """Mapped document is a valid response scheme, with no fields beyond it"""
+    mapper, _, _, scheme, index = CASES[case]
+    for body in map_many(mapper, indices[index]):
+        assert scheme(**body).dict().keys() == body.keys()
+
+
+def test_projected_film_mapping(indices):
+    """List projection of a film, fetched with source filtering, maps as the full document does"""
+    fields = list(FilmBaseModel.__fields__)
+    for doc in indices['films']:
+        projected = {field: doc[field] for field in fields}
+        assert FilmBaseMapper.map(projected) == FilmBaseMapper.map(doc)
+
+
+@pytest.mark.parametrize('films', [None, []])
+def test_person_without_films(films, indices):
+    """Person documents may have no films field value at all"""
+    doc = dict(indices['persons'][0], films=films)
+    body = PersonMapper.map(doc)
+    assert body['films'] == []
+    assert orjson.loads(dumps(body)) == orjson.loads(PersonConverter.convert(PersonModel(**doc)).json())
+
+
+def test_integer_rating_is_float(indices):
+    """Ratings indexed as integers are returned as floats, as the scheme declares them"""
+    doc = dict(indices['films'][0], imdb_rating=7)
+    assert FilmMapper.map(doc)['imdb_rating'] == 7.0
+    assert isinstance(FilmBaseMapper.map(doc)['imdb_rating'], float)
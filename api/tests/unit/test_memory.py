@@ -0,0 +1,95 @@
+import pytest
+
+from fakes import FakeRedis, FakeSearcher
+
+from core.config import settings
+from core.memory import LFUStore, LocalStore
+from models.film import Film
+from services.base import DocumentService
+
+
+@pytest.fixture
+def clock(monkeypatch) -> list[float]:
+    """Monotonic time seen by local stores, moved on by tests"""
+    now = [100.0]
+    monkeypatch.setattr('core.memory.time.monotonic', lambda: now[0])
+    return now
+
+
+def test_lru_evicts_least_recently_used():
+    store = LocalStore(size=3, ttl=60)
+    for key in 'abc':
+        store.put(key, key)
+    store.get('a')
+    store.put('d', 'd')
+    assert list(store.entries) == ['c', 'a', 'd']
+
+    # written again is used again
+    store.put('c', 'c')
+    store.put('e', 'e')
+    assert list(store.entries) == ['d', 'c', 'e']
+
+
+def test_lfu_evicts_least_frequently_used():
+    """The least frequently used key is evicted, the oldest one among equally used"""
+    store = LFUStore(size=3, ttl=60)
+    for key in 'abc':
+        store.put(key, key)
+    store.get('a')
+    store.get('a')
+    store.get('c')
+    store.put('d', 'd')
+    assert set(store.entries) == {'a', 'c', 'd'}
+
+    store.put('e', 'e')
+    assert set(store.entries) == {'a', 'c', 'e'}
+    store.get('e')
+    store.put('f', 'f')
+    assert set(store.entries) == {'a', 'e', 'f'}
+    assert store.counts == {'a': 3, 'e': 2, 'f': 1}
+
+
+@pytest.mark.parametrize('policy', [LocalStore, LFUStore])
+def test_bounded_by_size(policy):
+    store = policy(size=10, ttl=60)
+    for i in range(100):
+        store.put(f'key{i}', i)
+        store.get(f'key{i // 2}')
+    assert len(store) == 10
+    assert store.get('key99') == 99
+
+
+@pytest.mark.parametrize('policy', [LocalStore, LFUStore])
+def test_expires_after_ttl(policy, clock):
+    store = policy(size=10, ttl=5)
+    store.put('key', 'value')
+    clock[0] += 5
+    assert store.get('key') == 'value'
+    clock[0] += 0.1
+    assert store.get('key') is None
+    assert len(store) == 0
+
+    # expired key dropped from frequency counts too, so it is counted anew
+    store.put('key', 'value')
+    assert store.get('key') == 'value'
+    if policy is LFUStore:
+        assert store.counts == {'key': 2}
+
+
+async def test_local_keys_follow_index_generation(catalogue, monkeypatch):
+    """Keys of an index invalidated by another worker are not served from memory once the generation is known"""
+    monkeypatch.setattr(settings, 'CACHE_GENERATION_TTL', 0)
+    redis = FakeRedis()
+    invalidating, serving = (
+        DocumentService('films', Film, redis, None, searcher=FakeSearcher('films', catalogue.films)) for _ in range(2))
+    entry = await serving.put_response('response', await serving.list_all(1, 10, None))
+    assert await serving.get_response('response') == entry
+    assert await serving.get_single(catalogue.films[0]['id'])
+
+    await invalidating.invalidate()
+    assert await serving.get_response('response') is None
+    assert await serving.get_etag('response') is None
+    await serving.list_all(1, 10, None)
+    await serving.get_single(catalogue.films[0]['id'])
+    assert serving.searcher.calls['search'] == 2
+    assert serving.searcher.calls['get'] == 2
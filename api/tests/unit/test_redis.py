@@ -0,0 +1,118 @@
+import time
+
+import pytest
+
+from fakes import FakeRedis
+
+from core.redis import RedisCacher
+from interfaces.cache import CacheTTL
+
+TTL = CacheTTL(scalar=300, vector=60, revalidate=30, missing=10, facets=600, fallback=3600)
+
+
+@pytest.fixture
+def redis() -> FakeRedis:
+    return FakeRedis()
+
+
+@pytest.fixture
+def cacher(redis) -> RedisCacher:
+    return RedisCacher('films', redis, TTL, generation_ttl=60)
+
+
+async def test_keys_prefixed_by_index_generation(redis, cacher):
+    await cacher.put_scalar('doc', {'id': 'doc'})
+    await cacher.put_scalar('facets', {'total': 1}, TTL.facets)
+    assert await redis.get('films__0__doc') == b'{"id":"doc"}'
+    assert await redis.ttl('films__0__doc') == TTL.scalar
+    assert await redis.ttl('films__0__facets') == TTL.facets
+
+    assert await cacher.drop_index() == 1
+    assert await redis.get('films__generation') == b'1'
+    assert await cacher.get_scalar('doc') is None
+    await cacher.put_scalar('doc', {'id': 'doc'})
+    assert await redis.get('films__1__doc') == b'{"id":"doc"}'
+
+
+async def test_generation_trusted_for_generation_ttl(redis, cacher):
+    """Generation bumped by another worker is seen once the one known locally is no longer trusted"""
+    await cacher.put_scalar('doc', {'id': 'doc'})
+    await RedisCacher('films', redis, TTL).drop_index()
+    assert await cacher.get_scalar('doc') == {'id': 'doc'}
+    assert await RedisCacher('films', redis, TTL, generation_ttl=0).get_scalar('doc') is None
+
+
+async def test_lock_held_by_one_worker(redis, cacher):
+    other = RedisCacher('films', redis, TTL)
+    assert await cacher.acquire('key', 5)
+    assert not await other.acquire('key', 5)
+    assert await redis.ttl('films__0__key__lock') == 5
+
+    # lock not held is not released
+    await other.release('key')
+    assert not await other.acquire('key', 5)
+    await cacher.release('key')
+    assert await other.acquire('key', 5)
+
+
+async def test_expired_lock_released_by_new_owner_only(redis, cacher):
+    """Lock expired while its owner was at work, then taken by another worker, is not released by the former"""
+    other = RedisCacher('films', redis, TTL)
+    assert await cacher.acquire('key', 5)
+    redis.advance(5)
+    assert await other.acquire('key', 5)
+    await cacher.release('key')
+    assert await redis.get('films__0__key__lock') == other.locks['key'].encode()
+
+
+async def test_page_fresh_then_revalidated(cacher):
+    before = time.time()
+    await cacher.put_vector('page', [{'id': 'doc'}])
+    page = await cacher.get_index('page')
+    assert page.values == [{'id': 'doc'}]
+    assert before + TTL.vector <= page.fresh_until <= time.time() + TTL.vector
+    assert page.expires == pytest.approx(page.fresh_until + TTL.revalidate)
+    assert not page.stale and not page.expired
+
+
+async def test_response_ttl_capped(redis, cacher):
+    """Response bytes are cached for the TTL given (that of the page they are built of), if any"""
+    await cacher.put_raw('response', b'[]', 5)
+    assert await redis.ttl('films__0__response__etag') == 5
+    assert await redis.ttl('films__0__response') == 5 + TTL.fallback
+
+
+async def test_missing_kept_for_missing_ttl(redis, cacher):
+    await cacher.put_missing(['gone'])
+    await cacher.put_vector('empty', [])
+    assert await redis.get('films__0__gone') == RedisCacher.MISSING
+    assert await cacher.get_scalar('gone') == {}
+    empty = await cacher.get_index('empty')
+    assert empty.values == [] and empty.fresh_until is None
+    assert await redis.ttl('films__0__gone') == await redis.ttl('films__0__empty') == TTL.missing
+
+
+async def test_response_cached_with_etag(redis, cacher):
+    """Entity tag is stored next to the bytes, read without them, and bytes without one are not served"""
+    entry = await cacher.put_raw('response', b'[{"id":"doc"}]')
+    assert entry.etag == RedisCacher.content_tag(b'[{"id":"doc"}]')
+    assert await redis.get('films__0__response__etag') == entry.etag.encode()
+    assert await redis.ttl('films__0__response__etag') == TTL.vector
+    assert await cacher.get_raw('response') == entry
+    assert await cacher.get_etag('response') == entry.etag
+
+    await redis.delete('films__0__response__etag')
+    assert await cacher.get_raw('response') is None
+    assert await cacher.get_etag('response') is None
+
+
+async def test_expired_values_kept_for_fallback(redis, cacher):
+    await cacher.put_vector('page', [{'id': 'doc'}])
+    entry = await cacher.put_raw('response', b'[]')
+    assert await redis.ttl('films__0__page') == TTL.vector + TTL.revalidate + TTL.fallback
+    assert await redis.ttl('films__0__response') == TTL.vector + TTL.fallback
+
+    redis.advance(TTL.vector + TTL.revalidate)
+    assert await cacher.get_index('page') is not None
+    assert await cacher.get_raw('response') is None
+    assert await cacher.get_fallback('response') == entry
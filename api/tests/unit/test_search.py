@@ -0,0 +1,47 @@
+from fakes import FakeSearcher
+
+
+async def search(client, **params) -> list[str]:
+    response = await client.get('/api/v1/films/search', params={'page[size]': 100, **params})
+    assert response.status_code == 200
+    return [film['uuid'] for film in response.json()]
+
+
+async def test_finds_films_by_actor(service, catalogue, client):
+    """Films are found by names of people starring in them, not only by title"""
+    actor = catalogue.films[0]['actors'][0]
+    found = await search(client, query=actor['full_name'].split()[-1])
+
+    starring = {film['id'] for film in catalogue.films
+                if any(person['id'] == actor['id'] for person in film['actors'])}
+    assert starring <= set(found)
+
+
+async def test_title_matches_first(service, catalogue, client):
+    """Films matching query by title outrank ones matching by description only"""
+    word = catalogue.films[0]['title'].split()[0].lower()
+    found = await search(client, query=word)
+
+    titled = {film['id'] for film in catalogue.films if word in FakeSearcher.tokens(film['title'])}
+    assert titled and set(found[:len(titled)]) == titled
+
+
+async def test_filters_by_genre(service, catalogue, client):
+    """Genre filter narrows search results down to films of the genre"""
+    genre = catalogue.films[0]['genre'][0]['name']
+    word = catalogue.films[0]['title'].split()[0]
+    everything = await search(client, query=word)
+    found = await search(client, query=word, **{'filter[genre]': genre})
+
+    genres = {film['id']: {item['name'] for item in film['genre']} for film in catalogue.films}
+    assert catalogue.films[0]['id'] in found
+    assert set(found) == {uuid for uuid in everything if genre in genres[uuid]}
+
+
+async def test_search_cached(service, catalogue, client):
+    """Same search with the same filter is served from cache"""
+    params = {'query': catalogue.films[0]['title'], 'filter[genre]': catalogue.films[0]['genre'][0]['name']}
+    first = await search(client, **params)
+    calls = service.searcher.calls['search']
+    assert await search(client, **params) == first
+    assert service.searcher.calls['search'] == calls
@@ -0,0 +1,149 @@
+import asyncio
+import time
+from uuid import uuid4
+
+import pytest
+
+from fakes import FakeRedis, FakeSearcher
+
+from interfaces.search import SearchCursor
+from models.film import Film, FilmBase
+from services.base import DocumentService
+
+
+@pytest.fixture
+def service(catalogue) -> DocumentService:
+    """Film service caching in redis (an in-memory client), so entries expire as the redis cacher sets them to"""
+    return DocumentService('films', Film, FakeRedis(), None, searcher=FakeSearcher('films', catalogue.films))
+
+
+async def test_invalidated_index_not_served_from_cache(service):
+    """Invalidation bumps index generation: keys written before are never read again"""
+    await service.put_response('response', await service.list_all(1, 10, None))
+    assert await service.invalidate() == 1
+    assert await service.get_response('response') is None
+    await service.list_all(1, 10, None)
+    assert service.searcher.calls['search'] == 2
+
+
+async def remaining(service, key: str) -> int:
+    """Seconds the key of the service lives for in redis"""
+    backend = service.cacher.backend
+    return await backend.redis.ttl(await backend.entry(key))
+
+
+async def cache_page(service, key: str, values: list[dict], fresh_for: float, expires_in: float) -> None:
+    """Cache page as if fetched a while ago: fresh (stale, if negative) and expiring in the given seconds"""
+    now = time.time()
+    await service.cacher.backend.put_scalar(
+        key, {'values': values, 'fresh_until': now + fresh_for, 'expires': now + expires_in})
+    service.cacher.store.clear()
+
+
+async def test_fresh_page_served_as_is(service):
+    key = repr(SearchCursor(1, 10, None))
+    await cache_page(service, key, [{'id': 'cached'}], fresh_for=1, expires_in=60)
+    assert await service.list_all(1, 10, None) == [{'id': 'cached'}]
+    assert not service.flight.calls
+    assert service.searcher.calls['search'] == 0
+
+
+async def test_stale_page_served_and_revalidated(service):
+    """Stale page is served at once and refreshed in background, once for concurrent requests"""
+    key = repr(SearchCursor(1, 10, None))
+    await cache_page(service, key, [{'id': 'cached'}], fresh_for=-1, expires_in=60)
+    for _ in range(3):
+        assert await service.list_all(1, 10, None) == [{'id': 'cached'}]
+        service.cacher.store.clear()
+    await asyncio.gather(*service.flight.calls.values())
+    assert service.searcher.calls['search'] == 1
+
+    refreshed = await service.cacher.get_index(key)
+    assert not refreshed.stale
+    assert await service.list_all(1, 10, None) == refreshed.values != [{'id': 'cached'}]
+
+
+async def test_expired_page_fetched_anew(service):
+    key = repr(SearchCursor(1, 10, None))
+    await cache_page(service, key, [{'id': 'cached'}], fresh_for=-2, expires_in=-1)
+    page = await service.list_all(1, 10, None)
+    assert page != [{'id': 'cached'}]
+    assert service.searcher.calls['search'] == 1
+    assert not service.flight.calls
+
+
+async def test_response_of_stale_page_not_cached(service):
+    """Response built of a stale page is not cached, so the one of the refreshed page is cached instead"""
+    page = await service.list_all(1, 10, None)
+    await cache_page(service, repr(SearchCursor(1, 10, None)), page, fresh_for=-1, expires_in=60)
+
+    page = await service.list_all(1, 10, None)
+    entry = await service.put_response('response', page)
+    assert entry.etag
+    assert await service.get_etag('response') is None
+
+    await asyncio.gather(*service.flight.calls.values())
+    service.cacher.store.clear()
+    await service.put_response('response', await service.list_all(1, 10, None))
+    assert await service.get_etag('response') == entry.etag
+
+    # cached no longer than the page it is built of stays fresh
+    ttl = await remaining(service, 'response__etag')
+    assert service.ttl.vector - 1 <= ttl <= service.ttl.vector
+    assert await remaining(service, 'response') == ttl + service.ttl.fallback
+
+
+async def test_missing_document_remembered_for_missing_ttl(service):
+    """Document known not to exist is not looked for again until missing TTL passes"""
+    uuid = str(uuid4())
+    for _ in range(3):
+        assert await service.get_single(uuid) is None
+        service.cacher.store.clear()
+    assert service.searcher.calls['get'] == 1
+    assert service.missing_hits == 2
+    assert await remaining(service, uuid) == service.ttl.missing
+
+    service.cacher.backend.redis.advance(service.ttl.missing)
+    assert await service.get_single(uuid) is None
+    assert service.searcher.calls['get'] == 2
+
+
+async def test_empty_page_remembered_for_missing_ttl(service):
+    key = repr(SearchCursor(100, 10, None))
+    for _ in range(2):
+        assert await service.list_all(100, 10, None) == []
+        service.cacher.store.clear()
+    assert service.searcher.calls['search'] == 1
+    assert await remaining(service, key) == service.ttl.missing
+
+    service.cacher.backend.redis.advance(service.ttl.missing)
+    assert await service.list_all(100, 10, None) == []
+    assert service.searcher.calls['search'] == 2
+
+
+async def test_projected_page_cached_apart(service):
+    """Page of a projection holds only its fields, and is cached apart from the page of whole documents"""
+    whole = await service.list_all(1, 10, None)
+    projected = await service.list_all(1, 10, None, FilmBase)
+    assert [set(doc) for doc in projected] == [set(FilmBase.__fields__)] * 10
+    assert [doc['id'] for doc in projected] == [doc['id'] for doc in whole]
+
+    key = repr(SearchCursor(1, 10, None))
+    assert service.projected(key, FilmBase) == f'{key}_fields=id,title,imdb_rating'
+    assert await service.cacher.get_vector(service.projected(key, FilmBase)) == projected
+    assert await service.cacher.get_vector(key) == whole
+    assert service.searcher.calls['search'] == 2
+
+
+async def test_response_cached_with_etag(service):
+    """Response bytes are served from cache along with their entity tag, for the vector TTL"""
+    entry = await service.put_response('response', await service.list_all(1, 10, None))
+    service.cacher.store.clear()
+    assert await service.get_response('response') == entry
+    assert await service.get_etag('response') == entry.etag
+    assert await remaining(service, 'response__etag') == service.ttl.vector
+
+    service.cacher.backend.redis.advance(service.ttl.vector)
+    service.cacher.store.clear()
+    assert await service.get_response('response') is None
+    assert await service.get_etag('response') is None
@@ -0,0 +1,52 @@
+import uuid
+
+from core.config import settings
+from core.elastic import ElasticSearcher
+from interfaces.search import SimilarRequest
+
+
+async def test_similar_films(service, catalogue, client):
+    """Similar films are projections of other films, the most similar first"""
+    film = catalogue.films[0]
+    response = await client.get(f"/api/v1/films/{film['id']}/similar", params={'size': 20})
+    assert response.status_code == 200
+    similar = response.json()
+
+    assert len(similar) == 20
+    assert all(set(item) == {'uuid', 'title', 'imdb_rating'} for item in similar)
+    assert film['id'] not in {item['uuid'] for item in similar}
+
+    request = SimilarRequest(film['id'], settings.FILM_SIMILAR_FIELDS, {
+        path: service.values(film, path) for path in settings.FILM_SIMILAR_FIELDS if '.' in path})
+    likeness = [service.searcher.likeness(service.searcher.by_id[item['uuid']], request) for item in similar]
+    assert likeness == sorted(likeness, reverse=True)
+
+
+async def test_similar_cached_per_film(service, catalogue, client):
+    """Similar films are searched once per film, then served from cache"""
+    film_id = catalogue.films[0]['id']
+    first = await service.similar(film_id, settings.FILM_SIMILAR_FIELDS, 10)
+    assert await service.similar(film_id, settings.FILM_SIMILAR_FIELDS, 10) == first
+    assert service.searcher.calls['search'] == 1
+
+    await service.similar(catalogue.films[1]['id'], settings.FILM_SIMILAR_FIELDS, 10)
+    assert service.searcher.calls['search'] == 2
+
+
+async def test_similar_of_missing_film(service, client):
+    response = await client.get(f'/api/v1/films/{uuid.uuid4()}/similar')
+    assert response.status_code == 404
+    assert service.searcher.calls['search'] == 0
+
+
+def test_similar_query():
+    """Own fields are liked by document identifier, nested ones by their values, the document itself excluded"""
+    request = SimilarRequest('f1', ['title', 'genre.name'], {'genre.name': ['drama']})
+    query = ElasticSearcher('films', None).get_query(request)['bool']
+
+    own, nested = query['should']
+    assert own['more_like_this']['fields'] == ['title']
+    assert own['more_like_this']['like'] == [{'_index': 'films', '_id': 'f1'}]
+    assert nested['nested']['path'] == 'genre'
+    assert nested['nested']['query']['more_like_this']['like'] == ['drama']
+    assert query['must_not'] == [{'ids': {'values': ['f1']}}]
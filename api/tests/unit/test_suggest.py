@@ -0,0 +1,62 @@
+import pytest
+
+from core.elastic import ElasticSearcher
+from interfaces.search import SuggestRequest
+
+
+async def test_suggests_films_by_any_word(services, catalogue, client):
+    """Films are suggested by the beginning of a later word of title too, higher rated first"""
+    film = next(film for film in catalogue.films if len(film['title'].split()) > 1)
+    prefix = film['title'].split()[1][:4].upper()
+
+    response = await client.get('/api/v1/films/suggest', params={'query': prefix, 'size': 20})
+    assert response.status_code == 200
+    suggestions = response.json()
+    assert all(set(suggestion) == {'uuid', 'title'} for suggestion in suggestions)
+    assert film['id'] in {suggestion['uuid'] for suggestion in suggestions}
+
+    ratings = {film['id']: film['imdb_rating'] for film in catalogue.films}
+    order = [ratings[suggestion['uuid']] for suggestion in suggestions]
+    assert order == sorted(order, reverse=True)
+
+
+async def test_short_prefixes_cached(services, catalogue, client):
+    """Suggestions of short prefixes are cached whatever the case, longer ones are always searched"""
+    prefix = catalogue.persons[0]['full_name'][:2]
+    for query in (prefix.lower(), prefix.upper(), f' {prefix} '):
+        response = await client.get('/api/v1/persons/suggest', params={'query': query})
+        assert response.status_code == 200
+        assert response.headers['etag']
+    assert services['persons'].searcher.calls['suggest'] == 1
+
+    full_name = catalogue.persons[0]['full_name']
+    for _ in range(2):
+        response = await client.get('/api/v1/persons/suggest', params={'query': full_name})
+        assert catalogue.persons[0]['id'] in {suggestion['uuid'] for suggestion in response.json()}
+    assert services['persons'].searcher.calls['suggest'] == 3
+
+
+@pytest.mark.parametrize('params', [{'query': ''}, {'query': 'a', 'size': 0}, {'query': 'a', 'size': 1000}])
+async def test_invalid_suggest(services, client, params):
+    response = await client.get('/api/v1/films/suggest', params=params)
+    assert response.status_code == 422
+
+
+class CompletingElastic:
+    """Elasticsearch client answering suggest requests with a single option, recording requests"""
+
+    def __init__(self) -> None:
+        self.requests = []
+
+    async def search(self, **kwargs):
+        self.requests.append(kwargs)
+        return {'hits': {'hits': []}, 'suggest': {'completion': [{'options': [{'_source': {'id': 'f1'}}]}]}}
+
+
+async def test_suggest_fetches_no_hits():
+    """Suggest request only asks for completion options, not for hits of the query"""
+    elastic = CompletingElastic()
+    found = await ElasticSearcher('films', elastic).suggest_index(SuggestRequest('sta', 5), ['id'])
+    assert found == [{'id': 'f1'}]
+    assert elastic.requests[0]['size'] == 0
+    assert elastic.requests[0]['suggest']['completion']['completion']['size'] == 5
@@ -0,0 +1,51 @@
+import asyncio
+
+from core import tracing
+from core.tracing import Tracer, span
+from interfaces.tracing import Span, SpanExporter
+
+
+class ListExporter(SpanExporter):
+    """Keeps exported spans in memory"""
+
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+
+    async def export(self, spans: list[Span]) -> None:
+        self.spans.extend(spans)
+
+    async def close(self) -> None:
+        pass
+
+
+def test_attributes_encoded_by_type():
+    attributes = Span('GET /', '0' * 32, '0' * 16, None, 0, attributes={
+        'cache.hit': True, 'http.status_code': 200, 'index': 'films'}).otlp()['attributes']
+    assert attributes == [
+        {'key': 'cache.hit', 'value': {'boolValue': True}},
+        {'key': 'http.status_code', 'value': {'intValue': '200'}},
+        {'key': 'index', 'value': {'stringValue': 'films'}},
+    ]
+
+
+async def test_background_span_outliving_request_exported(monkeypatch):
+    """Span of background work ending after the request is shipped on its own, in the trace of the request"""
+    exporter = ListExporter()
+    monkeypatch.setattr(tracing, 'tracer', Tracer(exporter, rate=1.0, interval=60))
+
+    async def revalidate():
+        await asyncio.sleep(0.01)
+        with span('revalidate'):
+            await asyncio.sleep(0.01)
+
+    with tracing.tracer.trace('GET /') as root:
+        with span('lookup'):
+            task = asyncio.create_task(revalidate())
+    await tracing.tracer.flush()
+    assert [s.name for s in exporter.spans] == ['lookup', 'GET /']
+
+    await task
+    await tracing.tracer.flush()
+    late = exporter.spans[-1]
+    assert (late.name, late.trace_id) == ('revalidate', root.trace_id)
+    assert late.parent_id == exporter.spans[0].span_id
@@ -0,0 +1,49 @@
+import asyncio
+
+import main
+from core.warmup import Warmup, top_urls
+
+
+def test_top_urls(tmp_path):
+    """Successful API requests of nginx and uvicorn access logs are counted, most popular first"""
+    log = tmp_path / 'access.log'
+    log.write_text(
+        '10.0.0.1 - - [18/Oct/2026:10:00:00 +0000] "GET /api/v1/genres/ HTTP/1.1" 200 512 "-" "curl"\n'
+        '10.0.0.1 - - [18/Oct/2026:10:00:01 +0000] "GET /api/v1/films/?sort=-imdb_rating HTTP/1.1" 200 9 "-" "-"\n'
+        "INFO:     10.0.0.2:5000 - 'GET /api/v1/films/?sort=-imdb_rating HTTP/1.1' 200\n"
+        '10.0.0.1 - - [18/Oct/2026:10:00:02 +0000] "GET /api/v1/films/missing/ HTTP/1.1" 404 9 "-" "-"\n'
+        '10.0.0.1 - - [18/Oct/2026:10:00:03 +0000] "GET /api/openapi HTTP/1.1" 200 9 "-" "-"\n'
+        '10.0.0.1 - - [18/Oct/2026:10:00:04 +0000] "POST /api/v1/films/ HTTP/1.1" 200 9 "-" "-"\n')
+    assert top_urls(str(log), 10) == ['/api/v1/films/?sort=-imdb_rating', '/api/v1/genres/', '/api/openapi']
+    assert top_urls(str(log), 1) == ['/api/v1/films/?sort=-imdb_rating']
+
+
+async def test_warmup_fills_caches(services):
+    """Warmed urls are served from cache, without searching the index again"""
+    urls = ['/api/v1/films/?sort=-imdb_rating&page[size]=50&page[number]=1',
+            '/api/v1/films/?sort=-imdb_rating&page[size]=50&page[number]=2',
+            '/api/v1/genres/?page[size]=100',
+            '/api/v1/films/?page[size]=50&page[number]=100']
+    warmup = Warmup()
+    warmup.start(main.app, urls, concurrency=2, timeout=5.0)
+    assert not warmup.ready
+    await warmup.task
+
+    assert warmup.ready
+    assert warmup.state()['done'] == 4
+    assert warmup.state()['failed'] == 1
+    searched = services['films'].searcher.calls['search']
+    for url in urls[:2]:
+        assert await Warmup.request(main.app, url) == 200
+    assert services['films'].searcher.calls['search'] == searched
+
+
+async def test_warmup_timeout(services):
+    """Warm-up taking longer than timeout is abandoned, and the worker reports ready"""
+    services['films'].searcher.latency.delay = 0.2
+    warmup = Warmup()
+    await warmup.run(main.app, ['/api/v1/films/?page[size]=50'], concurrency=1, timeout=0.05)
+    assert warmup.ready
+    assert warmup.state()['done'] == 0
+    # let the search, shared with later requests, finish on its own
+    await asyncio.sleep(0.3)
@@ -36,5 +36,10 @@ class Settings(BaseSettings):
     ETL_ENRICHER_MAX_BATCH_SIZE: int = 100
     ETL_ENRICHER_CHUNK_SIZE: int = 100
 
+    # Сбрасывать кэш API по индексу после загрузки документов
+    ETL_CACHE_INVALIDATE: bool = True
+    # Кэш сбрасывается один раз, когда загрузка документов затихла на столько секунд
+    ETL_CACHE_INVALIDATE_DELAY: float = 1.0
+
     # Корень проекта
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -4,7 +4,7 @@ from uuid import UUID
 from pydantic import BaseModel
 
 import helpers
-from documents import genre, person
+from documents import genre, person, suggest
 
 
 class Film(BaseModel):
@@ -18,6 +18,7 @@ class Film(BaseModel):
     actors: List[person.Person]
     writers: List[person.Person]
     directors: List[person.Person]
+    suggest: suggest.Suggest
 
     class Config:
         json_loads = helpers.json_loads
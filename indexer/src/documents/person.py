@@ -4,6 +4,7 @@ from uuid import UUID
 from pydantic import BaseModel
 
 import helpers
+from documents.suggest import Suggest
 
 
 class PersonFilm(BaseModel):
@@ -21,6 +22,8 @@ class Person(BaseModel):
     id: UUID
     full_name: str
     films: Optional[list[PersonFilm]]
+    # только у документов индекса персон, не у персон внутри фильмов
+    suggest: Optional[Suggest] = None
 
     class Config:
         json_loads = helpers.json_loads
@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+
+import helpers
+
+
+class Suggest(BaseModel):
+    """Поле автодополнения: варианты ввода и вес документа в подсказках."""
+    input: list[str]
+    weight: int
+
+    class Config:
+        json_loads = helpers.json_loads
+        json_dumps = helpers.json_dumps
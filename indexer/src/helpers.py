@@ -16,6 +16,19 @@ async def get_last_modified(state: State, key: str) -> datetime:
     return datetime.fromisoformat(modified) if modified else datetime.min.replace(tzinfo=timezone.utc)
 
 
+def suggest_inputs(text: str, limit: int = 5) -> list[str]:
+    """Возвращает варианты ввода для автодополнения: текст целиком и без первых слов.
+
+    Так подсказка находится по началу любого из первых limit слов, а не только первого.
+
+    :param text:
+    :param limit:
+    :return:
+    """
+    words = text.split()
+    return list(dict.fromkeys(' '.join(words[i:]) for i in range(min(len(words), limit))))
+
+
 json_loads = orjson.loads
 
 
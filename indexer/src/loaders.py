@@ -1,11 +1,13 @@
+import asyncio
 import logging
 from abc import ABCMeta, abstractmethod
 from asyncio import Queue
 from collections import Counter
 from dataclasses import dataclass
 from operator import attrgetter
-from typing import Generator
+from typing import Generator, Optional
 
+from aioredis import Redis
 from elasticsearch import AsyncElasticsearch
 from elasticsearch.helpers import async_bulk
 
@@ -39,27 +41,43 @@ class ElasticIndexLoader(BaseLoader):
     state: State
     logger: logging.Logger
     chunk_size: int
+    cache: Optional[Redis] = None
+    invalidate_delay: float = 1.0
 
     def __post_init__(self):
         self._loaded_counter = Counter()
+        self._invalidate_pending = False
 
     async def load(self, queue: Queue):
         """Загружает документы в хранилище
 
+        Кэш API сбрасывается один раз, когда загрузка затихла на invalidate_delay секунд
+        (или закончилась), а не после каждой пачки: иначе полная переиндексация
+        раз за разом опустошала бы кэш.
+
         :param queue:
         :return:
         """
         batch = []
-        while True:
-            message = await queue.get()
-            if message is not None:
-                batch.append(message)
-            if queue.empty() or (batch and len(batch) >= self.chunk_size):
-                await self._load(batch)
-                self.logger.debug('Total loaded: %s', self._loaded_counter)
-                batch = []
-            if message is None:
-                break
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), self.invalidate_delay) \
+                        if self._invalidate_pending else await queue.get()
+                except asyncio.TimeoutError:
+                    await self._invalidate_cache()
+                    continue
+                if message is not None:
+                    batch.append(message)
+                if queue.empty() or (batch and len(batch) >= self.chunk_size):
+                    await self._load(batch)
+                    self.logger.debug('Total loaded: %s', self._loaded_counter)
+                    batch = []
+                if message is None:
+                    break
+        finally:
+            if self._invalidate_pending:
+                await self._invalidate_cache()
 
     async def _load(self, messages: list[Message]):
         transformed_messages = await self.transformer.transform(messages)
@@ -83,9 +101,23 @@ class ElasticIndexLoader(BaseLoader):
                 raise Exception('Got failed items on elastic bulk insert')
 
         await self._update_last_modified(transformed_messages)
+        self._invalidate_pending = self.cache is not None
         self._loaded_counter.update(
             [msg.producer_name for msg in transformed_messages])
 
+    async def _invalidate_cache(self) -> None:
+        """Сбрасывает кэш API по индексу, увеличивая поколение индекса.
+
+        Ключи предыдущих поколений больше не читаются API и истекают по TTL.
+
+        :return:
+        """
+        self._invalidate_pending = False
+        if self.cache is None:
+            return
+        generation = await self.cache.incr(f'{self.index_name}__generation')
+        self.logger.debug(f'API cache generation of {self.index_name}: {generation}')
+
     async def _update_last_modified(self, messages: list[Message]) -> None:
         """Для каждого типа продьюсеров нужно отдельно апдейтить last_modified.
 
@@ -118,5 +150,6 @@ class ElasticIndexLoader(BaseLoader):
         for message in messages:
             yield dict(
                 _id=message.obj_id,
-                _source=message.obj_model.dict(),
+                # пустые поля не пишем: их может не быть в схеме вложенных документов
+                _source=message.obj_model.dict(exclude_none=True),
             )
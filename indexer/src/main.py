@@ -97,6 +97,8 @@ async def build_genre_index_pipeline() -> Pipeline:
         state=state_obj,
         logger=logger.getChild('GenreModifiedLoader'),
         chunk_size=settings.ETL_LOADER_CHUNK_SIZE,
+        cache=await redis.get_redis() if settings.ETL_CACHE_INVALIDATE else None,
+        invalidate_delay=settings.ETL_CACHE_INVALIDATE_DELAY,
     )
     return Pipeline(
         producer_queue_size=settings.ETL_PRODUCER_QUEUE_SIZE,
@@ -133,6 +135,8 @@ async def build_person_index_pipeline() -> Pipeline:
         state=state_obj,
         logger=logger.getChild('PersonModifiedLoader'),
         chunk_size=settings.ETL_LOADER_CHUNK_SIZE,
+        cache=await redis.get_redis() if settings.ETL_CACHE_INVALIDATE else None,
+        invalidate_delay=settings.ETL_CACHE_INVALIDATE_DELAY,
     )
     return Pipeline(
         producer_queue_size=settings.ETL_PRODUCER_QUEUE_SIZE,
@@ -169,6 +173,8 @@ async def build_film_index_pipeline() -> Pipeline:
         state=state_obj,
         logger=logger.getChild('FilmworkLoader'),
         chunk_size=settings.ETL_LOADER_CHUNK_SIZE,
+        cache=await redis.get_redis() if settings.ETL_CACHE_INVALIDATE else None,
+        invalidate_delay=settings.ETL_CACHE_INVALIDATE_DELAY,
     )
     return Pipeline(
         producer_queue_size=settings.ETL_PRODUCER_QUEUE_SIZE,
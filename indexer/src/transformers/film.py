@@ -1,9 +1,11 @@
 from documents.film import Film as FilmDocument
 from documents.genre import Genre as GenreDocument
 from documents.person import Person as PersonDocument
+from documents.suggest import Suggest
 from entities.film import Film as FilmEntity
 from entities.person import Person as PersonEntity
 from entities.person import RoleEnum
+from helpers import suggest_inputs
 from message import Message
 from transformers.base import BaseTransformer
 
@@ -35,6 +37,7 @@ class FilmTransformer(BaseTransformer):
             directors=self.get_person(item.persons, RoleEnum.director),
             actors=self.get_person(item.persons, RoleEnum.actor),
             writers=self.get_person(item.persons, RoleEnum.writer),
+            suggest=Suggest(input=suggest_inputs(item.title), weight=round(item.rating * 10)),
         )
         return message
 
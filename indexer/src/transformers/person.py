@@ -1,7 +1,9 @@
 from documents.person import Person as PersonDocument
 from documents.person import PersonFilm as PersonFilmDocument
+from documents.suggest import Suggest
 from entities.person import Person as PersonEntity
 from entities.person import PersonFilm as PersonFilmEntity
+from helpers import suggest_inputs
 from message import Message
 from transformers.base import BaseTransformer
 
@@ -26,7 +28,8 @@ class PersonTransformer(BaseTransformer):
         message.obj_model = PersonDocument(
             id=item.id,
             full_name=item.full_name,
-            films=[self.map_film(f) for f in item.films]
+            films=[self.map_film(f) for f in item.films],
+            suggest=Suggest(input=suggest_inputs(item.full_name), weight=len(item.films or [])),
         )
         return message
 